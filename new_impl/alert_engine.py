@@ -0,0 +1,118 @@
+"""Motore insiemistico delle allerte: un passaggio per modulo sull'intero archivio.
+
+Il ciclo per account (:func:`alert_loop.run_accounts`) costruisce il contesto di
+ogni account ed esegue tutti i moduli su di esso. I moduli che valutano ogni
+contatto da solo, o raggruppano i contatti per account, offrono anche
+``run_batch(scan, *, store, emit)``: il motore li esegue uno dopo l'altro, ciascuno
+con una sola scansione delle relazioni unite ai contatti
+(``store.iter_contact_rows``), senza costruire i contesti degli account.
+
+Ogni allerta è etichettata con la posizione dell'account nel ciclo, la posizione
+del modulo e l'ordine di emissione; l'ordinamento finale su queste chiavi
+riproduce esattamente l'ordine del ciclo per account. I moduli senza
+``run_batch`` vengono eseguiti con il ciclo per account, limitato a loro
+(:func:`alerts.visitor.visit_account`).
+"""
+
+from __future__ import annotations
+
+import os
+from operator import itemgetter
+from time import perf_counter
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .alert_summary import FIELDNAMES, AlertSummaryStore
+from .alerts.visitor import visit_account
+from .data_store import ContactRow
+from .logbook import log_loop_event
+
+ENGINES = ("account", "module", "parity")
+
+
+def configured_alert_engine() -> str:
+    """Motore del ciclo allerte da ``SFBPCA_ALERT_ENGINE`` (predefinito ``account``)."""
+
+    engine = (os.environ.get("SFBPCA_ALERT_ENGINE") or "account").strip().lower()
+    if engine not in ENGINES:
+        raise ValueError(
+            f"Motore allerte '{engine}' non supportato. Valori ammessi: {', '.join(ENGINES)}"
+        )
+    return engine
+
+
+class _TaggedAlerts:
+    """Raccoglie le allerte con la chiave d'ordinamento del ciclo per account."""
+
+    def __init__(self) -> None:
+        self.rows: List[Tuple[int, int, int, Dict[str, str]]] = []
+
+    def emitter(self, module_index: int) -> Callable[[int, Dict[str, str]], None]:
+        rows = self.rows
+
+        def emit(account_index: int, alert: Dict[str, str]) -> None:
+            rows.append((account_index, module_index, len(rows), alert))
+
+        return emit
+
+    def sorted_alerts(self) -> List[Dict[str, str]]:
+        self.rows.sort(key=itemgetter(0, 1, 2))
+        return [alert for _account, _module, _sequence, alert in self.rows]
+
+
+def run_module_major(store, account_ids: Sequence[str], summary: AlertSummaryStore, modules) -> None:
+    """Esegue ``modules`` modulo per modulo su ``account_ids`` e registra le allerte in ``summary``."""
+
+    positions = {account_id: index for index, account_id in enumerate(account_ids)}
+
+    def scan(with_points: bool = False) -> Iterator[Tuple[int, ContactRow]]:
+        for row in store.iter_contact_rows(with_points):
+            index = positions.get(row.account_id)
+            if index is not None:
+                yield index, row
+
+    tagged = _TaggedAlerts()
+    per_account = []
+    for module_index, module in enumerate(modules):
+        run_batch = getattr(module, "run_batch", None)
+        if run_batch is None:
+            per_account.append((module_index, module))
+            continue
+        started = perf_counter()
+        before = len(tagged.rows)
+        run_batch(scan, store=store, emit=tagged.emitter(module_index))
+        name = module.__name__.rsplit(".", 1)[-1]
+        print(
+            f"[Allerte] Modulo {name}: {len(tagged.rows) - before} allerte "
+            f"in {perf_counter() - started:.2f}s."
+        )
+        log_loop_event(
+            f"Modulo {name} eseguito sull'intero archivio: {len(tagged.rows) - before} allerte."
+        )
+
+    if per_account:
+        names = ", ".join(module.__name__.rsplit(".", 1)[-1] for _index, module in per_account)
+        log_loop_event(f"Moduli eseguiti per account: {names}.")
+        emitters = [tagged.emitter(index) for index, _module in per_account]
+        remaining = [module for _index, module in per_account]
+        for account_index, account_id in enumerate(account_ids):
+            context = store.describe_account(account_id)
+            for emit, alerts in zip(emitters, visit_account(context, remaining)):
+                for alert in alerts:
+                    emit(account_index, alert)
+
+    summary.extend(tagged.sorted_alerts())
+
+
+def compare_alerts(expected: Sequence[Dict[str, str]], actual: Sequence[Dict[str, str]]) -> Optional[str]:
+    """Descrive la prima differenza tra due elenchi di allerte, ``None`` se coincidono."""
+
+    for index, (left, right) in enumerate(zip(expected, actual)):
+        for field in FIELDNAMES:
+            if left.get(field, "") != right.get(field, ""):
+                return (
+                    f"Allerta {index + 1} ({left.get('alert_type')}, account {left.get('account_id')}): "
+                    f"campo {field} atteso {left.get(field)!r}, ottenuto {right.get(field)!r}."
+                )
+    if len(expected) != len(actual):
+        return f"Attese {len(expected)} allerte, ottenute {len(actual)}."
+    return None
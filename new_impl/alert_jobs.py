@@ -0,0 +1,205 @@
+"""Cicli di allerte eseguiti in background, consultabili e annullabili."""
+
+from __future__ import annotations
+
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from time import perf_counter
+from typing import Dict, List, Optional
+
+from .alert_loop import AlertRunCancelled, RunProgress
+from .logbook import log_loop_event
+from .workspaces import DEFAULT_WORKSPACE, WORKSPACES, WorkspaceRegistry
+
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+def _timestamp() -> str:
+    return datetime.utcnow().isoformat(timespec="seconds") + "Z"
+
+
+class AlertJob(RunProgress):
+    """Stato di un ciclo in background, aggiornato dal worker e letto dalle richieste HTTP.
+
+    Le allerte vengono raccolte account per account, nell'ordine in cui il ciclo
+    le notifica, quindi sono consultabili anche prima della fine. L'annullamento
+    è cooperativo: il ciclo si ferma alla notifica dell'account successivo.
+    """
+
+    def __init__(self, job_id: str, workspace: str = DEFAULT_WORKSPACE) -> None:
+        super().__init__()
+        self.id = job_id
+        self.workspace = workspace
+        self.status = "queued"
+        self.created_at = _timestamp()
+        self.finished_at: Optional[str] = None
+        self.error: Optional[str] = None
+        self.result: Optional[Dict[str, object]] = None
+        self.alerts: List[Dict[str, str]] = []
+        self._finished: Optional[float] = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # RunProgress
+    # ------------------------------------------------------------------
+    def start(self, total: int, version: int) -> None:
+        self._check_cancelled()
+        super().start(total, version)
+
+    def account(self, account_id: str, alerts: List[Dict[str, str]]) -> None:
+        self._check_cancelled()
+        with self._lock:
+            super().account(account_id, alerts)
+            self.alerts.extend(alerts)
+
+    def store_alerts(self, alerts: List[Dict[str, str]]) -> None:
+        with self._lock:
+            self.alerts.extend(alerts)
+
+    def _check_cancelled(self) -> None:
+        if self._cancel.is_set():
+            raise AlertRunCancelled(f"Ciclo {self.id} annullato dopo {self.processed} account.")
+
+    # ------------------------------------------------------------------
+    # Ciclo di vita
+    # ------------------------------------------------------------------
+    def begin(self) -> None:
+        with self._lock:
+            self.status = "running"
+            self.started = perf_counter()
+
+    def cancel(self) -> None:
+        """Chiede l'annullamento; un job in coda non viene più avviato."""
+
+        self._cancel.set()
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def finish(
+        self, status: str, result: Optional[Dict[str, object]] = None, error: Optional[str] = None
+    ) -> None:
+        with self._lock:
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished_at = _timestamp()
+            self._finished = perf_counter()
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def page(self, offset: int, limit: int) -> Dict[str, object]:
+        """Allerte raccolte da ``offset`` in poi, al più ``limit``, con lo stato del job."""
+
+        with self._lock:
+            details = self.alerts[offset : offset + limit]
+            available = len(self.alerts)
+        next_offset = offset + len(details)
+        payload = self.to_dict()
+        payload["details"] = details
+        payload["next_offset"] = next_offset if next_offset < available or not self.done else None
+        return payload
+
+    def to_dict(self) -> Dict[str, object]:
+        with self._lock:
+            elapsed = 0.0
+            if self.status != "queued":
+                elapsed = (self._finished or perf_counter()) - self.started
+            payload: Dict[str, object] = {
+                "job": self.id,
+                "workspace": self.workspace,
+                "status": self.status,
+                "created_at": self.created_at,
+                "finished_at": self.finished_at,
+                "elapsed_seconds": round(elapsed, 2),
+                "processed": self.processed,
+                "total": self.total,
+                "alerts": len(self.alerts),
+                "cancel_requested": self._cancel.is_set(),
+                "error": self.error,
+            }
+            if self.result is not None:
+                payload.update(self.result)
+            return payload
+
+
+class AlertJobRegistry:
+    """Esegue i cicli di allerte in un pool dedicato e conserva gli ultimi job conclusi.
+
+    I cicli non occupano i thread delle richieste HTTP: oltre ``workers`` cicli
+    contemporanei i job restano in coda. I job conclusi oltre ``history`` vengono
+    eliminati insieme alle loro allerte, a partire dai più vecchi.
+    """
+
+    def __init__(
+        self,
+        workspaces: WorkspaceRegistry,
+        *,
+        history: int = 20,
+        workers: Optional[int] = None,
+    ) -> None:
+        self.workspaces = workspaces
+        self.history = history
+        self._jobs: "OrderedDict[str, AlertJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or min(2, os.cpu_count() or 1), thread_name_prefix="sfbpca-alerts"
+        )
+
+    def submit(self, workspace_id: str = DEFAULT_WORKSPACE) -> AlertJob:
+        """Accoda un ciclo sull'intero archivio dell'area e restituisce subito il job."""
+
+        job = AlertJob(uuid.uuid4().hex, workspace_id)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._trim()
+        print(f"[Allerte] Job {job.id} accodato (area {workspace_id}).")
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[AlertJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: AlertJob) -> None:
+        if job.cancel_requested:
+            print(f"[Allerte] Job {job.id} annullato prima dell'avvio.")
+            job.finish("cancelled")
+            return
+        job.begin()
+        print(f"[Allerte] Job {job.id} avviato.")
+        try:
+            with self.workspaces.use(job.workspace) as workspace:
+                run, cached = workspace.alert_loop.execute(progress=job)
+        except AlertRunCancelled as error:
+            print(f"[Allerte] {error}")
+            log_loop_event(f"{error}")
+            job.finish("cancelled")
+        except Exception as error:  # pragma: no cover - errore inatteso nel worker
+            print(f"[Allerte] Job {job.id} interrotto da un errore inatteso: {error}")
+            log_loop_event(f"Ciclo allerte in background {job.id} interrotto: {error!r}.")
+            job.finish("failed", error=f"Errore inatteso durante il ciclo allerte: {error}")
+        else:
+            print(f"[Allerte] Job {job.id} completato.")
+            result = {key: value for key, value in run.results.items() if key not in ("details", "summary")}
+            job.finish("completed", result={**result, "cached": cached})
+        with self._lock:
+            self._trim()
+
+    def _trim(self) -> None:
+        """Elimina i job conclusi più vecchi oltre il limite della cronologia."""
+
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[: max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+
+
+ALERT_JOBS = AlertJobRegistry(WORKSPACES)
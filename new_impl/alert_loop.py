@@ -2,18 +2,31 @@
 
 from __future__ import annotations
 
-from typing import Dict, Iterable, List, Optional, Sequence
+import gc
+import hashlib
+import itertools
+import multiprocessing
+import os
+import sys
+import threading
+import uuid
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 
+from .alert_engine import compare_alerts, configured_alert_engine, run_module_major
 from .alert_summary import ALERT_SUMMARY, AlertSummaryStore
 from .alerts import (
     check_contatti_senza_recapiti,
     check_contatti_senza_ruolo,
     check_duplicati_ruolo,
+    check_duplicati_tra_account,
     check_email_contactpoint,
     check_nominali_ruoli_differenti,
     check_sol_email,
     check_telefono_contactpoint,
 )
+from .alerts.visitor import visit_account
 from .data_store import DATA_STORE, SalesforceRelationshipStore
 from .logbook import log_loop_event
 
@@ -27,56 +40,583 @@ ALERT_MODULES = (
     check_sol_email,
 )
 
+# Moduli che analizzano l'intero archivio in un solo passaggio, dopo il ciclo per account.
+STORE_ALERT_MODULES = (check_duplicati_tra_account,)
+
+
+def module_signature(modules: Sequence) -> str:
+    """Impronta dell'insieme di moduli: nome e sorgente di ciascuno, nell'ordine dato."""
+
+    digest = hashlib.sha256()
+    for module in modules:
+        digest.update(module.__name__.encode("utf-8") + b"\0")
+        source = getattr(module, "__file__", None)
+        if source:
+            digest.update(Path(source).read_bytes())
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+# Cambia a ogni modifica dell'elenco dei moduli o del loro codice.
+MODULE_SIGNATURE = module_signature((*ALERT_MODULES, *STORE_ALERT_MODULES))
+
+# Account minimi per partizione: sotto questa soglia il costo dei processi supera il guadagno.
+SHARD_MIN_ACCOUNTS = 50
+# Partizioni per processo, per bilanciare account di dimensioni diverse.
+SHARDS_PER_WORKER = 4
+
+# Archivio e versione del ciclo nel processo figlio, impostati da _after_fork.
+_FORKED_RUN: Optional[tuple] = None
+# Un pool alla volta viene creato con gli oggetti congelati (gc.freeze).
+_FORK_LOCK = threading.Lock()
+# Stream standard ereditati dai processi figli, sostituiti da _reopen_std_streams.
+_INHERITED_STREAMS: List[object] = []
+
+
+class StaleShardError(RuntimeError):
+    """Il processo figlio vede una versione dell'archivio diversa da quella del ciclo."""
+
+
+class AlertRunCancelled(RuntimeError):
+    """Ciclo interrotto su richiesta da :class:`RunProgress`, tra un account e l'altro."""
+
+
+def configured_alert_workers() -> int:
+    """Processi del ciclo allerte da ``SFBPCA_ALERT_WORKERS`` (``0`` o ``auto``: uno per CPU)."""
+
+    value = (os.environ.get("SFBPCA_ALERT_WORKERS") or "1").strip().lower()
+    if value in ("0", "auto"):
+        return os.cpu_count() or 1
+    return max(int(value), 1)
+
+
+def configured_alert_incremental() -> bool:
+    """Ciclo incrementale da ``SFBPCA_ALERT_INCREMENTAL`` (attivo salvo ``0``, ``false`` o ``no``)."""
+
+    value = (os.environ.get("SFBPCA_ALERT_INCREMENTAL") or "1").strip().lower()
+    return value not in ("0", "false", "no", "off")
+
+
+class RunProgress:
+    """Avanzamento di un ciclo di allerte, notificato account per account.
+
+    Il ciclo chiama :meth:`start` quando conosce gli account da analizzare,
+    :meth:`account` per ogni account con le sue allerte definitive (già
+    normalizzate) e :meth:`store_alerts` con quelle dei controlli sull'intero
+    archivio. Gli account ripresi dalla cache vengono notificati per primi; con il
+    motore ``module`` e nei processi figli le allerte arrivano a fine passaggio o a
+    fine partizione. Le sottoclassi ridefiniscono i metodi che servono,
+    richiamando quelli di base per mantenere i contatori.
+
+    Se :meth:`start` o :meth:`account` sollevano :class:`AlertRunCancelled` il ciclo
+    si interrompe senza aggiornare la cache degli account né il riepilogo pubblicato.
+    """
+
+    def __init__(self) -> None:
+        self.total = 0
+        self.processed = 0
+        self.started = perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return perf_counter() - self.started
+
+    def start(self, total: int, version: int) -> None:
+        self.total = total
+
+    def account(self, account_id: str, alerts: List[Dict[str, str]]) -> None:
+        self.processed += 1
+
+    def store_alerts(self, alerts: List[Dict[str, str]]) -> None:
+        pass
+
+
+def _report_accounts(
+    progress: RunProgress, account_ids: Sequence[str], alerts: Iterable[Dict[str, str]]
+) -> None:
+    """Notifica a ``progress`` le allerte di ``account_ids``, raggruppate per account."""
+
+    by_account: Dict[str, List[Dict[str, str]]] = {account_id: [] for account_id in account_ids}
+    for alert in alerts:
+        by_account.setdefault(alert["account_id"], []).append(alert)
+    for account_id in account_ids:
+        progress.account(account_id, by_account[account_id])
+
+
+def run_accounts(
+    store, account_ids: Sequence[str], summary: AlertSummaryStore, progress: Optional[RunProgress] = None
+) -> None:
+    """Esegue i moduli per account su ``account_ids``, nell'ordine dato.
+
+    I contatti di ogni account vengono visitati una sola volta per tutti i moduli
+    (:func:`alerts.visitor.visit_account`).
+    """
+
+    total = len(account_ids)
+    for index, account_id in enumerate(account_ids, start=1):
+        context = store.describe_account(account_id)
+        account_name = store.resolve_account_name(account_id)
+        print(f"[Allerte] ({index}/{total}) Analisi dell'account {account_name} ({account_id}).")
+        log_loop_event(f"Avvio analisi account {account_name} ({account_id}) ({index}/{total}).")
+        recorded = summary.extend(
+            alert for alerts in visit_account(context, ALERT_MODULES) for alert in alerts
+        )
+        if progress is not None:
+            progress.account(account_id, recorded)
+
+
+def _state_extends(current: tuple, previous: tuple) -> bool:
+    """Vero se ogni stato di ``current`` contiene tutte le voci del corrispondente in ``previous``."""
+
+    return len(current) == len(previous) and all(
+        state.items() >= old.items() for state, old in zip(current, previous)
+    )
+
+
+def _run_shard(account_ids: Sequence[str]) -> List[Dict[str, str]]:
+    """Eseguito nel processo figlio: analizza una partizione e restituisce le sue allerte."""
+
+    store, version = _FORKED_RUN
+    with store.pinned() as pinned_version:
+        if pinned_version != version:
+            raise StaleShardError(
+                f"Il processo figlio legge la versione {pinned_version} invece della {version}."
+            )
+        # Lo stato dei moduli è quello preparato dal processo principale prima del fork.
+        summary = AlertSummaryStore()
+        run_accounts(store, account_ids, summary)
+    return summary.all_alerts()
+
+
+def _reopen_std_streams() -> None:
+    """Sostituisce stdout e stderr ereditati con oggetti nuovi sugli stessi descrittori.
+
+    Un altro thread del server può tenere il lock interno di ``sys.stdout`` nel
+    momento del fork: il figlio lo erediterebbe bloccato e si fermerebbe al primo
+    ``print``.
+    """
+
+    for name in ("stdout", "stderr"):
+        stream = getattr(sys, name)
+        try:
+            descriptor = stream.fileno()
+        except (AttributeError, OSError, ValueError):
+            continue
+        # Il vecchio oggetto resta referenziato: la sua finalizzazione lo svuoterebbe.
+        _INHERITED_STREAMS.append(stream)
+        replacement = open(
+            os.dup(descriptor), "w", encoding=stream.encoding, errors=stream.errors, buffering=1
+        )
+        setattr(sys, name, replacement)
+
+
+def _after_fork(store, version: int, run_state: tuple) -> None:
+    """Prepara un processo del pool, compresi quelli che il pool avvia per sostituirne uno.
+
+    I sostituti nascono dal thread di gestione del pool, che non ha lo stato per
+    thread preparato dai moduli: archivio, versione e stato del ciclo arrivano
+    quindi come argomenti dell'inizializzazione.
+    """
+
+    global _FORKED_RUN
+    _reopen_std_streams()
+    store.after_fork()
+    _FORKED_RUN = (store, version)
+    prepared = [module for module in ALERT_MODULES if hasattr(module, "prepare_run")]
+    for module, state in zip(prepared, run_state):
+        module.restore_run(state)
+
+
+class AlertRun:
+    """Risultato di un ciclo di allerte, con le esportazioni prodotte al primo uso.
+
+    ``key`` vale ``(versione dell'archivio, MODULE_SIGNATURE)`` per i cicli
+    sull'intero archivio e ``None`` per quelli limitati ad alcuni account. ``etag``
+    identifica il risultato: cambia a ogni nuovo ciclo e resta uguale quando il
+    risultato viene servito dalla cache.
+    """
+
+    def __init__(
+        self,
+        key: Optional[Tuple[int, str]],
+        results: Dict[str, object],
+        summary: AlertSummaryStore,
+        *,
+        account_alerts: int,
+    ) -> None:
+        self.key = key
+        self.results = results
+        self.summary = summary
+        # Allerte iniziali dei moduli per account; le successive vengono dai controlli sull'archivio.
+        self.account_alerts = account_alerts
+        self.etag = uuid.uuid4().hex
+        self._artifacts: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def artifact(self, name: str, render: Callable[[], bytes]) -> bytes:
+        """Restituisce l'esportazione ``name``, producendola con ``render`` solo la prima volta."""
+
+        with self._lock:
+            data = self._artifacts.get(name)
+            if data is None:
+                data = self._artifacts[name] = render()
+            return data
+
 
 class AlertLoopRunner:
-    """Esegue i moduli di allerta sugli account caricati. """
+    """Esegue i moduli di allerta sugli account caricati.
+
+    Ogni ciclo legge una sola versione dell'archivio (``store.pinned()``) e registra
+    le allerte in un riepilogo proprio; a fine ciclo il riepilogo diventa
+    ``self.summary`` solo se nel frattempo non è stato pubblicato quello di un
+    ciclo avviato dopo. Più cicli e import possono quindi procedere in parallelo.
+
+    Con ``workers`` maggiore di 1 gli account vengono divisi in partizioni contigue,
+    analizzate da processi figli creati con ``fork`` che ereditano l'archivio senza
+    copiarlo; le allerte delle partizioni vengono riunite nell'ordine degli account,
+    quindi il risultato coincide con quello del ciclo seriale.
+
+    ``engine`` sceglie come eseguire i moduli per account: ``account`` (il ciclo
+    per account), ``module`` (il motore insiemistico di :mod:`alert_engine`, sempre
+    in un solo processo) o ``parity``, che esegue entrambi, restituisce il risultato
+    del ciclo per account e riporta in ``engine_parity`` se coincidono.
+
+    Con ``incremental`` (predefinito) le allerte di ogni account restano in cache
+    insieme all'impronta dei suoi dati (``store.account_fingerprint``): i cicli
+    successivi ricalcolano, con il motore scelto, solo gli account la cui impronta
+    è cambiata, finché lo stato del ciclo preparato dai moduli (``prepare_run``)
+    resta lo stesso. I controlli sull'intero archivio vengono sempre ripetuti.
+
+    L'ultimo ciclo sull'intero archivio resta in cache (:class:`AlertRun`) con la
+    versione dell'archivio e ``MODULE_SIGNATURE``: finché nessun import pubblica una
+    nuova versione, un nuovo ciclo restituisce lo stesso risultato senza eseguire i
+    moduli, insieme alle esportazioni già prodotte.
+    """
 
     def __init__(
         self,
         store: SalesforceRelationshipStore | None = None,
         summary: AlertSummaryStore | None = None,
+        *,
+        workers: Optional[int] = None,
+        engine: Optional[str] = None,
+        incremental: Optional[bool] = None,
     ) -> None:
         self.store = store or DATA_STORE
         self.summary = summary or ALERT_SUMMARY
+        self.workers = workers if workers is not None else configured_alert_workers()
+        self.engine = engine or configured_alert_engine()
+        self.incremental = incremental if incremental is not None else configured_alert_incremental()
+        # Allerte per account del ciclo precedente, con l'impronta dei dati da cui derivano
+        # e lo stato del ciclo preparato dai moduli con cui sono state calcolate.
+        self._account_alerts: Dict[str, Tuple[int, List[Dict[str, str]]]] = {}
+        self._account_state: tuple = ()
+        # Allerte dei controlli sull'intero archivio, con versione e account da cui derivano.
+        self._store_alerts: Optional[Tuple[Tuple[int, Tuple[str, ...]], List[Dict[str, str]]]] = None
+        self._cache_lock = threading.Lock()
+        # Ultimo ciclo completo, riutilizzato finché versione e moduli non cambiano.
+        self._cached_run: Optional[AlertRun] = None
+        # Ciclo il cui riepilogo è ``self.summary``; ``None`` finché non ne termina uno.
+        self.published: Optional[AlertRun] = None
+        self._runs = itertools.count(1)
+        self._published_run = 0
+        self._publish_lock = threading.Lock()
 
     def run(self, account_ids: Optional[Sequence[str]] = None) -> Dict[str, List[dict]]:
         """Esegue il ciclo di allerte e restituisce i risultati."""
 
-        self.summary.reset()
-        for module in ALERT_MODULES:
-            module.reset_state()
+        return self.execute(account_ids)[0].results
 
-        targets = list(self._iter_targets(account_ids))
-        print(f"[Allerte] Trovati {len(targets)} account da analizzare.")
-        log_loop_event(f"Individuati {len(targets)} account da analizzare nel ciclo allerte.")
+    def execute(
+        self, account_ids: Optional[Sequence[str]] = None, progress: Optional[RunProgress] = None
+    ) -> Tuple[AlertRun, bool]:
+        """Esegue il ciclo di allerte; indica anche se il risultato proviene dalla cache.
 
-        for index, account_id in enumerate(targets, start=1):
-            context = self.store.describe_account(account_id)
-            account_name = self.store.resolve_account_name(account_id)
-            print(
-                f"[Allerte] ({index}/{len(targets)}) Analisi dell'account "
-                f"{account_name} ({account_id})."
-            )
+        ``progress`` riceve le allerte di ogni account appena sono definitive.
+        """
+
+        progress = progress or RunProgress()
+        run_number = next(self._runs)
+        summary = AlertSummaryStore()
+        with self.store.pinned() as version:
+            key = None if account_ids else (version, MODULE_SIGNATURE)
+            with self._cache_lock:
+                cached = self._cached_run
+            if key is not None and cached is not None and cached.key == key:
+                print(f"[Allerte] Risultato della versione archivio {version} già disponibile.")
+                log_loop_event(
+                    f"Ciclo allerte non ripetuto: archivio e moduli invariati (versione {version})."
+                )
+                self._report_cached(cached, progress)
+                self._publish(run_number, cached)
+                return cached, True
+
+            for module in (*ALERT_MODULES, *STORE_ALERT_MODULES):
+                module.reset_state()
+
+            targets = list(self._iter_targets(account_ids))
+            print(f"[Allerte] Trovati {len(targets)} account da analizzare (versione archivio {version}).")
             log_loop_event(
-                f"Avvio analisi account {account_name} ({account_id}) ({index}/{len(targets)})."
+                f"Individuati {len(targets)} account da analizzare nel ciclo allerte "
+                f"(versione archivio {version})."
+            )
+            # Stato dell'intero ciclo (ad esempio le etichette dei ruoli), fissato prima degli account.
+            run_state = tuple(
+                module.prepare_run(self.store, targets)
+                for module in ALERT_MODULES
+                if hasattr(module, "prepare_run")
             )
-            for module in ALERT_MODULES:
-                module.run(context, summary=self.summary)
+            progress.start(len(targets), version)
+
+            if self.incremental:
+                parity, recomputed = self._run_incremental(
+                    targets, version, summary, progress, full=not account_ids, run_state=run_state
+                )
+            else:
+                parity = self._run_modules(targets, version, summary, progress, run_state)
+                recomputed = len(targets)
 
-        details = self.summary.all_alerts()
+            account_alerts = len(summary.all_alerts())
+            if targets:
+                self._run_store_modules(targets, version, summary, progress)
+
+        details = summary.all_alerts()
         print(f"[Allerte] Rilevate {len(details)} allerte complessive.")
         log_loop_event(f"Ciclo completato con {len(details)} allerte rilevate.")
-        return {
+        results = {
             "details": details,
-            "summary": self.summary.summary_rows(),
-            "statistics": self.summary.statistics(total_accounts=len(targets)),
+            "summary": summary.summary_rows(),
+            "statistics": summary.statistics(total_accounts=len(targets)),
+            "store_version": version,
+            "recomputed_accounts": recomputed,
         }
+        if parity is not None:
+            results["engine_parity"] = parity
+        run = AlertRun(key, results, summary, account_alerts=account_alerts)
+        if key is not None:
+            with self._cache_lock:
+                if self._cached_run is None or self._cached_run.key[0] <= version:
+                    self._cached_run = run
+        self._publish(run_number, run)
+        return run, False
+
+    def _report_cached(self, run: AlertRun, progress: RunProgress) -> None:
+        """Notifica a ``progress`` le allerte di un ciclo ripreso dalla cache."""
+
+        details = run.results["details"]
+        targets = list(self._iter_targets(None))
+        progress.start(len(targets), run.key[0])
+        _report_accounts(progress, targets, details[: run.account_alerts])
+        progress.store_alerts(details[run.account_alerts :])
+
+    def _run_modules(
+        self,
+        targets: List[str],
+        version: int,
+        summary: AlertSummaryStore,
+        progress: RunProgress,
+        run_state: tuple = (),
+    ) -> Optional[Dict[str, object]]:
+        """Esegue i moduli per account con il motore configurato; restituisce l'esito della verifica."""
+
+        if self.engine == "module":
+            batch = AlertSummaryStore()
+            run_module_major(self.store, targets, batch, ALERT_MODULES)
+            _report_accounts(progress, targets, summary.extend(batch.all_alerts()))
+            return None
+        shards = self._shards(targets)
+        analysed = self._run_parallel(shards, version, summary, progress, run_state) if len(shards) > 1 else 0
+        if analysed < len(targets):
+            run_accounts(self.store, targets[analysed:], summary, progress)
+        if self.engine == "parity":
+            return self._check_parity(targets, summary.all_alerts())
+        return None
+
+    def _run_incremental(
+        self,
+        targets: List[str],
+        version: int,
+        summary: AlertSummaryStore,
+        progress: RunProgress,
+        *,
+        full: bool,
+        run_state: tuple = (),
+    ) -> Tuple[Optional[Dict[str, object]], int]:
+        """Ricalcola solo gli account la cui impronta è cambiata dall'ultimo ciclo.
+
+        Le allerte degli altri account vengono riprese dalla cache e inserite al
+        loro posto, quindi il risultato coincide con un ricalcolo completo. Lo
+        stato del ciclo preparato dai moduli (``run_state``, un dizionario per
+        modulo) può solo aggiungere voci: se una voce già nota cambia o sparisce,
+        la cache non vale più e tutti gli account vengono ricalcolati.
+        Restituisce l'esito della verifica dei motori e gli account ricalcolati.
+        """
+
+        fingerprints = {account_id: self.store.account_fingerprint(account_id) for account_id in targets}
+        with self._cache_lock:
+            if not _state_extends(run_state, self._account_state):
+                self._account_alerts.clear()
+            self._account_state = run_state
+            cached = {account_id: self._account_alerts.get(account_id) for account_id in targets}
+        stale = [
+            account_id
+            for account_id in targets
+            if cached[account_id] is None or cached[account_id][0] != fingerprints[account_id]
+        ]
+        print(f"[Allerte] Account da ricalcolare: {len(stale)} su {len(targets)}.")
+        log_loop_event(
+            f"Ciclo incrementale: {len(stale)} account da ricalcolare, "
+            f"{len(targets) - len(stale)} ripresi dalla cache."
+        )
+
+        stale_ids = set(stale)
+        for account_id in targets:
+            if account_id not in stale_ids:
+                progress.account(account_id, cached[account_id][1])
+        fresh = AlertSummaryStore()
+        parity = self._run_modules(stale, version, fresh, progress, run_state) if stale else None
+        alerts_by_account: Dict[str, List[Dict[str, str]]] = {account_id: [] for account_id in stale}
+        for alert in fresh.all_alerts():
+            alerts_by_account[alert["account_id"]].append(alert)
+
+        with self._cache_lock:
+            # Se un ciclo concorrente ha cambiato lo stato, queste allerte non entrano in cache.
+            if _state_extends(self._account_state, run_state):
+                if full:
+                    # Ciclo sull'intero archivio: gli account spariti escono dalla cache.
+                    for account_id in set(self._account_alerts) - fingerprints.keys():
+                        del self._account_alerts[account_id]
+                for account_id in stale:
+                    self._account_alerts[account_id] = (fingerprints[account_id], alerts_by_account[account_id])
+
+        for account_id in targets:
+            alerts = alerts_by_account.get(account_id)
+            summary.extend(cached[account_id][1] if alerts is None else alerts)
+        return parity, len(stale)
+
+    def _run_store_modules(
+        self, targets: List[str], version: int, summary: AlertSummaryStore, progress: RunProgress
+    ) -> None:
+        """Esegue i controlli sull'intero archivio, riusando quelli del ciclo precedente se possibile.
+
+        Nel ciclo incrementale il risultato dipende solo dalla versione
+        dell'archivio e dagli account analizzati: se coincidono, le allerte del
+        ciclo precedente vengono riprese senza ripetere il raggruppamento.
+        """
+
+        key = (version, tuple(targets))
+        with self._cache_lock:
+            cached = self._store_alerts
+        if self.incremental and cached is not None and cached[0] == key:
+            print("[Allerte] Controlli sull'intero archivio ripresi dal ciclo precedente.")
+            progress.store_alerts(summary.extend(cached[1]))
+            return
+
+        print("[Allerte] Controlli sull'intero archivio in corso.")
+        collected = AlertSummaryStore()
+        for module in STORE_ALERT_MODULES:
+            module.run_store(self.store, targets, summary=collected)
+        alerts = collected.all_alerts()
+        if self.incremental:
+            with self._cache_lock:
+                self._store_alerts = (key, alerts)
+        progress.store_alerts(summary.extend(alerts))
+
+    def _check_parity(self, targets: List[str], expected: List[Dict[str, str]]) -> Dict[str, object]:
+        """Ripete i moduli per account con il motore insiemistico e confronta le allerte."""
+
+        batch = AlertSummaryStore()
+        run_module_major(self.store, targets, batch, ALERT_MODULES)
+        difference = compare_alerts(expected, batch.all_alerts())
+        if difference is None:
+            print(f"[Allerte] Motore insiemistico allineato al ciclo per account ({len(expected)} allerte).")
+            log_loop_event(f"Verifica motori: {len(expected)} allerte identiche nei due motori.")
+        else:
+            print(f"[Allerte] Motore insiemistico NON allineato: {difference}")
+            log_loop_event(f"Verifica motori fallita: {difference}")
+        return {"matching": difference is None, "difference": difference}
+
+    def _publish(self, run_number: int, run: AlertRun) -> None:
+        """Rende ``run`` il ciclo corrente, salvo che uno più recente sia già pubblicato."""
+
+        with self._publish_lock:
+            if run_number > self._published_run:
+                self._published_run = run_number
+                self.summary = run.summary
+                self.published = run
+
+    def _shards(self, targets: List[str]) -> List[List[str]]:
+        """Divide gli account in partizioni contigue (una sola se il ciclo resta seriale)."""
+
+        if self.workers <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+            return [targets]
+        count = min(self.workers * SHARDS_PER_WORKER, len(targets) // SHARD_MIN_ACCOUNTS)
+        if count <= 1:
+            return [targets]
+        size, extra = divmod(len(targets), count)
+        shards = []
+        start = 0
+        for index in range(count):
+            end = start + size + (1 if index < extra else 0)
+            shards.append(targets[start:end])
+            start = end
+        return shards
+
+    def _run_parallel(
+        self,
+        shards: List[List[str]],
+        version: int,
+        summary: AlertSummaryStore,
+        progress: RunProgress,
+        run_state: tuple = (),
+    ) -> int:
+        """Analizza le partizioni nei processi figli e restituisce gli account analizzati.
+
+        Le partizioni vengono riunite nell'ordine: se un figlio legge una versione
+        diversa, gli account dalla sua partizione in poi vanno ripetuti in serie.
+        """
+
+        workers = min(self.workers, len(shards))
+        print(f"[Allerte] Ciclo parallelo: {len(shards)} partizioni su {workers} processi.")
+        log_loop_event(f"Ciclo allerte parallelo con {len(shards)} partizioni su {workers} processi.")
+        context = multiprocessing.get_context("fork")
+        with _FORK_LOCK:
+            # Oggetti congelati: il garbage collector dei figli non tocca le pagine condivise.
+            gc.freeze()
+            try:
+                pool = context.Pool(
+                    workers, initializer=_after_fork, initargs=(self.store, version, run_state)
+                )
+            finally:
+                gc.unfreeze()
+        analysed = 0
+        try:
+            with pool:
+                for shard, alerts in zip(shards, pool.imap(_run_shard, shards, chunksize=1)):
+                    _report_accounts(progress, shard, summary.extend(alerts))
+                    analysed += len(shard)
+        except StaleShardError as error:
+            print(f"[Allerte] Ciclo parallelo annullato: {error} Ripeto in serie.")
+            log_loop_event(f"Ciclo parallelo annullato ({error}); ripetizione seriale.")
+        return analysed
+
+    def clear_summary(self) -> None:
+        """Sostituisce il riepilogo corrente con uno vuoto, ad esempio dopo aver svuotato l'archivio."""
+
+        with self._publish_lock:
+            self._published_run = max(self._published_run, next(self._runs))
+            self.summary = AlertSummaryStore()
+            self.published = None
+        with self._cache_lock:
+            self._account_alerts.clear()
+            self._store_alerts = None
+            self._cached_run = None
 
     def _iter_targets(self, account_ids: Optional[Sequence[str]]) -> Iterable[str]:
         if account_ids:
             seen = set()
             for account_id in account_ids:
-                if account_id in self.store.accounts and account_id not in seen:
+                if account_id not in seen and self.store.get_account(account_id) is not None:
                     seen.add(account_id)
                     yield account_id
                 else:
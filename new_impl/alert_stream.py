@@ -0,0 +1,119 @@
+"""Ciclo di allerte trasmesso in streaming, account per account."""
+
+from __future__ import annotations
+
+import queue
+import threading
+from time import perf_counter
+from typing import Dict, Iterator, List, Optional
+
+from .alert_loop import RunProgress
+from .logbook import log_loop_event
+from .workspaces import WorkspaceRegistry
+
+# Eventi in attesa di essere letti: oltre questo limite il ciclo aspetta il client.
+STREAM_QUEUE_SIZE = 256
+# Intervallo minimo tra due eventi ``progress``, in secondi.
+PROGRESS_INTERVAL = 0.25
+
+
+class AlertStream(RunProgress):
+    """Esegue un ciclo in un thread dedicato e ne espone gli eventi nell'ordine di arrivo.
+
+    Ogni evento è un dizionario con il campo ``event``:
+
+    - ``start``: ``total`` account da analizzare e ``store_version``;
+    - ``alerts``: le allerte di un account (``account_id``), solo se ce ne sono;
+      ``account_id`` è ``None`` per i controlli sull'intero archivio;
+    - ``progress``: ``processed``, ``total`` ed ``elapsed`` in secondi, al più ogni
+      ``PROGRESS_INTERVAL`` e a fine ciclo;
+    - ``done``: l'ultimo evento, con le statistiche e gli altri campi della risposta
+      di ``/api/alerts/run`` tranne l'elenco delle allerte, più ``cached``;
+    - ``error``: il ciclo si è interrotto.
+
+    La coda è limitata, quindi un client lento rallenta il ciclo invece di
+    accumulare allerte in memoria. Se il client si disconnette (:meth:`close`) il
+    ciclo prosegue senza accodare altro e il suo risultato resta in cache.
+    """
+
+    def __init__(self, workspaces: WorkspaceRegistry, workspace_id: str) -> None:
+        super().__init__()
+        self.workspaces = workspaces
+        self.workspace_id = workspace_id
+        self._queue: "queue.Queue[Optional[Dict[str, object]]]" = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+        self._closed = threading.Event()
+        self._last_progress = 0.0
+
+    def launch(self) -> None:
+        threading.Thread(target=self._run, name="sfbpca-alert-stream", daemon=True).start()
+
+    def events(self) -> Iterator[Dict[str, object]]:
+        """Restituisce gli eventi man mano che il ciclo li produce, fino a ``done`` o ``error``."""
+
+        try:
+            while True:
+                event = self._queue.get()
+                if event is None:
+                    return
+                yield event
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self._closed.set()
+
+    def _run(self) -> None:
+        try:
+            with self.workspaces.use(self.workspace_id) as workspace:
+                run, cached = workspace.alert_loop.execute(progress=self)
+        except Exception as error:  # pragma: no cover - errore inatteso nel ciclo
+            print(f"[Allerte] Ciclo in streaming interrotto da un errore inatteso: {error}")
+            log_loop_event(f"Ciclo allerte in streaming interrotto: {error!r}.")
+            self._put({"event": "error", "error": f"Errore inatteso durante il ciclo allerte: {error}"})
+        else:
+            self._put_progress()
+            final = {key: value for key, value in run.results.items() if key not in ("details", "summary")}
+            self._put({"event": "done", "cached": cached, **final})
+        finally:
+            self._put(None)
+
+    # ------------------------------------------------------------------
+    # RunProgress
+    # ------------------------------------------------------------------
+    def start(self, total: int, version: int) -> None:
+        super().start(total, version)
+        self._put({"event": "start", "total": total, "store_version": version})
+
+    def account(self, account_id: str, alerts: List[Dict[str, str]]) -> None:
+        super().account(account_id, alerts)
+        if alerts:
+            self._put({"event": "alerts", "account_id": account_id, "alerts": alerts})
+        if perf_counter() - self._last_progress >= PROGRESS_INTERVAL:
+            self._put_progress()
+
+    def store_alerts(self, alerts: List[Dict[str, str]]) -> None:
+        if alerts:
+            self._put({"event": "alerts", "account_id": None, "alerts": alerts})
+
+    # ------------------------------------------------------------------
+    # Coda
+    # ------------------------------------------------------------------
+    def _put_progress(self) -> None:
+        self._last_progress = perf_counter()
+        self._put(
+            {
+                "event": "progress",
+                "processed": self.processed,
+                "total": self.total,
+                "elapsed": round(self.elapsed, 3),
+            }
+        )
+
+    def _put(self, event: Optional[Dict[str, object]]) -> None:
+        # Dopo la disconnessione del client gli eventi vengono scartati.
+        while not self._closed.is_set():
+            try:
+                self._queue.put(event, timeout=0.5)
+                return
+            except queue.Full:
+                continue
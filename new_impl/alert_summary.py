@@ -54,9 +54,13 @@ class AlertSummaryStore:
         normalised = {field: alert.get(field, "") for field in FIELDNAMES}
         self._alerts.append(normalised)
 
-    def extend(self, alerts: Iterable[Dict[str, str]]) -> None:
+    def extend(self, alerts: Iterable[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Registra ``alerts`` e restituisce le allerte normalizzate appena aggiunte."""
+
+        start = len(self._alerts)
         for alert in alerts:
             self.record(alert)
+        return self._alerts[start:]
 
     def all_alerts(self) -> List[Dict[str, str]]:
         return list(self._alerts)
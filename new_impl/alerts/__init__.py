@@ -4,6 +4,7 @@ from . import (  # noqa: F401
     check_contatti_senza_recapiti,
     check_contatti_senza_ruolo,
     check_duplicati_ruolo,
+    check_duplicati_tra_account,
     check_email_contactpoint,
     check_nominali_ruoli_differenti,
     check_sol_email,
@@ -14,6 +15,7 @@ __all__ = [
     "check_contatti_senza_recapiti",
     "check_contatti_senza_ruolo",
     "check_duplicati_ruolo",
+    "check_duplicati_tra_account",
     "check_email_contactpoint",
     "check_nominali_ruoli_differenti",
     "check_sol_email",
@@ -2,10 +2,14 @@
 
 from __future__ import annotations
 
+import sys
+from typing import Callable, Dict, Sequence
+
 from ..alert_summary import AlertSummaryStore
-from ..data_store import AccountContext, DATA_STORE
+from ..data_store import AccountContext
 from ..logbook import log_loop_event
-from .common import iter_contacts
+from .common import BatchScan, contact_keys, iter_batch_contacts
+from .visitor import AccountPass, ContactState, run_single
 
 
 def reset_state() -> None:  # pragma: no cover - nessuno stato da ripulire
@@ -17,40 +21,55 @@ def reset_state() -> None:  # pragma: no cover - nessuno stato da ripulire
 def run(account_context: AccountContext, *, summary: AlertSummaryStore) -> None:
     """Assicura che ogni contatto abbia almeno un recapito utilizzabile."""
 
-    account_id = account_context.account_id
-    account_name = DATA_STORE.resolve_account_name(account_id)
+    run_single(sys.modules[__name__], account_context, summary=summary)
 
-    for contact, _roles in iter_contacts(account_context):
-        contact_id = contact["Id"]
-        has_phone_general = bool((contact.get("Phone") or "").strip())
-        has_mobile = bool((contact.get("MobilePhone") or "").strip())
-        has_email = bool((contact.get("Email") or "").strip())
 
-        if has_mobile or has_email or has_phone_general:
-            log_loop_event(
-                f"[{account_id}] Contatto {contact_id} ha almeno un recapito, nessuna allerta recapiti."
-            )
-            continue
-
-        contact_name = DATA_STORE.resolve_contact_name(contact_id)
-        details = "Contatto privo alcun recapito (telefono o email) compilati."
-        message = "\n".join(
-            [
-                f"Il contatto {contact_name} non ha alcun recapito disponibile.",
-            ]
+def visit_contact(account: AccountPass, contact: ContactState, *, summary: AlertSummaryStore) -> None:
+    if contact.keys.reachable:
+        log_loop_event(
+            f"[{account.id}] Contatto {contact.id} ha almeno un recapito, nessuna allerta recapiti."
         )
+        return
 
-        summary.record(
-            {
-                "alert_type": "Contatto senza recapiti",
-                "account_id": account_id,
-                "account_name": account_name,
-                "contact_id": contact_id,
-                "contact_name": contact_name,
-                "details": details,
-                "message": message,
-                "contact_roles": ", ".join(_roles) or "Non indicato",
-                "issue_category": "Completezza",
-                "data_focus": "Recapiti",
-            }
-        )
+    summary.record(_alert(account.id, account.name, contact.id, contact.name, contact.roles))
+
+
+def run_batch(scan: BatchScan, *, store, emit: Callable[[int, Dict[str, str]], None]) -> None:
+    """Versione insiemistica: un solo filtro sulle relazioni di tutti gli account."""
+
+    for account_index, row, roles in iter_batch_contacts(scan):
+        if not contact_keys(row.contact).reachable:
+            account_id = row.account_id
+            contact_id = row.contact["Id"]
+            alert = _alert(
+                account_id,
+                store.resolve_account_name(account_id),
+                contact_id,
+                store.resolve_contact_name(contact_id),
+                roles,
+            )
+            emit(account_index, alert)
+
+
+def _alert(
+    account_id: str, account_name: str, contact_id: str, contact_name: str, roles: Sequence[str]
+) -> Dict[str, str]:
+    details = "Contatto privo alcun recapito (telefono o email) compilati."
+    message = "\n".join(
+        [
+            f"Il contatto {contact_name} non ha alcun recapito disponibile.",
+        ]
+    )
+
+    return {
+        "alert_type": "Contatto senza recapiti",
+        "account_id": account_id,
+        "account_name": account_name,
+        "contact_id": contact_id,
+        "contact_name": contact_name,
+        "details": details,
+        "message": message,
+        "contact_roles": ", ".join(roles) or "Non indicato",
+        "issue_category": "Completezza",
+        "data_focus": "Recapiti",
+    }
@@ -2,10 +2,14 @@
 
 from __future__ import annotations
 
+import sys
+from typing import Callable, Dict
+
 from ..alert_summary import AlertSummaryStore
-from ..data_store import AccountContext, DATA_STORE
+from ..data_store import AccountContext
 from ..logbook import log_loop_event
-from .common import iter_contacts
+from .common import BatchScan, iter_batch_contacts
+from .visitor import AccountPass, ContactState, run_single
 
 # Non serve stato condiviso, ma manteniamo l'interfaccia coerente
 
@@ -18,37 +22,53 @@ def reset_state() -> None:  # pragma: no cover - funzione vuota
 def run(account_context: AccountContext, *, summary: AlertSummaryStore) -> None:
     """Verifica che ogni contatto abbia almeno un ruolo valorizzato."""
 
-    account_id = account_context.account_id
-    account_name = DATA_STORE.resolve_account_name(account_id)
+    run_single(sys.modules[__name__], account_context, summary=summary)
 
-    for contact, roles in iter_contacts(account_context):
-        contact_id = contact["Id"]
-        if roles:
-            log_loop_event(
-                f"[{account_id}] Contatto {contact_id} ha ruoli valorizzati, nessuna allerta per ruoli mancanti."
-            )
-            continue
-
-        contact_name = DATA_STORE.resolve_contact_name(contact_id)
-        # Passo 1: descrivo il problema per il riepilogo.
-        details = "Contatto senza ruoli assegnati nella relazione AccountContact."
-        message = "\n".join(
-            [
-                f"Il contatto {contact_name} non presenta ruoli associati.",
-            ]
-        )
 
-        summary.record(
-            {
-                "alert_type": "Contatto senza ruolo",
-                "account_id": account_id,
-                "account_name": account_name,
-                "contact_id": contact_id,
-                "contact_name": contact_name,
-                "details": details,
-                "message": message,
-                "contact_roles": "Nessuno",
-                "issue_category": "Completezza",
-                "data_focus": "Ruoli",
-            }
+def visit_contact(account: AccountPass, contact: ContactState, *, summary: AlertSummaryStore) -> None:
+    if contact.roles:
+        log_loop_event(
+            f"[{account.id}] Contatto {contact.id} ha ruoli valorizzati, nessuna allerta per ruoli mancanti."
         )
+        return
+
+    summary.record(_alert(account.id, account.name, contact.id, contact.name))
+
+
+def run_batch(scan: BatchScan, *, store, emit: Callable[[int, Dict[str, str]], None]) -> None:
+    """Versione insiemistica: un solo filtro sulle relazioni di tutti gli account."""
+
+    for account_index, row, roles in iter_batch_contacts(scan):
+        if not roles:
+            account_id = row.account_id
+            contact_id = row.contact["Id"]
+            alert = _alert(
+                account_id,
+                store.resolve_account_name(account_id),
+                contact_id,
+                store.resolve_contact_name(contact_id),
+            )
+            emit(account_index, alert)
+
+
+def _alert(account_id: str, account_name: str, contact_id: str, contact_name: str) -> Dict[str, str]:
+    # Passo 1: descrivo il problema per il riepilogo.
+    details = "Contatto senza ruoli assegnati nella relazione AccountContact."
+    message = "\n".join(
+        [
+            f"Il contatto {contact_name} non presenta ruoli associati.",
+        ]
+    )
+
+    return {
+        "alert_type": "Contatto senza ruolo",
+        "account_id": account_id,
+        "account_name": account_name,
+        "contact_id": contact_id,
+        "contact_name": contact_name,
+        "details": details,
+        "message": message,
+        "contact_roles": "Nessuno",
+        "issue_category": "Completezza",
+        "data_focus": "Ruoli",
+    }
@@ -2,106 +2,200 @@
 
 from __future__ import annotations
 
-from typing import Dict, List, Tuple
+import sys
+import threading
+from typing import Callable, Dict, Iterator, List, Sequence, Set, Tuple
 
 from ..alert_summary import AlertSummaryStore
-from ..data_store import AccountContext, DATA_STORE
+from ..data_store import AccountContext
 from ..logbook import log_loop_event
-from .common import iter_contacts, normalise_name, normalise_text
+from ..normalization import ContactKeys, RelationKeys
+from .common import BatchScan, contact_keys, iter_batch_contacts, role_keys
+from .visitor import AccountPass, ContactState, run_single
 
-# Cache per evitare di emettere la stessa allerta più volte
-_EMITTED: set[Tuple[str, str, str, str]] = set()
-# Mappa di supporto per ricordare la forma originale dei ruoli
-_ROLE_LABELS: Dict[str, str] = {}
+# Chiave dei gruppi: account, ruolo, tipo e valore dell'identificativo, azienda, nome.
+BucketKey = Tuple[str, str, str, str, str, str]
+Groups = Tuple[Dict[BucketKey, List[str]], Dict[Tuple[str, str], str]]
+
+# Etichette dei ruoli del ciclo in corso, per thread: più aree possono eseguire
+# cicli in contemporanea, e i processi figli ereditano quelle del thread che li crea.
+_RUN = threading.local()
 
 
 def reset_state() -> None:
-    """Ripulisce lo stato condiviso tra le esecuzioni."""
+    """Dimentica le etichette dei ruoli del ciclo precedente in questo thread."""
+
+    _RUN.role_labels = {}
+
+
+def prepare_run(store, account_ids: Sequence[str]) -> Dict[str, str]:
+    """Fissa la forma originale di ogni ruolo normalizzato per l'intero ciclo e la restituisce.
+
+    Vale la prima forma incontrata scorrendo gli account nell'ordine del ciclo e i
+    loro contatti, come quando le etichette si accumulavano account dopo account:
+    calcolarle prima del ciclo rende ogni account indipendente dagli altri, quindi
+    analizzabile in un processo figlio o ripreso dalla cache.
+    """
+
+    positions = {account_id: index for index, account_id in enumerate(account_ids)}
+    first_seen: Dict[str, Tuple[int, str]] = {}
+    for row in store.iter_contact_rows():
+        index = positions.get(row.account_id)
+        if index is None or not row.contact.get("Id"):
+            continue
+        relation_keys = role_keys(row.contact)
+        if relation_keys.referente_sol or not contact_keys(row.contact).name:
+            continue
+        for role, role_token in zip(relation_keys.roles, relation_keys.role_tokens):
+            # Le righe di un account seguono l'ordine dei suoi contatti.
+            if role_token and (role_token not in first_seen or first_seen[role_token][0] > index):
+                first_seen[role_token] = (index, role)
+    _RUN.role_labels = {role_token: role for role_token, (_index, role) in first_seen.items()}
+    return dict(_RUN.role_labels)
+
 
-    _EMITTED.clear()
-    _ROLE_LABELS.clear()
+def restore_run(role_labels: Dict[str, str]) -> None:
+    """Reinstalla nel thread corrente le etichette restituite da :func:`prepare_run`."""
+
+    _RUN.role_labels = dict(role_labels)
+
+
+def _run_label(role_token: str, role_labels: Dict[Tuple[str, str], str], account_id: str) -> str:
+    # Senza prepare_run (modulo eseguito da solo) vale la forma vista nell'account.
+    labels = getattr(_RUN, "role_labels", None) or {}
+    return labels.get(role_token) or role_labels.get((account_id, role_token), role_token)
 
 
 def run(account_context: AccountContext, *, summary: AlertSummaryStore) -> None:
     """Cerca contatti con lo stesso ruolo, nome e identificativo."""
 
-    account_id = account_context.account_id
-    account_name = DATA_STORE.resolve_account_name(account_id)
-
-    # Passo 1: raggruppo i contatti per ruolo, nome e identificativi fiscali.
-    buckets: Dict[Tuple[str, str, str, str, str], List[str]] = {}
-    for contact, roles in iter_contacts(account_context):
-        contact_id = contact["Id"]
-        name_token = normalise_name(contact)
-        if not name_token:
-            log_loop_event(
-                f"[{account_id}] Contatto {contact_id} senza nome normalizzato, escluso dal controllo duplicati ruolo."
+    run_single(sys.modules[__name__], account_context, summary=summary)
+
+
+def visit_contact(account: AccountPass, contact: ContactState, *, summary: AlertSummaryStore) -> None:
+    buckets, role_labels = account.scratch(__name__, _new_groups)
+    _collect(account.id, contact.id, contact.keys, contact.relation_keys, buckets, role_labels, log_loop_event)
+
+
+def finish_account(account: AccountPass, *, summary: AlertSummaryStore) -> None:
+    buckets, role_labels = account.scratch(__name__, _new_groups)
+    for _account_id, alert in _alerts(account.store, buckets, role_labels, log_loop_event):
+        summary.record(alert)
+
+
+def _new_groups() -> Groups:
+    # Gruppi dei contatti e forma originale dei ruoli, per un account.
+    return {}, {}
+
+
+def run_batch(scan: BatchScan, *, store, emit: Callable[[int, Dict[str, str]], None]) -> None:
+    """Versione insiemistica: un unico raggruppamento per account su tutto l'archivio.
+
+    I gruppi mantengono l'ordine di prima comparsa, quindi le allerte di ogni
+    account escono nello stesso ordine del ciclo per account.
+    """
+
+    buckets: Dict[BucketKey, List[str]] = {}
+    role_labels: Dict[Tuple[str, str], str] = {}
+    positions: Dict[str, int] = {}
+    for account_index, row, _roles in iter_batch_contacts(scan):
+        positions[row.account_id] = account_index
+        contact = row.contact
+        _collect(
+            row.account_id, contact["Id"], contact_keys(contact), role_keys(contact), buckets, role_labels, _no_log
+        )
+    for account_id, alert in _alerts(store, buckets, role_labels, _no_log):
+        emit(positions[account_id], alert)
+
+
+def _no_log(message: str) -> None:
+    return None
+
+
+def _collect(
+    account_id: str,
+    contact_id: str,
+    keys: ContactKeys,
+    relation_keys: RelationKeys,
+    buckets: Dict[BucketKey, List[str]],
+    role_labels: Dict[Tuple[str, str], str],
+    log: Callable[[str], None],
+) -> None:
+    """Passo 1: raggruppo i contatti per ruolo, nome e identificativi fiscali."""
+
+    name_token = keys.name
+    if not name_token:
+        log(
+            f"[{account_id}] Contatto {contact_id} senza nome normalizzato, escluso dal controllo duplicati ruolo."
+        )
+        return
+    silos_token = keys.company
+
+    identifiers = [
+        ("Codice fiscale", keys.fiscal_code),
+        ("Partita IVA", keys.vat_number),
+    ]
+    for role, role_token in zip(relation_keys.roles, relation_keys.role_tokens):
+        if not role_token:
+            log(
+                f"[{account_id}] Ruolo vuoto per contatto {contact_id}, salto tokenizzazione."
             )
             continue
-        silos_token = normalise_text(contact.get("Company__c"))
-
-        identifiers = [
-            ("Codice fiscale", normalise_text(contact.get("FiscalCode__c"))),
-            ("Partita IVA", normalise_text(contact.get("VATNumber__c"))),
-        ]
-        for role in roles:
-            role_token = normalise_text(role)
-            if not role_token:
-                log_loop_event(
-                    f"[{account_id}] Ruolo vuoto per contatto {contact_id}, salto tokenizzazione."
+        role_labels.setdefault((account_id, role_token), role)
+        for label, token in identifiers:
+            if not token:
+                log(
+                    f"[{account_id}] Identificativo {label} mancante per contatto {contact_id}, salto combinazione."
                 )
                 continue
-            _ROLE_LABELS.setdefault(role_token, role)
-            for label, token in identifiers:
-                if not token:
-                    log_loop_event(
-                        f"[{account_id}] Identificativo {label} mancante per contatto {contact_id}, salto combinazione."
-                    )
-                    continue
-                key = (role_token, label, token, silos_token, name_token)
-                buckets.setdefault(key, []).append(contact_id)
-
-    # Passo 2: individuo i gruppi con più di un contatto.
-    for (role_token, label, token, silos_token, name_token), contact_ids in buckets.items():
+            key = (account_id, role_token, label, token, silos_token, name_token)
+            buckets.setdefault(key, []).append(contact_id)
+
+
+def _alerts(
+    store,
+    buckets: Dict[BucketKey, List[str]],
+    role_labels: Dict[Tuple[str, str], str],
+    log: Callable[[str], None],
+) -> Iterator[Tuple[str, Dict[str, str]]]:
+    """Passi 2 e 3: restituisce ``(account_id, allerta)`` per i gruppi con più contatti."""
+
+    # Cache per evitare di emettere la stessa allerta più volte
+    emitted: Set[Tuple[str, str, str, str, str]] = set()
+    for (account_id, role_token, label, token, silos_token, name_token), contact_ids in buckets.items():
         unique_ids = list(dict.fromkeys(contact_ids))
         if len(unique_ids) < 2:
-            log_loop_event(
+            log(
                 f"[{account_id}] Solo un contatto per ruolo '{role_token}' e {label} '{token}', nessuna allerta."
             )
             continue
 
         cache_key = (account_id, role_token, label, token, silos_token)
-        if cache_key in _EMITTED:
-            log_loop_event(
-                f"[{account_id}] Allerta duplicati già emessa per ruolo '{role_token}' e {label} '{token}', salto." 
+        if cache_key in emitted:
+            log(
+                f"[{account_id}] Allerta duplicati già emessa per ruolo '{role_token}' e {label} '{token}', salto."
             )
             continue
-        _EMITTED.add(cache_key)
+        emitted.add(cache_key)
 
-        role_label = _ROLE_LABELS.get(role_token, role_token)
-        contact_names = [DATA_STORE.resolve_contact_name(cid) for cid in unique_ids]
+        role_label = _run_label(role_token, role_labels, account_id)
+        contact_names = [store.resolve_contact_name(cid) for cid in unique_ids]
 
         # Passo 3: costruisco messaggi di dettaglio in italiano.
         details = (
             f"Ruolo '{role_label}' con {label.lower()} '{token}' associato a {len(contact_names)} contatti "
             f"con stesso nominativo."
         )
-        message_lines = [
-        ]
-        message_lines.extend([f"    - {name}" for name in contact_names])
-        message = ""
-
-        summary.record(
-            {
-                "alert_type": "Duplicati per ruolo e identificativo",
-                "account_id": account_id,
-                "account_name": account_name,
-                "contact_id": ", ".join(unique_ids),
-                "contact_name": ", ".join(contact_names),
-                "details": details,
-                "message": message,
-                "contact_roles": role_label,
-                "issue_category": "Duplicati",
-                "data_focus": label,
-            }
-        )
+
+        yield account_id, {
+            "alert_type": "Duplicati per ruolo e identificativo",
+            "account_id": account_id,
+            "account_name": store.resolve_account_name(account_id),
+            "contact_id": ", ".join(unique_ids),
+            "contact_name": ", ".join(contact_names),
+            "details": details,
+            "message": "",
+            "contact_roles": role_label,
+            "issue_category": "Duplicati",
+            "data_focus": label,
+        }
@@ -0,0 +1,84 @@
+"""Allerta sui contatti di account diversi che condividono un identificativo."""
+
+from __future__ import annotations
+
+from typing import Dict, List, Sequence, Tuple
+
+from ..alert_summary import AlertSummaryStore
+from ..logbook import log_loop_event
+
+# Identificativi indicizzati dall'archivio e relativa etichetta nei messaggi.
+IDENTIFIER_LABELS: Tuple[Tuple[str, str], ...] = (
+    ("fiscal_code", "Codice fiscale"),
+    ("vat_number", "Partita IVA"),
+    ("phone", "Telefono"),
+    ("email", "Email"),
+)
+
+
+def reset_state() -> None:  # pragma: no cover - nessuno stato condiviso
+    return None
+
+
+def run_store(store, account_ids: Sequence[str], *, summary: AlertSummaryStore) -> None:
+    """Cerca identificativi condivisi da contatti collegati ad account diversi.
+
+    A differenza degli altri moduli non gira per account: scorre una sola volta gli
+    indici invertiti che l'archivio mantiene all'import (codice fiscale, partita IVA,
+    telefono ed email normalizzati) e valuta soltanto i valori presenti su più contatti.
+    """
+
+    # Passo 1: collego ogni contatto agli account analizzati in questo ciclo.
+    targets = set(account_ids)
+    contact_accounts: Dict[str, List[str]] = {}
+    for account_id, contact_id in store.iter_account_contacts():
+        if account_id not in targets:
+            continue
+        accounts = contact_accounts.setdefault(contact_id, [])
+        if account_id not in accounts:
+            accounts.append(account_id)
+
+    # Passo 2: un gruppo per valore condiviso; ordino per avere un risultato stabile.
+    emitted = 0
+    for kind, label in IDENTIFIER_LABELS:
+        groups: List[Tuple[str, List[str], List[str]]] = []
+        for value, contact_ids in store.iter_shared_identifiers(kind):
+            members = sorted({contact_id for contact_id in contact_ids if contact_id in contact_accounts})
+            if len(members) < 2:
+                continue
+            accounts = sorted({account_id for member in members for account_id in contact_accounts[member]})
+            if len(accounts) < 2:
+                continue
+            groups.append((value, members, accounts))
+        groups.sort(key=lambda group: group[0])
+
+        # Passo 3: un'allerta per ogni identificativo condiviso tra account.
+        for value, members, accounts in groups:
+            account_names = {account_id: store.resolve_account_name(account_id) for account_id in accounts}
+            contact_names = [store.resolve_contact_name(contact_id) for contact_id in members]
+            details = (
+                f"{label} '{value}' condiviso da {len(members)} contatti "
+                f"su {len(accounts)} account diversi."
+            )
+            message = "\n".join(
+                f"    - {name}: "
+                + ", ".join(account_names[account_id] for account_id in contact_accounts[contact_id])
+                for contact_id, name in zip(members, contact_names, strict=False)
+            )
+            summary.record(
+                {
+                    "alert_type": "Duplicati tra account",
+                    "account_id": ", ".join(accounts),
+                    "account_name": ", ".join(account_names.values()),
+                    "contact_id": ", ".join(members),
+                    "contact_name": ", ".join(contact_names),
+                    "details": details,
+                    "message": message,
+                    "contact_roles": "Non indicato",
+                    "issue_category": "Duplicati",
+                    "data_focus": label,
+                }
+            )
+        emitted += len(groups)
+
+    log_loop_event(f"Controllo duplicati tra account completato con {emitted} identificativi condivisi.")
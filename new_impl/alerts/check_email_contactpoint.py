@@ -2,16 +2,14 @@
 
 from __future__ import annotations
 
-from typing import List
+import sys
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
 
 from ..alert_summary import AlertSummaryStore
-from ..data_store import AccountContext, DATA_STORE
+from ..data_store import AccountContext
 from ..logbook import log_loop_event
-from .common import iter_contacts, normalise_text
-
-
-def _normalise_email(value: str | None) -> str:
-    return normalise_text(value)
+from .common import EMPTY_TOKEN, BatchScan, contact_keys, email_keys, iter_batch_contacts
+from .visitor import AccountPass, ContactState, run_single
 
 
 def reset_state() -> None:  # pragma: no cover - nessuno stato condiviso
@@ -21,62 +19,106 @@ def reset_state() -> None:  # pragma: no cover - nessuno stato condiviso
 def run(account_context: AccountContext, *, summary: AlertSummaryStore) -> None:
     """Allinea l'indirizzo email del contatto con i ContactPointEmail."""
 
-    account_id = account_context.account_id
-    account_name = DATA_STORE.resolve_account_name(account_id)
+    run_single(sys.modules[__name__], account_context, summary=summary)
 
-    for contact, roles in iter_contacts(account_context):
-        contact_id = contact["Id"]
-        contact_name = DATA_STORE.resolve_contact_name(contact_id)
-
-        email_on_contact = _normalise_email(contact.get("Email"))
-        email_on_contact = '' if email_on_contact.lower() == 'TOOL-VUOTO'.lower() else email_on_contact
-        contact_points = DATA_STORE.get_contact_points_for_contact(contact_id)["emails"]
-        emails_on_points: List[str] = [
-            _normalise_email(point.get("EmailAddress"))
-            for point in contact_points
-            if _normalise_email(point.get("EmailAddress"))
-        ]
 
+def visit_contact(account: AccountPass, contact: ContactState, *, summary: AlertSummaryStore) -> None:
+    details, email_on_contact, emails_on_points = _compare(contact.contact, contact.points["emails"])
+    if details is None:
         if not email_on_contact and not emails_on_points:
             log_loop_event(
-                f"[{account_id}] Nessuna email trovata per contatto {contact_id}, salto controllo."
+                f"[{account.id}] Nessuna email trovata per contatto {contact.id}, salto controllo."
             )
-            continue
-
-        if email_on_contact and not emails_on_points:
-            details = "Email presente sul contatto ma non sui ContactPointEmail."
-        elif emails_on_points and not email_on_contact:
-            details = "ContactPointEmail valorizzati ma il campo Email del contatto è vuoto."
         else:
-            if email_on_contact in emails_on_points:
-                log_loop_event(
-                    f"[{account_id}] Email coincidenti per contatto {contact_id}, nessuna allerta."
-                )
-                continue
-            details = "Email presenti ma non coincidono tra Contact e ContactPointEmail."
-
-        message_lines = [
-            f"Email sul contatto: {email_on_contact or 'assenza'}.",
-        ]
-        if emails_on_points:
-            message_lines.append(
-                "Email su ContactPointEmail: " + ", ".join(emails_on_points)
+            log_loop_event(
+                f"[{account.id}] Email coincidenti per contatto {contact.id}, nessuna allerta."
             )
-        else:
-            message_lines.append("Nessun ContactPointEmail valorizzato.")
-        message = "\n".join(message_lines)
-
-        summary.record(
-            {
-                "alert_type": "Email incoerente",
-                "account_id": account_id,
-                "account_name": account_name,
-                "contact_id": contact_id,
-                "contact_name": contact_name,
-                "details": details,
-                "message": message,
-                "contact_roles": ", ".join(roles) or "Non indicato",
-                "issue_category": "Coerenza",
-                "data_focus": "Email",
-            }
+        return
+
+    alert = _alert(
+        account.id, account.name, contact.id, contact.name, contact.roles,
+        details, email_on_contact, emails_on_points,
+    )
+    summary.record(alert)
+
+
+def run_batch(scan: BatchScan, *, store, emit: Callable[[int, Dict[str, str]], None]) -> None:
+    """Versione insiemistica: una scansione delle relazioni unite ai ContactPointEmail."""
+
+    for account_index, row, roles in iter_batch_contacts(scan, with_points=True):
+        details, email_on_contact, emails_on_points = _compare(row.contact, row.points["emails"])
+        if details is None:
+            continue
+        account_id = row.account_id
+        contact_id = row.contact["Id"]
+        alert = _alert(
+            account_id,
+            store.resolve_account_name(account_id),
+            contact_id,
+            store.resolve_contact_name(contact_id),
+            roles,
+            details,
+            email_on_contact,
+            emails_on_points,
+        )
+        emit(account_index, alert)
+
+
+def _compare(
+    contact: Mapping[str, str], contact_points: Sequence[Mapping[str, str]]
+) -> Tuple[Optional[str], str, List[str]]:
+    """Restituisce il dettaglio dell'incoerenza (``None`` se assente) e le email confrontate."""
+
+    email_on_contact = contact_keys(contact).email
+    email_on_contact = '' if email_on_contact == EMPTY_TOKEN else email_on_contact
+    emails_on_points: List[str] = [
+        address for address in (email_keys(point).address for point in contact_points) if address
+    ]
+
+    if not email_on_contact and not emails_on_points:
+        return None, email_on_contact, emails_on_points
+
+    if email_on_contact and not emails_on_points:
+        details = "Email presente sul contatto ma non sui ContactPointEmail."
+    elif emails_on_points and not email_on_contact:
+        details = "ContactPointEmail valorizzati ma il campo Email del contatto è vuoto."
+    else:
+        if email_on_contact in emails_on_points:
+            return None, email_on_contact, emails_on_points
+        details = "Email presenti ma non coincidono tra Contact e ContactPointEmail."
+    return details, email_on_contact, emails_on_points
+
+
+def _alert(
+    account_id: str,
+    account_name: str,
+    contact_id: str,
+    contact_name: str,
+    roles: Sequence[str],
+    details: str,
+    email_on_contact: str,
+    emails_on_points: List[str],
+) -> Dict[str, str]:
+    message_lines = [
+        f"Email sul contatto: {email_on_contact or 'assenza'}.",
+    ]
+    if emails_on_points:
+        message_lines.append(
+            "Email su ContactPointEmail: " + ", ".join(emails_on_points)
         )
+    else:
+        message_lines.append("Nessun ContactPointEmail valorizzato.")
+    message = "\n".join(message_lines)
+
+    return {
+        "alert_type": "Email incoerente",
+        "account_id": account_id,
+        "account_name": account_name,
+        "contact_id": contact_id,
+        "contact_name": contact_name,
+        "details": details,
+        "message": message,
+        "contact_roles": ", ".join(roles) or "Non indicato",
+        "issue_category": "Coerenza",
+        "data_focus": "Email",
+    }
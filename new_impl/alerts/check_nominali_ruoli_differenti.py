@@ -2,12 +2,16 @@
 
 from __future__ import annotations
 
-from typing import Dict, List, Tuple
+import sys
+from typing import Dict, List, Sequence, Tuple
 
 from ..alert_summary import AlertSummaryStore
-from ..data_store import AccountContext, DATA_STORE
+from ..data_store import AccountContext
 from ..logbook import log_loop_event
-from .common import iter_contacts, normalise_name
+from .visitor import AccountPass, ContactState, run_single
+
+# Contatti di un account raggruppati per nome normalizzato: (Id, ruoli, insieme dei ruoli).
+Buckets = Dict[str, List[Tuple[str, Sequence[str], Tuple[str, ...]]]]
 
 # Nessuno stato persistente necessario, ma manteniamo la firma coerente
 
@@ -18,19 +22,25 @@ def reset_state() -> None:  # pragma: no cover - funzione intenzionalmente vuota
 def run(account_context: AccountContext, *, summary: AlertSummaryStore) -> None:
     """Cerca omonimie con ruoli discordanti sullo stesso account."""
 
-    account_id = account_context.account_id
-    account_name = DATA_STORE.resolve_account_name(account_id)
+    run_single(sys.modules[__name__], account_context, summary=summary)
+
 
+def visit_contact(account: AccountPass, contact: ContactState, *, summary: AlertSummaryStore) -> None:
     # Passo 1: costruisco un indice per nome normalizzato.
-    buckets: Dict[str, List[Tuple[str, List[str]]]] = {}
-    for contact, roles in iter_contacts(account_context):
-        name_token = normalise_name(contact)
-        if not name_token:
-            log_loop_event(
-                f"[{account_id}] Contatto {contact.get('Id', 'sconosciuto')} senza nominativo, escluso dal controllo ruoli."
-            )
-            continue
-        buckets.setdefault(name_token, []).append((contact["Id"], roles))
+    buckets: Buckets = account.scratch(__name__, dict)
+    name_token = contact.keys.name
+    if not name_token:
+        log_loop_event(
+            f"[{account.id}] Contatto {contact.id} senza nominativo, escluso dal controllo ruoli."
+        )
+        return
+    buckets.setdefault(name_token, []).append((contact.id, contact.roles, contact.relation_keys.role_set))
+
+
+def finish_account(account: AccountPass, *, summary: AlertSummaryStore) -> None:
+    account_id = account.id
+    store = account.store
+    buckets: Buckets = account.scratch(__name__, dict)
 
     # Passo 2: analizzo ogni gruppo alla ricerca di ruoli incoerenti.
     for name_token, entries in buckets.items():
@@ -40,16 +50,16 @@ def run(account_context: AccountContext, *, summary: AlertSummaryStore) -> None:
             )
             continue
 
-        normalised_role_sets = {tuple(sorted(role.lower() for role in roles)) for _cid, roles in entries}
+        normalised_role_sets = {role_set for _cid, _roles, role_set in entries}
         if len(normalised_role_sets) <= 1:
             log_loop_event(
                 f"[{account_id}] Nominativo '{name_token}' con ruoli omogenei, nessuna allerta."
             )
             continue
 
-        contact_ids = [cid for cid, _ in entries]
-        contact_names = [DATA_STORE.resolve_contact_name(cid) for cid in contact_ids]
-        roles_by_contact = [", ".join(roles) or "Nessun ruolo" for _, roles in entries]
+        contact_ids = [cid for cid, _roles, _role_set in entries]
+        contact_names = [store.resolve_contact_name(cid) for cid in contact_ids]
+        roles_by_contact = [", ".join(roles) or "Nessun ruolo" for _cid, roles, _role_set in entries]
 
         details = "; ".join(
             f"{name} ➜ {roles}" for name, roles in zip(contact_names, roles_by_contact, strict=False)
@@ -63,7 +73,7 @@ def run(account_context: AccountContext, *, summary: AlertSummaryStore) -> None:
             {
                 "alert_type": "Omonimia con ruoli differenti",
                 "account_id": account_id,
-                "account_name": account_name,
+                "account_name": account.name,
                 "contact_id": ", ".join(contact_ids),
                 "contact_name": ", ".join(contact_names),
                 "details": details,
@@ -2,15 +2,20 @@
 
 from __future__ import annotations
 
+import sys
 from typing import List
 
 from ..alert_summary import AlertSummaryStore
-from ..data_store import AccountContext, DATA_STORE
+from ..data_store import AccountContext
 from ..logbook import log_loop_event
-from .common import has_referente_sol_role, iter_contacts, normalise_text
+from .common import email_keys, normalise_text
+from .visitor import AccountPass, ContactState, run_single
 
 TARGET_TYPE = normalise_text("E-mail SOL")
 
+# I Referenti SOL sono proprio i contatti da controllare.
+INCLUDE_REFERENTE_SOL = True
+
 
 def reset_state() -> None:  # pragma: no cover - nessun dato persistente
     return None
@@ -19,51 +24,49 @@ def reset_state() -> None:  # pragma: no cover - nessun dato persistente
 def run(account_context: AccountContext, *, summary: AlertSummaryStore) -> None:
     """Verifica che i Referenti SOL dispongano di un ContactPointEmail dedicato."""
 
-    account_id = account_context.account_id
-    account_name = DATA_STORE.resolve_account_name(account_id)
-
-    for contact, roles in iter_contacts(account_context, include_referente_sol=True):
-        if not has_referente_sol_role(roles):
-            log_loop_event(
-                f"[{account_id}] Contatto {contact.get('Id', 'sconosciuto')} non è Referente SOL, salto controllo email SOL."
-            )
-            continue
-
-        contact_id = contact["Id"]
-        contact_name = DATA_STORE.resolve_contact_name(contact_id)
-        contact_points = DATA_STORE.get_contact_points_for_contact(contact_id)["emails"]
-
-        sol_candidates: List[dict] = [
-            point for point in contact_points if normalise_text(point.get("Type__c")) == TARGET_TYPE
-        ]
-        valid_points = [point for point in sol_candidates if (point.get("EmailAddress") or "").strip()]
-
-        if valid_points:
-            log_loop_event(
-                f"[{account_id}] Contatto {contact_id} ha già un ContactPointEmail SOL valido, nessuna allerta."
-            )
-            continue
-
-        types_found = [normalise_text(point.get("Type__c")) or "(vuoto)" for point in contact_points]
-        details = (
-            "ContactPointEmail assente o senza tipo 'E-mail SOL' con indirizzo valorizzato. "
-            f"Tipologie trovate: {', '.join(types_found) if types_found else 'nessuna'}."
+    run_single(sys.modules[__name__], account_context, summary=summary)
+
+
+def visit_contact(account: AccountPass, contact: ContactState, *, summary: AlertSummaryStore) -> None:
+    if not contact.referente_sol:
+        log_loop_event(
+            f"[{account.id}] Contatto {contact.id} non è Referente SOL, salto controllo email SOL."
         )
+        return
+
+    contact_points = contact.points["emails"]
+
+    sol_candidates: List[dict] = [
+        point for point in contact_points if email_keys(point).type == TARGET_TYPE
+    ]
+    valid_points = [point for point in sol_candidates if email_keys(point).has_address]
 
-        message_lines = []
-        message = "\n".join(message_lines)
-
-        summary.record(
-            {
-                "alert_type": "Referente SOL senza email SOL",
-                "account_id": account_id,
-                "account_name": account_name,
-                "contact_id": contact_id,
-                "contact_name": contact_name,
-                "details": details,
-                "message": message,
-                "contact_roles": ", ".join(roles) or "Referente SOL-APP",
-                "issue_category": "Compliance",
-                "data_focus": "Email SOL",
-            }
+    if valid_points:
+        log_loop_event(
+            f"[{account.id}] Contatto {contact.id} ha già un ContactPointEmail SOL valido, nessuna allerta."
         )
+        return
+
+    types_found = [email_keys(point).type or "(vuoto)" for point in contact_points]
+    details = (
+        "ContactPointEmail assente o senza tipo 'E-mail SOL' con indirizzo valorizzato. "
+        f"Tipologie trovate: {', '.join(types_found) if types_found else 'nessuna'}."
+    )
+
+    message_lines = []
+    message = "\n".join(message_lines)
+
+    summary.record(
+        {
+            "alert_type": "Referente SOL senza email SOL",
+            "account_id": account.id,
+            "account_name": account.name,
+            "contact_id": contact.id,
+            "contact_name": contact.name,
+            "details": details,
+            "message": message,
+            "contact_roles": ", ".join(contact.roles) or "Referente SOL-APP",
+            "issue_category": "Compliance",
+            "data_focus": "Email SOL",
+        }
+    )
@@ -2,12 +2,14 @@
 
 from __future__ import annotations
 
-from typing import List
+import sys
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
 
 from ..alert_summary import AlertSummaryStore
-from ..data_store import AccountContext, DATA_STORE
+from ..data_store import AccountContext
 from ..logbook import log_loop_event
-from .common import iter_contacts, normalise_phone
+from .common import BatchScan, contact_keys, iter_batch_contacts, phone_keys
+from .visitor import AccountPass, ContactState, run_single
 
 
 def reset_state() -> None:  # pragma: no cover - nessuno stato globale necessario
@@ -17,81 +19,127 @@ def reset_state() -> None:  # pragma: no cover - nessuno stato globale necessari
 def run(account_context: AccountContext, *, summary: AlertSummaryStore) -> None:
     """Confronta i numeri di telefono dei contatti con i ContactPointPhone collegati."""
 
-    account_id = account_context.account_id
-    account_name = DATA_STORE.resolve_account_name(account_id)
-
-    for contact, roles in iter_contacts(account_context):
-        contact_id = contact["Id"]
-        contact_name = DATA_STORE.resolve_contact_name(contact_id)
-
-        # Passo 1: normalizzo i numeri presenti sul contatto.
-        numbers_on_contact = [
-            ("Telefono fisso", contact.get("Phone")),
-            ("Telefono mobile", contact.get("MobilePhone")),
-        ]
-        normalised_contact_numbers = {}
-        for label, value in numbers_on_contact:
-            normalised = normalise_phone(value)
-            if normalised:
-                normalised_contact_numbers[label] = normalised
-
-        # Passo 2: recupero i ContactPointPhone associati via Individual.
-        contact_points = DATA_STORE.get_contact_points_for_contact(contact_id)["phones"]
-        normalised_point_numbers: List[str] = []
-        for point in contact_points:
-            normalised = normalise_phone(point.get("TelephoneNumber"))
-            if normalised:
-                normalised_point_numbers.append(normalised)
-
-        contact_values: List[str] = [value for value in normalised_contact_numbers.values() if value]
-        point_values: List[str] = [value for value in normalised_point_numbers if value]
-
-        if not contact_values and not point_values:
-            log_loop_event(
-                f"[{account_id}] Nessun numero per contatto {contact_id}, salto controllo telefoni."
-            )
-            continue
+    run_single(sys.modules[__name__], account_context, summary=summary)
 
-        if contact_values and not point_values:
-            details = "Numeri presenti sul contatto ma assenti su ContactPointPhone."
-        elif point_values and not contact_values:
-            details = "ContactPointPhone valorizzati ma nessun numero sul contatto."
-        else:
-            has_match = any(value in point_values for value in contact_values)
-            if has_match:
-                log_loop_event(
-                    f"[{account_id}] Numeri coincidenti per contatto {contact_id}, nessuna allerta."
-                )
-                continue
-            details = "Numeri presenti ma non coincidono tra Contact e ContactPointPhone."
-
-        message_lines = []
-        if normalised_contact_numbers:
-            message_lines.append(
-                "Numeri sul contatto: "
-                + ", ".join(f"{label}={value}" for label, value in normalised_contact_numbers.items())
+
+def visit_contact(account: AccountPass, contact: ContactState, *, summary: AlertSummaryStore) -> None:
+    details, contact_numbers, point_values = _compare(contact.contact, contact.points["phones"])
+    if details is None:
+        if not contact_numbers and not point_values:
+            log_loop_event(
+                f"[{account.id}] Nessun numero per contatto {contact.id}, salto controllo telefoni."
             )
         else:
-            message_lines.append("Nessun numero memorizzato sul contatto.")
-        if point_values:
-            message_lines.append(
-                "Numeri su ContactPointPhone: " + ", ".join(point_values)
+            log_loop_event(
+                f"[{account.id}] Numeri coincidenti per contatto {contact.id}, nessuna allerta."
             )
-        else:
-            message_lines.append("Nessun ContactPointPhone con numero valorizzato.")
-        message = "\n".join(message_lines)
-
-        summary.record(
-            {
-                "alert_type": "Telefono incoerente",
-                "account_id": account_id,
-                "account_name": account_name,
-                "contact_id": contact_id,
-                "contact_name": contact_name,
-                "details": details,
-                "message": message,
-                "contact_roles": ", ".join(roles) or "Non indicato",
-                "issue_category": "Coerenza",
-                "data_focus": "Telefono",
-            }
+        return
+
+    alert = _alert(
+        account.id, account.name, contact.id, contact.name, contact.roles,
+        details, contact_numbers, point_values,
+    )
+    summary.record(alert)
+
+
+def run_batch(scan: BatchScan, *, store, emit: Callable[[int, Dict[str, str]], None]) -> None:
+    """Versione insiemistica: una scansione delle relazioni unite ai ContactPointPhone."""
+
+    for account_index, row, roles in iter_batch_contacts(scan, with_points=True):
+        details, contact_numbers, point_values = _compare(row.contact, row.points["phones"])
+        if details is None:
+            continue
+        account_id = row.account_id
+        contact_id = row.contact["Id"]
+        alert = _alert(
+            account_id,
+            store.resolve_account_name(account_id),
+            contact_id,
+            store.resolve_contact_name(contact_id),
+            roles,
+            details,
+            contact_numbers,
+            point_values,
+        )
+        emit(account_index, alert)
+
+
+def _compare(
+    contact: Mapping[str, str], contact_points: Sequence[Mapping[str, str]]
+) -> Tuple[Optional[str], Dict[str, str], List[str]]:
+    """Restituisce il dettaglio dell'incoerenza (``None`` se assente) e i numeri confrontati."""
+
+    # Passo 1: normalizzo i numeri presenti sul contatto.
+    keys = contact_keys(contact)
+    numbers_on_contact = [
+        ("Telefono fisso", keys.phone),
+        ("Telefono mobile", keys.mobile_phone),
+    ]
+    normalised_contact_numbers = {}
+    for label, normalised in numbers_on_contact:
+        if normalised:
+            normalised_contact_numbers[label] = normalised
+
+    # Passo 2: recupero i ContactPointPhone associati via Individual.
+    normalised_point_numbers: List[str] = []
+    for point in contact_points:
+        normalised = phone_keys(point).number
+        if normalised:
+            normalised_point_numbers.append(normalised)
+
+    contact_values: List[str] = [value for value in normalised_contact_numbers.values() if value]
+    point_values: List[str] = [value for value in normalised_point_numbers if value]
+
+    if not contact_values and not point_values:
+        return None, normalised_contact_numbers, point_values
+
+    if contact_values and not point_values:
+        details = "Numeri presenti sul contatto ma assenti su ContactPointPhone."
+    elif point_values and not contact_values:
+        details = "ContactPointPhone valorizzati ma nessun numero sul contatto."
+    else:
+        has_match = any(value in point_values for value in contact_values)
+        if has_match:
+            return None, normalised_contact_numbers, point_values
+        details = "Numeri presenti ma non coincidono tra Contact e ContactPointPhone."
+    return details, normalised_contact_numbers, point_values
+
+
+def _alert(
+    account_id: str,
+    account_name: str,
+    contact_id: str,
+    contact_name: str,
+    roles: Sequence[str],
+    details: str,
+    normalised_contact_numbers: Dict[str, str],
+    point_values: List[str],
+) -> Dict[str, str]:
+    message_lines = []
+    if normalised_contact_numbers:
+        message_lines.append(
+            "Numeri sul contatto: "
+            + ", ".join(f"{label}={value}" for label, value in normalised_contact_numbers.items())
+        )
+    else:
+        message_lines.append("Nessun numero memorizzato sul contatto.")
+    if point_values:
+        message_lines.append(
+            "Numeri su ContactPointPhone: " + ", ".join(point_values)
         )
+    else:
+        message_lines.append("Nessun ContactPointPhone con numero valorizzato.")
+    message = "\n".join(message_lines)
+
+    return {
+        "alert_type": "Telefono incoerente",
+        "account_id": account_id,
+        "account_name": account_name,
+        "contact_id": contact_id,
+        "contact_name": contact_name,
+        "details": details,
+        "message": message,
+        "contact_roles": ", ".join(roles) or "Non indicato",
+        "issue_category": "Coerenza",
+        "data_focus": "Telefono",
+    }
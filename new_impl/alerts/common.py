@@ -2,42 +2,74 @@
 
 from __future__ import annotations
 
-from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+from typing import Callable, Iterable, Iterator, List, Mapping, Sequence, Tuple
 
-from ..data_store import AccountContext, DATA_STORE
+from ..data_store import AccountContext, ContactRow, DATA_STORE
 from ..logbook import log_loop_event
+from ..normalization import (
+    EMPTY_TOKEN,
+    REFERENTE_SOL_ROLE,
+    ContactKeys,
+    EmailKeys,
+    PhoneKeys,
+    RelationKeys,
+    cached_keys,
+    contact_keys_for,
+    email_keys_for,
+    normalise_name,
+    normalise_phone,
+    normalise_text,
+    phone_keys_for,
+    relation_keys_for,
+)
 
-# Costante per riconoscere il ruolo da escludere dai check standard.
-REFERENTE_SOL_ROLE = "referente sol-app"
+__all__ = [
+    "EMPTY_TOKEN",
+    "REFERENTE_SOL_ROLE",
+    "contact_keys",
+    "email_keys",
+    "extract_roles",
+    "format_roles",
+    "has_referente_sol_role",
+    "iter_batch_contacts",
+    "iter_contacts",
+    "normalise_name",
+    "normalise_phone",
+    "normalise_text",
+    "phone_keys",
+    "resolve_contact_name",
+    "role_keys",
+]
 
 
-def normalise_text(value: str | None) -> str:
-    """Normalizza una stringa per confronti case-insensitive."""
+def contact_keys(contact: Mapping[str, str]) -> ContactKeys:
+    """Chiavi normalizzate del contatto (nome, telefoni, email, identificativi), calcolate all'import."""
 
-    return (value or "TOOL-VUOTO").strip().lower()
+    return cached_keys(contact, ContactKeys, contact_keys_for)
 
 
-def normalise_name(contact: Dict[str, str]) -> str:
-    """Restituisce nome e cognome normalizzati del contatto."""
+def role_keys(contact: Mapping[str, str]) -> RelationKeys:
+    """Ruoli del contatto letti dalla relazione AccountContact, già suddivisi e normalizzati."""
 
-    parts = [contact.get("FirstName"), contact.get("LastName")]
-    return " ".join(part.strip() for part in parts if part and part.strip()).lower()
+    return cached_keys(contact.get("_relation") or {}, RelationKeys, relation_keys_for)
 
 
-def normalise_phone(value: str | None) -> str:
-    """Riduce un numero di telefono ai soli caratteri numerici per confronti."""
+def phone_keys(point: Mapping[str, str]) -> PhoneKeys:
+    """Numero normalizzato di un ContactPointPhone."""
 
-    digits = [ch for ch in (value or "") if ch.isdigit()]
-    return "".join(digits)
+    return cached_keys(point, PhoneKeys, phone_keys_for)
 
 
-def extract_roles(contact: Dict[str, str]) -> List[str]:
+def email_keys(point: Mapping[str, str]) -> EmailKeys:
+    """Indirizzo e tipologia normalizzati di un ContactPointEmail."""
+
+    return cached_keys(point, EmailKeys, email_keys_for)
+
+
+def extract_roles(contact: Mapping[str, str]) -> List[str]:
     """Estrae i ruoli associati al contatto dalla relazione AccountContact."""
 
-    relation = contact.get("_relation") or {}
-    raw_roles = relation.get("Roles") or ""
-    roles = [role.strip() for role in raw_roles.split(";") if role.strip()]
-    return roles
+    return list(role_keys(contact).roles)
 
 
 def has_referente_sol_role(roles: Sequence[str]) -> bool:
@@ -50,8 +82,11 @@ def iter_contacts(
     account_context: AccountContext,
     *,
     include_referente_sol: bool = False,
-) -> Iterator[Tuple[Dict[str, str], List[str]]]:
-    """Restituisce i contatti di un account filtrando eventuali Referenti SOL."""
+) -> Iterator[Tuple[Mapping[str, str], Sequence[str]]]:
+    """Restituisce i contatti di un account filtrando eventuali Referenti SOL.
+
+    I ruoli sono la tupla precalcolata all'import per la relazione del contatto.
+    """
 
     for contact in account_context.contacts:
         contact_id = contact.get("Id")
@@ -61,21 +96,47 @@ def iter_contacts(
             )
             continue
 
-        roles = extract_roles(contact)
-        if not include_referente_sol and has_referente_sol_role(roles):
+        keys = role_keys(contact)
+        if not include_referente_sol and keys.referente_sol:
             log_loop_event(
                 f"Contatto {contact_id} ignorato per ruolo Referente SOL su account "
                 f"{account_context.account_id}."
             )
             continue
 
-        yield contact, roles
+        yield contact, keys.roles
+
+
+# Scansione dell'archivio passata ai moduli dal motore insiemistico: restituisce le
+# coppie (indice dell'account nel ciclo, riga relazione-contatto) in ordine di file.
+BatchScan = Callable[..., Iterator[Tuple[int, ContactRow]]]
+
+
+def iter_batch_contacts(
+    scan: BatchScan,
+    *,
+    with_points: bool = False,
+    include_referente_sol: bool = False,
+) -> Iterator[Tuple[int, ContactRow, Sequence[str]]]:
+    """Equivalente di :func:`iter_contacts` sull'intero archivio, per ``run_batch``.
+
+    Applica gli stessi filtri (contatti senza Id, Referenti SOL) senza annotarli
+    nel log contatto per contatto.
+    """
+
+    for account_index, row in scan(with_points=with_points):
+        if not row.contact.get("Id"):
+            continue
+        keys = role_keys(row.contact)
+        if not include_referente_sol and keys.referente_sol:
+            continue
+        yield account_index, row, keys.roles
 
 
-def resolve_contact_name(contact_id: str) -> str:
+def resolve_contact_name(contact_id: str, store=None) -> str:
     """Ottiene il nome completo del contatto per i messaggi di sintesi."""
 
-    return DATA_STORE.resolve_contact_name(contact_id)
+    return (store or DATA_STORE).resolve_contact_name(contact_id)
 
 
 def format_roles(roles: Iterable[str]) -> str:
@@ -0,0 +1,149 @@
+"""Visita unica dei contatti di un account, condivisa da tutti i moduli di allerta.
+
+Un modulo può dichiarare, oltre a ``run(account_context, *, summary)``:
+
+- ``visit_contact(account, contact, *, summary)``: chiamata una volta per contatto;
+- ``finish_account(account, *, summary)``: facoltativa, chiamata a fine account;
+- ``INCLUDE_REFERENTE_SOL = True`` per ricevere anche i Referenti SOL.
+
+:func:`visit_account` scorre i contatti dell'account una sola volta e passa a ogni
+modulo lo stesso :class:`ContactState`, in cui ruoli, chiavi normalizzate, nome e
+recapiti vengono calcolati al più una volta. I moduli senza ``visit_contact``
+vengono eseguiti con ``run`` come prima. Le allerte restano separate per modulo,
+quindi l'ordine finale (modulo per modulo, contatto per contatto) non cambia.
+"""
+
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, TypeVar
+
+from ..data_store import AccountContext
+from ..logbook import log_loop_event
+from ..normalization import ContactKeys, RelationKeys
+from .common import contact_keys, role_keys
+
+T = TypeVar("T")
+
+
+class AccountPass:
+    """Account in corso di visita, con uno spazio di lavoro per ogni modulo."""
+
+    __slots__ = ("context", "id", "store", "_name", "_scratch")
+
+    def __init__(self, context: AccountContext) -> None:
+        self.context = context
+        self.id = context.account_id
+        self.store = context.store
+        self._name: Optional[str] = None
+        self._scratch: Dict[str, object] = {}
+
+    @property
+    def name(self) -> str:
+        if self._name is None:
+            self._name = self.store.resolve_account_name(self.id)
+        return self._name
+
+    def scratch(self, owner: str, factory: Callable[[], T]) -> T:
+        """Restituisce lo stato di ``owner`` per questo account, creandolo con ``factory``."""
+
+        value = self._scratch.get(owner)
+        if value is None:
+            value = self._scratch[owner] = factory()
+        return value
+
+
+class ContactState:
+    """Contatto pre-elaborato una sola volta per account e condiviso tra i moduli."""
+
+    __slots__ = ("contact", "id", "relation_keys", "_store", "_keys", "_name", "_points")
+
+    def __init__(self, contact: Mapping[str, str], store) -> None:
+        self.contact = contact
+        self.id: str = contact["Id"]
+        self.relation_keys: RelationKeys = role_keys(contact)
+        self._store = store
+        self._keys: Optional[ContactKeys] = None
+        self._name: Optional[str] = None
+        self._points: Optional[Dict[str, Sequence[Mapping[str, str]]]] = None
+
+    @property
+    def roles(self) -> Sequence[str]:
+        return self.relation_keys.roles
+
+    @property
+    def referente_sol(self) -> bool:
+        return self.relation_keys.referente_sol
+
+    @property
+    def keys(self) -> ContactKeys:
+        if self._keys is None:
+            self._keys = contact_keys(self.contact)
+        return self._keys
+
+    @property
+    def name(self) -> str:
+        if self._name is None:
+            self._name = self._store.resolve_contact_name(self.id)
+        return self._name
+
+    @property
+    def points(self) -> Dict[str, Sequence[Mapping[str, str]]]:
+        if self._points is None:
+            self._points = self._store.get_contact_points_for_contact(self.id)
+        return self._points
+
+
+class _AlertBuffer:
+    """Raccoglie le allerte di un modulo per l'account corrente."""
+
+    __slots__ = ("alerts",)
+
+    def __init__(self) -> None:
+        self.alerts: List[Dict[str, str]] = []
+
+    def record(self, alert: Dict[str, str]) -> None:
+        if alert:
+            self.alerts.append(alert)
+
+
+def visit_account(context: AccountContext, modules: Sequence) -> List[List[Dict[str, str]]]:
+    """Esegue ``modules`` sull'account e restituisce le allerte di ciascuno, nell'ordine dei moduli."""
+
+    buffers = [_AlertBuffer() for _module in modules]
+    visitors = [
+        (module.visit_contact, getattr(module, "INCLUDE_REFERENTE_SOL", False), buffer)
+        for module, buffer in zip(modules, buffers)
+        if hasattr(module, "visit_contact")
+    ]
+    if visitors:
+        account = AccountPass(context)
+        excludes_sol = not all(include_sol for _visit, include_sol, _buffer in visitors)
+        for contact in context.contacts:
+            if not contact.get("Id"):
+                log_loop_event(f"Contatto senza Id in account {account.id}, ignorato.")
+                continue
+            state = ContactState(contact, account.store)
+            if state.referente_sol and excludes_sol:
+                log_loop_event(
+                    f"Contatto {state.id} ignorato per ruolo Referente SOL su account {account.id}."
+                )
+            for visit, include_sol, buffer in visitors:
+                if include_sol or not state.referente_sol:
+                    visit(account, state, summary=buffer)
+        for module, buffer in zip(modules, buffers):
+            finish = getattr(module, "finish_account", None)
+            if finish is not None and hasattr(module, "visit_contact"):
+                finish(account, summary=buffer)
+
+    for module, buffer in zip(modules, buffers):
+        if not hasattr(module, "visit_contact"):
+            module.run(context, summary=buffer)
+    return [buffer.alerts for buffer in buffers]
+
+
+def run_single(module, account_context: AccountContext, *, summary) -> None:
+    """Esegue gli hook di un solo modulo: implementa ``run`` per i moduli a visita."""
+
+    for alerts in visit_account(account_context, (module,)):
+        for alert in alerts:
+            summary.record(alert)
@@ -2,15 +2,32 @@
 
 from __future__ import annotations
 
+import base64
+import binascii
 import io
+import json
+import uuid
+from functools import wraps
 from pathlib import Path
+from time import sleep
+from typing import Callable, Dict, Iterator, Mapping, Optional, Tuple, Union
 
-from flask import Flask, Response, jsonify, render_template, request, send_file
+from flask import Flask, Response, g, jsonify, render_template, request, send_file
 
-from .alert_loop import ALERT_LOOP
-from .alert_summary import ALERT_SUMMARY
-from .csv_import import IMPORT_COORDINATOR
-from .logbook import LOG_FILE, read_log_bytes, read_log_lines
+from .alert_jobs import ALERT_JOBS, AlertJob
+from .alert_loop import AlertRun
+from .alert_stream import AlertStream
+from .csv_import import ARCHIVES_UPLOAD, DELETIONS_UPLOAD
+from .data_store import BrowsePage, ContactView
+from .import_jobs import IMPORT_JOBS, ImportJob
+from .logbook import log_file, read_log_bytes, read_log_lines
+from .workspaces import (
+    DEFAULT_WORKSPACE,
+    WORKSPACES,
+    WorkspaceLimitReached,
+    WorkspaceNotFound,
+    validate_workspace_id,
+)
 
 
 SUPPORTED_ENTITIES = [
@@ -35,59 +52,440 @@ BASE_DIR = Path(__file__).resolve().parent
 TEMPLATE_FOLDER = str(BASE_DIR / "ui" / "templates")
 STATIC_FOLDER = str(BASE_DIR / "ui" / "static")
 
+# Cookie che lega il browser alla propria area di lavoro.
+WORKSPACE_COOKIE = "sfbpca_workspace"
+
+# Dimensione predefinita e massima delle pagine restituite dalle API di consultazione.
+BROWSE_PAGE_SIZE = 50
+BROWSE_MAX_PAGE_SIZE = 500
+
+# Dimensione predefinita e massima delle pagine di allerte di un job.
+ALERT_JOB_PAGE_SIZE = 500
+ALERT_JOB_MAX_PAGE_SIZE = 5000
+
+
+def restore_snapshot() -> None:
+    """Ricarica l'ultimo snapshot salvato dell'area predefinita, se presente e valido."""
+
+    WORKSPACES.default.ensure_loaded()
+
+
+def _workspace_id() -> str:
+    """Area richiesta: parametro ``workspace``, header ``X-Workspace`` o cookie di sessione."""
+
+    return (
+        request.args.get("workspace")
+        or request.form.get("workspace")
+        or request.headers.get("X-Workspace")
+        or request.cookies.get(WORKSPACE_COOKIE)
+        or DEFAULT_WORKSPACE
+    )
+
+
+def in_workspace(view: Callable[..., Response]) -> Callable[..., Response]:
+    """Esegue la vista dentro l'area di lavoro della richiesta (``g.workspace``).
+
+    Solo le richieste che modificano i dati creano l'area: una ``GET`` su un'area
+    inesistente riceve 404 invece di occupare memoria e un file di log.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            workspace_id = validate_workspace_id(_workspace_id())
+        except ValueError as error:
+            return jsonify({"error": str(error)}), 400
+        try:
+            with WORKSPACES.use(workspace_id, create=request.method != "GET") as workspace:
+                g.workspace = workspace
+                return view(*args, **kwargs)
+        except WorkspaceNotFound as error:
+            return jsonify({"error": str(error)}), 404
+        except WorkspaceLimitReached as error:
+            return jsonify({"error": str(error)}), 503
+
+    return wrapper
+
+
+def _encode_cursor(key: str, token: str) -> str:
+    raw = json.dumps([key, token], ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Decodifica il cursore opaco restituito dalla pagina precedente."""
+
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key, token = json.loads(raw.decode("utf-8"))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise ValueError("Cursore di paginazione non valido.") from None
+    if not isinstance(key, str) or not isinstance(token, str):
+        raise ValueError("Cursore di paginazione non valido.")
+    return key, token
+
+
+def _browse_params() -> Tuple[str, Optional[Tuple[str, str]], int]:
+    """Legge ``prefix``, ``cursor`` e ``limit`` dalla richiesta."""
+
+    try:
+        limit = int(request.args.get("limit", BROWSE_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("Il parametro 'limit' deve essere un numero intero.") from None
+    if not 1 <= limit <= BROWSE_MAX_PAGE_SIZE:
+        raise ValueError(f"Il parametro 'limit' deve essere compreso tra 1 e {BROWSE_MAX_PAGE_SIZE}.")
+    return request.args.get("prefix", ""), _decode_cursor(request.args.get("cursor")), limit
+
+
+def _alert_job_page_params() -> Tuple[int, int]:
+    """Legge ``offset`` e ``limit`` per le pagine di allerte di un job."""
+
+    try:
+        offset = int(request.args.get("offset", 0))
+        limit = int(request.args.get("limit", ALERT_JOB_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("I parametri 'offset' e 'limit' devono essere numeri interi.") from None
+    if offset < 0:
+        raise ValueError("Il parametro 'offset' non può essere negativo.")
+    if not 1 <= limit <= ALERT_JOB_MAX_PAGE_SIZE:
+        raise ValueError(f"Il parametro 'limit' deve essere compreso tra 1 e {ALERT_JOB_MAX_PAGE_SIZE}.")
+    return offset, limit
+
+
+def _browse_item(record: Mapping[str, Optional[str]]) -> Dict[str, Optional[str]]:
+    if isinstance(record, ContactView):
+        relation = record["_relation"]
+        item = {key: value for key, value in record.items() if key != "_relation"}
+        item["RelationId"] = relation.get("Id")
+        item["Roles"] = relation.get("Roles")
+        return item
+    return dict(record)
+
+
+def _browse_response(page: BrowsePage, version: int, kind_field: Optional[str] = None) -> Response:
+    """Serializza solo la pagina richiesta, con il cursore della successiva."""
+
+    items = []
+    for key, _token, record in page.rows:
+        item = _browse_item(record)
+        if kind_field:
+            item[kind_field] = key
+        items.append(item)
+    next_cursor = _encode_cursor(*page.rows[-1][:2]) if page.more and page.rows else None
+    return jsonify({"items": items, "next_cursor": next_cursor, "store_version": version})
+
+
+def _stream_job(job: Union[ImportJob, AlertJob], interval: float = 0.5) -> Iterator[str]:
+    """Invia lo stato del job (import o allerte) come Server-Sent Events finché non termina."""
+
+    while True:
+        state = job.to_dict()
+        yield f"event: progress\ndata: {json.dumps(state)}\n\n"
+        if job.done:
+            return
+        sleep(interval)
+
+
+def _ndjson_events(events: Iterator[Dict[str, object]]) -> Iterator[str]:
+    """Un oggetto JSON per riga (``application/x-ndjson``)."""
+
+    for event in events:
+        yield json.dumps(event) + "\n"
+
+
+def _sse_events(events: Iterator[Dict[str, object]]) -> Iterator[str]:
+    """Gli stessi eventi come Server-Sent Events, con il tipo nel campo ``event``."""
+
+    for event in events:
+        yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
 
 def create_app() -> Flask:
     app = Flask(__name__, template_folder=TEMPLATE_FOLDER, static_folder=STATIC_FOLDER)
+    restore_snapshot()
 
     @app.route("/")
-    def index() -> str:
-        return render_template("index.html", entities=SUPPORTED_ENTITIES, entity_labels=ENTITY_LABELS)
+    def index() -> Response:
+        # Ogni browser riceve un'area propria, salvo che ne indichi una esplicitamente.
+        workspace_id = request.args.get("workspace") or request.cookies.get(WORKSPACE_COOKIE)
+        if not workspace_id:
+            workspace_id = uuid.uuid4().hex
+        try:
+            validate_workspace_id(workspace_id)
+        except ValueError as error:
+            return jsonify({"error": str(error)}), 400
+        response = app.make_response(
+            render_template(
+                "index.html",
+                entities=SUPPORTED_ENTITIES,
+                entity_labels=ENTITY_LABELS,
+                workspace=workspace_id,
+            )
+        )
+        if request.cookies.get(WORKSPACE_COOKIE) != workspace_id:
+            response.set_cookie(WORKSPACE_COOKIE, workspace_id, httponly=True, samesite="Lax")
+        return response
 
     @app.route("/guide")
     def guide() -> str:
         return render_template("guide.html", entities=SUPPORTED_ENTITIES, entity_labels=ENTITY_LABELS)
 
+    @app.get("/api/workspace")
+    @in_workspace
+    def workspace_status() -> Response:
+        """Area di lavoro della richiesta e memoria stimata rispetto al limite."""
+
+        return jsonify(
+            {
+                "workspace": g.workspace.id,
+                "memory_bytes": g.workspace.memory_estimate(),
+                "total_memory_bytes": WORKSPACES.memory_estimate(),
+                "memory_budget_bytes": WORKSPACES.memory_budget,
+                "eviction": WORKSPACES.eviction,
+            }
+        )
+
+    @app.get("/api/browse/accounts")
+    @in_workspace
+    def browse_accounts() -> Response:
+        """Account ordinati per nome, con ricerca per prefisso del nome."""
+
+        try:
+            prefix, after, limit = _browse_params()
+        except ValueError as error:
+            return jsonify({"error": str(error)}), 400
+        store = g.workspace.store
+        with store.pinned() as version:
+            page = store.page_accounts(prefix, after, limit)
+        return _browse_response(page, version)
+
+    @app.get("/api/browse/contacts")
+    @in_workspace
+    def browse_contacts() -> Response:
+        """Contatti ordinati per nome completo, con ricerca per prefisso."""
+
+        try:
+            prefix, after, limit = _browse_params()
+        except ValueError as error:
+            return jsonify({"error": str(error)}), 400
+        store = g.workspace.store
+        with store.pinned() as version:
+            page = store.page_contacts(prefix, after, limit)
+        return _browse_response(page, version)
+
+    @app.get("/api/browse/accounts/<account_id>/contacts")
+    @in_workspace
+    def browse_account_contacts(account_id: str) -> Response:
+        """Contatti collegati a un account, con ruoli e Id della relazione."""
+
+        try:
+            prefix, after, limit = _browse_params()
+        except ValueError as error:
+            return jsonify({"error": str(error)}), 400
+        store = g.workspace.store
+        with store.pinned() as version:
+            if store.get_account(account_id) is None:
+                return jsonify({"error": f"Account {account_id} non trovato."}), 404
+            page = store.page_account_contacts(account_id, prefix, after, limit)
+        return _browse_response(page, version)
+
+    @app.get("/api/browse/individuals/<individual_id>/contact-points")
+    @in_workspace
+    def browse_contact_points(individual_id: str) -> Response:
+        """ContactPointEmail e ContactPointPhone di un Individual (campo ``kind``)."""
+
+        try:
+            _prefix, after, limit = _browse_params()
+        except ValueError as error:
+            return jsonify({"error": str(error)}), 400
+        store = g.workspace.store
+        with store.pinned() as version:
+            page = store.page_contact_points(individual_id, after, limit)
+        return _browse_response(page, version, kind_field="kind")
+
     @app.post("/api/import")
+    @in_workspace
     def import_csv() -> Response:
         print("[Import] Ricevuta richiesta di caricamento dei CSV.")
         payload = {key: request.files.get(key) for key in SUPPORTED_ENTITIES}
+        payload[ARCHIVES_UPLOAD] = request.files.getlist(ARCHIVES_UPLOAD)
+        mode = request.form.get("mode", "replace")
+        if mode == "delta":
+            payload[DELETIONS_UPLOAD] = request.files.get(DELETIONS_UPLOAD)
+        if request.form.get("async") in ("1", "true", "on"):
+            try:
+                job = IMPORT_JOBS.submit(payload, mode, g.workspace.id)
+            except ValueError as error:
+                return jsonify({"error": str(error)}), 400
+            response = jsonify(job.to_dict())
+            response.status_code = 202
+            response.headers["Location"] = f"/api/import/{job.id}"
+            return response
         try:
-            summary = IMPORT_COORDINATOR.import_payload(payload)
+            if mode == "delta":
+                result = g.workspace.coordinator.import_delta(payload)
+            elif mode == "replace":
+                result = {"summary": g.workspace.coordinator.import_payload(payload)}
+            else:
+                raise ValueError(f"Modalità di import '{mode}' non supportata.")
         except ValueError as error:
             print(f"[Import] Errore durante il caricamento: {error}")
             return jsonify({"error": str(error)}), 400
-        print(f"[Import] Caricamento completato: {summary}")
-        return jsonify({"summary": summary})
+        print(f"[Import] Caricamento completato: {result['summary']}")
+        return jsonify(result)
+
+    @app.get("/api/import/<job_id>")
+    @in_workspace
+    def import_status(job_id: str) -> Response:
+        job = IMPORT_JOBS.get(job_id)
+        if job is None or job.workspace != g.workspace.id:
+            return jsonify({"error": f"Import {job_id} non trovato."}), 404
+        if request.accept_mimetypes.best == "text/event-stream":
+            return Response(_stream_job(job), mimetype="text/event-stream")
+        return jsonify(job.to_dict())
+
+    def alert_results_response(run: AlertRun, cached: bool) -> Response:
+        """Risultati del ciclo in JSON, serializzati una sola volta per ciclo.
+
+        Solo ``GET`` e ``HEAD`` rispettano ``If-None-Match``: una ``POST`` ha appena
+        avviato un ciclo e riceve sempre il corpo, anche se ripreso dalla cache.
+        """
+
+        if request.method in ("GET", "HEAD") and request.if_none_match.contains(run.etag):
+            response = Response(status=304)
+        else:
+            body = run.artifact("json", lambda: (app.json.dumps(run.results) + "\n").encode("utf-8"))
+            response = Response(body, mimetype="application/json")
+        response.set_etag(run.etag)
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["X-Alert-Cache"] = "hit" if cached else "miss"
+        return response
 
     @app.post("/api/alerts/run")
+    @in_workspace
     def run_alerts() -> Response:
-        print("[Allerte] Avvio del ciclo di controllo.")
-        results = ALERT_LOOP.run()
+        print(f"[Allerte] Avvio del ciclo di controllo (area {g.workspace.id}).")
+        run, cached = g.workspace.alert_loop.execute()
         print("[Allerte] Ciclo completato.")
-        return jsonify(results)
+        return alert_results_response(run, cached)
+
+    @app.post("/api/alerts/run/stream")
+    @in_workspace
+    def stream_alerts() -> Response:
+        """Esegue il ciclo inviando le allerte account per account mentre vengono prodotte."""
+
+        print(f"[Allerte] Avvio del ciclo in streaming (area {g.workspace.id}).")
+        stream = AlertStream(WORKSPACES, g.workspace.id)
+        stream.launch()
+        if request.accept_mimetypes.best == "text/event-stream":
+            return Response(_sse_events(stream.events()), mimetype="text/event-stream")
+        return Response(_ndjson_events(stream.events()), mimetype="application/x-ndjson")
+
+    def workspace_alert_job(job_id: str) -> Optional[AlertJob]:
+        job = ALERT_JOBS.get(job_id)
+        if job is None or job.workspace != g.workspace.id:
+            return None
+        return job
+
+    @app.post("/api/alerts/jobs")
+    @in_workspace
+    def submit_alert_job() -> Response:
+        """Avvia un ciclo in background e restituisce subito l'identificativo del job."""
+
+        job = ALERT_JOBS.submit(g.workspace.id)
+        response = jsonify(job.to_dict())
+        response.status_code = 202
+        response.headers["Location"] = f"/api/alerts/jobs/{job.id}"
+        return response
+
+    @app.get("/api/alerts/jobs/<job_id>")
+    @in_workspace
+    def alert_job_status(job_id: str) -> Response:
+        job = workspace_alert_job(job_id)
+        if job is None:
+            return jsonify({"error": f"Ciclo allerte {job_id} non trovato."}), 404
+        if request.accept_mimetypes.best == "text/event-stream":
+            return Response(_stream_job(job), mimetype="text/event-stream")
+        return jsonify(job.to_dict())
+
+    @app.get("/api/alerts/jobs/<job_id>/results")
+    @in_workspace
+    def alert_job_results(job_id: str) -> Response:
+        """Allerte raccolte finora dal job, una pagina alla volta."""
+
+        job = workspace_alert_job(job_id)
+        if job is None:
+            return jsonify({"error": f"Ciclo allerte {job_id} non trovato."}), 404
+        try:
+            offset, limit = _alert_job_page_params()
+        except ValueError as error:
+            return jsonify({"error": str(error)}), 400
+        return jsonify(job.page(offset, limit))
+
+    @app.post("/api/alerts/jobs/<job_id>/cancel")
+    @in_workspace
+    def cancel_alert_job(job_id: str) -> Response:
+        job = workspace_alert_job(job_id)
+        if job is None:
+            return jsonify({"error": f"Ciclo allerte {job_id} non trovato."}), 404
+        if not job.done:
+            job.cancel()
+            print(f"[Allerte] Richiesto l'annullamento del job {job.id}.")
+        return jsonify(job.to_dict())
+
+    @app.get("/api/alerts/results")
+    @in_workspace
+    def last_alert_results() -> Response:
+        """Risultati dell'ultimo ciclo concluso, senza eseguirne uno nuovo."""
+
+        run = g.workspace.alert_loop.published
+        if run is None:
+            return Response(status=204)
+        return alert_results_response(run, True)
 
     @app.get("/api/alerts/download")
+    @in_workspace
     def download_alerts() -> Response:
-        excel_bytes = ALERT_SUMMARY.to_excel()
+        # Riepilogo dell'ultimo ciclo concluso: i cicli in corso non lo modificano.
+        alert_loop = g.workspace.alert_loop
+        export_format = (request.args.get("format") or "xlsx").lower()
+        if export_format not in ("xlsx", "csv"):
+            return jsonify({"error": f"Formato '{export_format}' non supportato (xlsx o csv)."}), 400
+        run = alert_loop.published
+        if export_format == "csv":
+            render = (run or alert_loop).summary.to_csv
+            mimetype, download_name = "text/csv", "riepilogo_allerte.csv"
+        else:
+            render = (run or alert_loop).summary.to_excel
+            mimetype = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            download_name = "riepilogo_allerte.xlsx"
+        data = run.artifact(export_format, render) if run is not None else render()
         return send_file(
-            io.BytesIO(excel_bytes),
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            io.BytesIO(data),
+            mimetype=mimetype,
             as_attachment=True,
-            download_name="riepilogo_allerte.xlsx",
+            download_name=download_name,
+            etag=f"{run.etag}-{export_format}" if run is not None else False,
+            max_age=0,
         )
 
     @app.get("/api/logs")
+    @in_workspace
     def view_logs() -> Response:
-        """Restituisce il log delle decisioni dei cicli in formato testuale."""
+        """Restituisce il log delle decisioni dei cicli dell'area in formato testuale."""
 
-        return jsonify({"log": read_log_lines(), "path": str(LOG_FILE)})
+        scope = g.workspace.log_scope
+        return jsonify({"log": read_log_lines(scope), "path": str(log_file(scope))})
 
     @app.get("/api/logs/download")
+    @in_workspace
     def download_logs() -> Response:
-        """Consente di scaricare il file di log generato dai cicli."""
+        """Consente di scaricare il file di log generato dai cicli dell'area."""
 
         return send_file(
-            io.BytesIO(read_log_bytes()),
+            io.BytesIO(read_log_bytes(g.workspace.log_scope)),
             mimetype="text/plain",
             as_attachment=True,
             download_name="ciclo_allerte.log",
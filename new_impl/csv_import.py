@@ -3,13 +3,56 @@
 from __future__ import annotations
 
 import csv
+import gzip
+import hashlib
 import io
-from typing import Dict, Iterable, List, Optional
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import chain
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple, Union
 
 from werkzeug.datastructures import FileStorage
 
 from .data_store import DATA_STORE, SalesforceRelationshipStore
 from .logbook import log_loop_event
+from .records import Record, schema_for
+from .snapshots import configured_snapshot_path
+
+PARSE_MODES = ("serial", "thread", "process")
+
+# Upload facoltativo dell'import incrementale con gli Id da eliminare da qualsiasi entità.
+DELETIONS_UPLOAD = "deletions"
+DELETION_COLUMNS = ("Id",)
+
+# Campo multiplo con archivi zip i cui CSV vengono assegnati alle entità in base all'intestazione.
+ARCHIVES_UPLOAD = "archives"
+
+# Ogni quante righe il parsing in streaming aggiorna l'avanzamento dell'import.
+PROGRESS_INTERVAL = 5000
+
+HASH_CHUNK_SIZE = 1 << 20
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZIP_MAGIC = b"PK\x03\x04"
+
+
+class ImportProgress:
+    """Riceve l'avanzamento di un import; l'implementazione di base lo ignora."""
+
+    def phase(self, name: str) -> None:
+        """Segnala la fase corrente (``parsing``, ``indexing``, ``snapshot``)."""
+
+    def rows(self, entity: str, count: int) -> None:
+        """Segnala il numero totale di righe lette finora per ``entity``."""
+
+
+NO_PROGRESS = ImportProgress()
 
 
 class CSVImportCoordinator:
@@ -35,58 +78,753 @@ class CSVImportCoordinator:
         "contact_point_emails": ("Id", "ParentId", "EmailAddress", "Type__c"),
     }
 
-    def __init__(self, store: SalesforceRelationshipStore | None = None) -> None:
+    # Colonne facoltative conservate oltre a quelle obbligatorie; tutte le altre vengono scartate.
+    EXTRA_COLUMNS: Dict[str, Iterable[str]] = {
+        "contacts": ("AccountId",),
+    }
+
+    def __init__(
+        self,
+        store: SalesforceRelationshipStore | None = None,
+        *,
+        parse_mode: str = "serial",
+        max_workers: Optional[int] = None,
+        extra_columns: Optional[Dict[str, Iterable[str]]] = None,
+        snapshot_path: Optional[Path] = None,
+    ) -> None:
+        if parse_mode not in PARSE_MODES:
+            raise ValueError(
+                f"Modalità di parsing '{parse_mode}' non supportata. Valori ammessi: {', '.join(PARSE_MODES)}"
+            )
         self.store = store or DATA_STORE
+        self.parse_mode = parse_mode
+        self.max_workers = max_workers
+        self.snapshot_path = snapshot_path
+        self.kept_columns: Dict[str, Tuple[str, ...]] = {}
+        for entity, required_columns in self.EXPECTED_COLUMNS.items():
+            extras = list(self.EXTRA_COLUMNS.get(entity, ()))
+            extras.extend((extra_columns or {}).get(entity, ()))
+            self.kept_columns[entity] = tuple(dict.fromkeys([*required_columns, *extras]))
+        # Gli import sincroni e quelli in background non si sovrappongono sullo stesso archivio.
+        self._lock = threading.Lock()
+        # Impronta, riepilogo e dimensione dell'ultimo file importato per entità, per saltare
+        # quelli invariati.
+        self._imported: Dict[str, Tuple[str, Dict[str, object], Optional[int]]] = {}
 
-    def import_payload(self, payload: Dict[str, Optional[FileStorage]]) -> Dict[str, int]:
-        """Analizza i file caricati e popola l'archivio."""
+    def forget_imports(self) -> None:
+        """Dimentica le impronte dei file importati, ad esempio dopo aver svuotato l'archivio."""
 
-        summary: Dict[str, int] = {}
-        for entity, required_columns in self.EXPECTED_COLUMNS.items():
+        with self._lock:
+            self._imported.clear()
+
+    def import_payload(
+        self, payload: Dict[str, object], progress: ImportProgress = NO_PROGRESS
+    ) -> Dict[str, Dict[str, object]]:
+        """Analizza i file caricati e popola l'archivio.
+
+        Un file identico all'ultimo importato per la stessa entità (stessa
+        impronta SHA-256 e stesse colonne conservate) non viene riletto: l'entità
+        resta com'è e il riepilogo la segna come ``unchanged``. Solo un file della
+        stessa dimensione dell'ultimo viene letto in anticipo per calcolarne
+        l'impronta; per gli altri, sicuramente cambiati, l'impronta si calcola
+        durante il parsing, senza una lettura in più.
+        """
+
+        summary: Dict[str, Dict[str, object]] = {}
+        with self._lock:
+            progress.phase("hashing")
+            uploads = self._collect_uploads(payload)
+            digests: Dict[str, str] = {}
+            sizes: Dict[str, Optional[int]] = {}
+            hash_while_parsing: List[str] = []
+            for entity, upload in list(uploads.items()):
+                sizes[entity] = size = _upload_size(upload)
+                previous = self._imported.get(entity)
+                if size is None:
+                    continue
+                if previous is None or previous[2] != size:
+                    if _hashable(upload):
+                        hash_while_parsing.append(entity)
+                    continue
+                digest = _content_digest(upload, self.kept_columns[entity])
+                if digest is not None and previous[0] == digest:
+                    del uploads[entity]
+                    summary[entity] = {**previous[1], "parse_seconds": 0.0, "status": "unchanged"}
+                    progress.rows(entity, 0)
+                    print(f"[Import] {entity} invariato rispetto all'ultimo import, salto il parsing.")
+                elif digest is not None:
+                    digests[entity] = digest
+
+            progress.phase("parsing")
+            staged = self._stage(uploads, self.kept_columns, progress, hash_while_parsing)
+
+            # Tutte le intestazioni sono state validate: pubblico le entità in un solo passaggio.
+            # Con il parsing in streaming le righe vengono lette dentro bulk_replace, che
+            # segnala la fase ``indexing`` solo dopo l'ultima riga. Se tutti i file sono
+            # invariati la versione dell'archivio resta la stessa e le allerte in cache valide.
+            if staged:
+                self.store.bulk_replace(staged, on_indexing=lambda: progress.phase("indexing"))
+                progress.phase("snapshot")
+                self._save_snapshot()
+
+            for entity, parsed in staged.items():
+                summary[entity] = {
+                    "records": parsed.count,
+                    "parse_seconds": round(parsed.seconds, 3),
+                    "dropped_columns": parsed.dropped_columns,
+                    "status": "imported",
+                }
+                digest = digests.get(entity) or parsed.digest
+                if digest is not None:
+                    self._imported[entity] = (digest, summary[entity], sizes[entity])
+                else:
+                    self._imported.pop(entity, None)
+                print(
+                    f"[Import] Caricati {parsed.count} record per {entity} "
+                    f"(parsing {parsed.seconds:.2f}s, {parsed.dropped_columns} colonne scartate)."
+                )
+        return {entity: summary[entity] for entity in self.EXPECTED_COLUMNS if entity in summary}
+
+    def import_delta(
+        self, payload: Dict[str, object], progress: ImportProgress = NO_PROGRESS
+    ) -> Dict[str, object]:
+        """Applica un import incrementale: upsert per ``Id`` e cancellazioni.
+
+        Le righe con ``IsDeleted`` vero e gli Id del file ``deletions`` vengono
+        rimossi da qualsiasi entità; le altre righe sostituiscono o aggiungono il
+        record con lo stesso Id. Restituisce il riepilogo per entità e gli
+        account toccati dalla modifica.
+        """
+
+        kept = {entity: (*columns, "IsDeleted") for entity, columns in self.kept_columns.items()}
+        with self._lock:
+            progress.phase("parsing")
+            staged = self._stage(self._collect_uploads(payload), kept, progress)
+
+            deleted_ids: List[str] = []
+            deletions = payload.get(DELETIONS_UPLOAD)
+            if deletions:
+                print("[Import] Elaborazione delle cancellazioni...")
+                deleted_ids = [
+                    record["Id"]
+                    for record in _iter_csv_rows(deletions, DELETION_COLUMNS, DELETION_COLUMNS)
+                    if record["Id"]
+                ]
+                progress.rows(DELETIONS_UPLOAD, len(deleted_ids))
+
+            result = self.store.apply_delta(staged, deleted_ids)
+            # Le entità modificate dal delta non corrispondono più all'ultimo file completo importato.
+            for entity in (*result["upserted"], *result["deleted"]):
+                self._imported.pop(entity, None)
+            if staged or deleted_ids:
+                progress.phase("snapshot")
+                self._save_snapshot()
+
+        summary: Dict[str, Dict[str, object]] = {}
+        for entity in self.EXPECTED_COLUMNS:
+            parsed = staged.get(entity)
+            deleted = result["deleted"].get(entity, 0)
+            if parsed is None and not deleted:
+                continue
+            summary[entity] = {
+                "records": result["upserted"].get(entity, 0),
+                "deleted": deleted,
+                "parse_seconds": round(parsed.seconds, 3) if parsed else 0.0,
+                "dropped_columns": parsed.dropped_columns if parsed else 0,
+            }
+            print(
+                f"[Import] Delta per {entity}: {summary[entity]['records']} record aggiornati, "
+                f"{deleted} eliminati."
+            )
+        touched_accounts = result["touched_accounts"]
+        print(f"[Import] Account interessati dal delta: {len(touched_accounts)}.")
+        return {"summary": summary, "touched_accounts": touched_accounts}
+
+    def _collect_uploads(self, payload: Dict[str, object]) -> Dict[str, "Upload"]:
+        """Associa a ogni entità il proprio CSV, eventualmente compresso o dentro uno zip.
+
+        I file caricati nel campo dell'entità hanno la precedenza; i CSV degli
+        archivi in ``archives`` completano le entità mancanti, nell'ordine in cui
+        compaiono, con la prima entità libera di cui contengono le colonne.
+        """
+
+        uploads: Dict[str, Upload] = {}
+        for entity in self.EXPECTED_COLUMNS:
             file_storage = payload.get(entity)
-            if not file_storage:
+            if file_storage:
+                uploads[entity] = self._resolve_upload(entity, file_storage)
+
+        for archive in payload.get(ARCHIVES_UPLOAD) or ():
+            if not archive:
+                continue
+            for member in _archive_members(archive):
+                entity = self._match_entity(member.header(), uploads)
+                if entity is None:
+                    log_loop_event(
+                        f"CSV {member.name} dell'archivio {member.archive_name} non riconosciuto "
+                        "o duplicato, ignorato."
+                    )
+                    continue
+                print(f"[Import] {member.archive_name}: {member.name} assegnato a {entity}.")
+                uploads[entity] = member
+
+        for entity in self.EXPECTED_COLUMNS:
+            if entity not in uploads:
                 log_loop_event(
                     f"CSV per entità '{entity}' non fornito, salto importazione di questa sezione."
                 )
-                continue
+        return {entity: uploads[entity] for entity in self.EXPECTED_COLUMNS if entity in uploads}
+
+    def _resolve_upload(self, entity: str, file_storage: FileStorage) -> "Upload":
+        """Sostituisce uno zip caricato nel campo di un'entità con il CSV che le corrisponde."""
+
+        if _sniff(getattr(file_storage, "stream", file_storage)) != ZIP_MAGIC:
+            return file_storage
+        members = _archive_members(file_storage)
+        if len(members) == 1:
+            return members[0]
+        required = self.EXPECTED_COLUMNS[entity]
+        for member in members:
+            columns = member.header()
+            if all(column in columns for column in required):
+                return member
+        raise ValueError(
+            f"Nessun CSV dell'archivio {members[0].archive_name} contiene le colonne di {entity}."
+        )
+
+    def _match_entity(self, columns: Sequence[str], used: Dict[str, object]) -> Optional[str]:
+        """Restituisce l'entità più specifica (con più colonne attese) compatibile con l'intestazione.
+
+        Un CSV di contatti contiene anche le colonne degli Individual: se la sua
+        entità è già assegnata il file viene scartato invece di ripiegare su una
+        meno specifica.
+        """
+
+        candidates = [
+            entity
+            for entity, required in self.EXPECTED_COLUMNS.items()
+            if all(column in columns for column in required)
+        ]
+        if not candidates:
+            return None
+        entity = max(candidates, key=lambda entity: len(tuple(self.EXPECTED_COLUMNS[entity])))
+        return None if entity in used else entity
+
+    def _stage(
+        self,
+        uploads: Dict[str, "Upload"],
+        kept: Dict[str, Tuple[str, ...]],
+        progress: ImportProgress,
+        hashed: Sequence[str] = (),
+    ) -> Dict[str, "_StagedEntity"]:
+        """Prepara le entità caricate; per quelle in ``hashed`` calcola l'impronta durante il parsing."""
+
+        if self.parse_mode == "serial" or len(uploads) < 2:
+            return self._stage_streaming(uploads, kept, progress, hashed)
+        return self._stage_parallel(uploads, kept, progress, hashed)
 
+    def _stage_streaming(
+        self,
+        uploads: Dict[str, "Upload"],
+        kept: Dict[str, Tuple[str, ...]],
+        progress: ImportProgress,
+        hashed: Sequence[str] = (),
+    ) -> Dict[str, "_StagedEntity"]:
+        """Prepara le entità come generatori consumati direttamente dall'archivio."""
+
+        staged: Dict[str, _StagedEntity] = {}
+        for entity, file_storage in uploads.items():
             print(f"[Import] Elaborazione di {entity}...")
-            records = self._read_csv(file_storage, required_columns)
-            if not records:
-                print(f"[Import] Nessun record trovato per {entity}.")
-                log_loop_event(
-                    f"File CSV per '{entity}' vuoto o senza record utili, nessun dato importato."
-                )
+            started = perf_counter()
+            header: Dict[str, int] = {}
+            hasher = _new_digest(kept[entity]) if entity in hashed else None
+            rows = _iter_csv_rows(
+                file_storage, self.EXPECTED_COLUMNS[entity], kept[entity], header, hasher
+            )
+            first_row = next(rows, None)
+            if first_row is None:
+                self._log_empty(entity)
                 continue
+            staged[entity] = _StagedEntity(
+                chain([first_row], rows),
+                seconds=perf_counter() - started,
+                dropped_columns=header["dropped_columns"],
+                on_progress=lambda count, entity=entity: progress.rows(entity, count),
+                hasher=hasher,
+            )
+        return staged
 
-            self.store.replace_entity(entity, records)
-            summary[entity] = len(records)
-            print(f"[Import] Caricati {len(records)} record per {entity}.")
-        return summary
+    def _stage_parallel(
+        self,
+        uploads: Dict[str, "Upload"],
+        kept: Dict[str, Tuple[str, ...]],
+        progress: ImportProgress,
+        hashed: Sequence[str] = (),
+    ) -> Dict[str, "_StagedEntity"]:
+        """Analizza ogni file in un worker separato e raccoglie le righe ottenute."""
 
-    def _read_csv(self, file_storage, required_columns: Iterable[str]) -> List[Dict[str, str]]:
-        raw = getattr(file_storage, "read", lambda: file_storage)()
-        if isinstance(raw, bytes):
-            text = raw.decode("utf-8-sig")
+        workers = self.max_workers or min(len(uploads), os.cpu_count() or 1)
+        print(
+            f"[Import] Parsing parallelo ({self.parse_mode}) di {len(uploads)} file con {workers} worker."
+        )
+        spooled: Dict[int, str] = {}
+        executor: Executor
+        if self.parse_mode == "process":
+            executor = ProcessPoolExecutor(max_workers=workers)
         else:
-            text = raw
+            executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            futures = {}
+            for entity, file_storage in uploads.items():
+                print(f"[Import] Elaborazione di {entity}...")
+                columns = (tuple(self.EXPECTED_COLUMNS[entity]), kept[entity], entity in hashed)
+                if self.parse_mode == "process":
+                    # I processi worker leggono l'upload, ancora compresso, da un file temporaneo.
+                    member = None
+                    source = file_storage
+                    if isinstance(file_storage, ArchiveMember):
+                        member, source = file_storage.name, file_storage.source
+                    if id(source) not in spooled:
+                        spooled[id(source)] = _spool_to_disk(source)
+                    futures[entity] = executor.submit(
+                        _parse_csv_file, spooled[id(source)], *columns, member=member
+                    )
+                else:
+                    futures[entity] = executor.submit(_parse_csv_upload, file_storage, *columns)
+
+            staged: Dict[str, _StagedEntity] = {}
+            for entity, future in futures.items():
+                rows, seconds, dropped_columns, digest = future.result()
+                progress.rows(entity, len(rows))
+                if not rows:
+                    self._log_empty(entity)
+                    continue
+                staged[entity] = _StagedEntity(
+                    rows, seconds=seconds, dropped_columns=dropped_columns, digest=digest
+                )
+            return staged
+        finally:
+            executor.shutdown(cancel_futures=True)
+            for path in spooled.values():
+                try:
+                    os.remove(path)
+                except OSError:
+                    log_loop_event(f"Impossibile rimuovere il file temporaneo {path}.")
+
+    def _save_snapshot(self) -> None:
+        """Salva lo snapshot binario dell'archivio per il riavvio successivo."""
+
+        if not self.snapshot_path:
+            return
+        started = perf_counter()
+        try:
+            size = self.store.save_snapshot(self.snapshot_path)
+        except OSError as error:
+            print(f"[Import] Impossibile salvare lo snapshot: {error}")
+            log_loop_event(f"Salvataggio snapshot in {self.snapshot_path} non riuscito: {error}.")
+            return
+        print(
+            f"[Import] Snapshot salvato in {self.snapshot_path} "
+            f"({size / 1_048_576:.1f} MB, {perf_counter() - started:.2f}s)."
+        )
+
+    @staticmethod
+    def _log_empty(entity: str) -> None:
+        print(f"[Import] Nessun record trovato per {entity}.")
+        log_loop_event(
+            f"File CSV per '{entity}' vuoto o senza record utili, nessun dato importato."
+        )
+
+
+class _StagedEntity:
+    """Righe pronte per l'archivio con conteggio, tempo di parsing e colonne scartate.
+
+    ``digest`` è l'impronta del file calcolata durante il parsing: con ``hasher``
+    viene letta alla fine delle righe, quando il file è stato consumato per intero.
+    """
+
+    def __init__(
+        self,
+        rows: Iterable[Dict[str, str]],
+        *,
+        seconds: float = 0.0,
+        dropped_columns: int = 0,
+        on_progress: Optional[Callable[[int], None]] = None,
+        digest: Optional[str] = None,
+        hasher=None,
+    ) -> None:
+        self._rows = rows
+        self.count = 0
+        self.seconds = seconds
+        self.dropped_columns = dropped_columns
+        self.digest = digest
+        self._on_progress = on_progress
+        self._hasher = hasher
+
+    def __iter__(self) -> Iterator[Dict[str, str]]:
+        iterator = iter(self._rows)
+        while True:
+            started = perf_counter()
+            row = next(iterator, None)
+            self.seconds += perf_counter() - started
+            if row is None:
+                if self._hasher is not None:
+                    self.digest = self._hasher.hexdigest()
+                if self._on_progress is not None:
+                    self._on_progress(self.count)
+                return
+            self.count += 1
+            if self._on_progress is not None and self.count % PROGRESS_INTERVAL == 0:
+                self._on_progress(self.count)
+            yield row
+
+
+def _content_digest(upload: "Upload", kept_columns: Iterable[str]) -> Optional[str]:
+    """Calcola l'impronta SHA-256 dell'upload così come è stato caricato.
 
-        reader = csv.DictReader(io.StringIO(text))
-        if reader.fieldnames is None:
+    Il file viene letto a blocchi dallo spool già scritto da Werkzeug (o dal
+    job in background) e riportato all'inizio. I CSV dentro uno zip vengono
+    decompressi a blocchi e l'impronta copre i byte del CSV, come per un upload
+    diretto: CRC-32 e dimensione dell'archivio non bastano a escludere collisioni.
+    Restituisce ``None`` se lo stream non è riposizionabile.
+    """
+
+    digest = _new_digest(kept_columns)
+    if isinstance(upload, ArchiveMember):
+        with upload.open() as member:
+            for chunk in iter(lambda: member.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    source = getattr(upload, "stream", upload)
+    if isinstance(source, (bytes, bytearray)):
+        digest.update(source)
+        return digest.hexdigest()
+    try:
+        position = source.tell()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+    try:
+        for chunk in iter(lambda: source.read(HASH_CHUNK_SIZE), b""):
+            if not isinstance(chunk, bytes):
+                return None
+            digest.update(chunk)
+    finally:
+        source.seek(position)
+    return digest.hexdigest()
+
+
+def _new_digest(kept_columns: Iterable[str]):
+    """Impronta SHA-256 vuota di un upload, legata all'elenco delle colonne conservate."""
+
+    return hashlib.sha256("\x1f".join(kept_columns).encode("utf-8"))
+
+
+def _upload_size(upload: "Upload") -> Optional[int]:
+    """Dimensione in byte dell'upload (del CSV decompresso per un membro zip), senza leggerlo."""
+
+    if isinstance(upload, ArchiveMember):
+        return upload.archive.getinfo(upload.name).file_size
+    source = getattr(upload, "stream", upload)
+    if isinstance(source, (bytes, bytearray)):
+        return len(source)
+    try:
+        position = source.tell()
+        source.seek(0, io.SEEK_END)
+        size = source.tell() - position
+        source.seek(position)
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+    return size
+
+
+def _hashable(upload: "Upload") -> bool:
+    """Vero se il parsing legge i byte dell'upload, così da poterne calcolare l'impronta."""
+
+    if isinstance(upload, ArchiveMember):
+        return True
+    source = getattr(upload, "stream", upload)
+    if isinstance(source, (bytes, bytearray)):
+        return True
+    if isinstance(source, io.TextIOBase) or not hasattr(source, "readable"):
+        return False
+    return _sniff(source) != ZIP_MAGIC
+
+
+class _HashingReader(io.BufferedIOBase):
+    """Stream binario che aggiorna un'impronta con i byte letti dalla sorgente."""
+
+    def __init__(self, source, digest) -> None:
+        super().__init__()
+        self.source = source
+        self.digest = digest
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        data = self.source.read(size)
+        self.digest.update(data)
+        return data
+
+    def read1(self, size: int = -1) -> bytes:
+        data = getattr(self.source, "read1", self.source.read)(size)
+        self.digest.update(data)
+        return data
+
+
+class ArchiveMember:
+    """CSV contenuto in uno zip caricato, decompresso in streaming quando viene letto."""
+
+    def __init__(self, archive: zipfile.ZipFile, name: str, source, archive_name: str) -> None:
+        self.archive = archive
+        self.name = name
+        self.source = source
+        self.archive_name = archive_name
+
+    def open(self):
+        return self.archive.open(self.name)
+
+    def header(self) -> List[str]:
+        """Legge solo la riga di intestazione del CSV."""
+
+        with self.open() as raw:
+            text_stream = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+            try:
+                header = next(csv.reader(text_stream), None) or []
+            except (UnicodeDecodeError, csv.Error):
+                header = []
+            finally:
+                text_stream.detach()
+        return [column.strip() for column in header]
+
+
+Upload = Union[FileStorage, ArchiveMember]
+
+
+def _archive_members(file_storage) -> List[ArchiveMember]:
+    """Elenca i CSV di uno zip caricato senza estrarli."""
+
+    source = getattr(file_storage, "stream", file_storage)
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    archive_name = getattr(file_storage, "filename", None) or "zip"
+    try:
+        archive = zipfile.ZipFile(source)
+    except (zipfile.BadZipFile, OSError, io.UnsupportedOperation) as error:
+        raise ValueError(f"Archivio {archive_name} non leggibile: {error}") from error
+    members = [
+        ArchiveMember(archive, info.filename, source, archive_name)
+        for info in archive.infolist()
+        if not info.is_dir()
+        and not info.filename.startswith("__MACOSX/")
+        and info.filename.lower().endswith(".csv")
+    ]
+    if not members:
+        raise ValueError(f"L'archivio {archive_name} non contiene file CSV.")
+    return members
+
+
+def _sniff(source) -> bytes:
+    """Restituisce i primi byte dello stream senza consumarli."""
+
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source[:4])
+    peek = getattr(source, "peek", None)
+    if peek is not None:
+        return peek(4)[:4]
+    try:
+        position = source.tell()
+        head = source.read(4)
+        source.seek(position)
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return b""
+    return head if isinstance(head, bytes) else b""
+
+
+def _iter_csv_rows(
+    file_storage,
+    required_columns: Iterable[str],
+    kept_columns: Optional[Iterable[str]] = None,
+    header_info: Optional[Dict[str, int]] = None,
+    digest=None,
+) -> Iterator[Record]:
+    """Legge il CSV in streaming restituendo un record compatto alla volta.
+
+    Se ``kept_columns`` è indicato, ogni riga viene ridotta alle sole colonne
+    elencate; il numero di colonne scartate viene scritto in ``header_info``.
+    ``digest`` riceve i byte dell'upload man mano che vengono letti.
+    """
+
+    text_stream = _open_text_stream(file_storage, digest)
+    try:
+        reader = csv.reader(text_stream)
+        header = next(reader, None)
+        if not header:
             raise ValueError("Il file CSV non contiene l'intestazione.")
+        fieldnames = [column.strip() for column in header]
 
-        missing = [column for column in required_columns if column not in reader.fieldnames]
+        missing = [column for column in required_columns if column not in fieldnames]
         if missing:
             raise ValueError(f"Colonne mancanti: {', '.join(missing)}")
 
-        rows: List[Dict[str, str]] = []
+        width = len(fieldnames)
+        allowed = set(kept_columns) if kept_columns is not None else set(fieldnames)
+        # In caso di intestazioni duplicate vale l'ultima colonna, come per DictReader.
+        positions = {name: index for index, name in enumerate(fieldnames) if name in allowed}
+        indexes = tuple(positions.values())
+        schema = schema_for(positions)
+        if header_info is not None:
+            header_info["dropped_columns"] = width - len(indexes)
+
         for row in reader:
-            cleaned = {
-                key.strip(): (value.strip() if isinstance(value, str) else value)
-                for key, value in row.items()
-            }
-            rows.append(cleaned)
-        return rows
+            if not row:
+                continue
+            if len(row) < width:
+                row = row + [None] * (width - len(row))
+            yield schema.build(
+                [
+                    (row[index].strip() if isinstance(row[index], str) else row[index])
+                    for index in indexes
+                ]
+            )
+    finally:
+        if isinstance(text_stream, io.TextIOWrapper):
+            # Stacco il wrapper per non chiudere lo stream dell'upload; chiudo solo i decompressori.
+            raw = text_stream.detach()
+            if isinstance(raw, _HashingReader):
+                raw = raw.source
+            if isinstance(raw, (gzip.GzipFile, zipfile.ZipExtFile)):
+                raw.close()
+
+
+def _open_text_stream(file_storage, digest=None) -> TextIO:
+    """Avvolge l'upload in un decoder UTF-8-sig incrementale.
+
+    I file gzip e i CSV dentro uno zip vengono decompressi a blocchi durante la
+    lettura, senza mai tenere in memoria il file decompresso. ``digest`` riceve
+    gli stessi byte su cui :func:`_content_digest` calcola l'impronta (solo per
+    gli upload accettati da :func:`_hashable`).
+    """
+
+    if isinstance(file_storage, ArchiveMember):
+        raw = file_storage.open()
+        if digest is not None:
+            raw = _HashingReader(raw, digest)
+        return io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+    source = getattr(file_storage, "stream", file_storage)
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    elif isinstance(source, str):
+        return io.StringIO(source, newline="")
+    elif isinstance(source, io.TextIOBase):
+        return source
+    elif not hasattr(source, "readable"):
+        raw = source.read()
+        if isinstance(raw, str):
+            return io.StringIO(raw, newline="")
+        source = io.BytesIO(raw)
+    head = _sniff(source)
+    if head == ZIP_MAGIC:
+        return io.TextIOWrapper(_archive_members(source)[0].open(), encoding="utf-8-sig", newline="")
+    if digest is not None:
+        source = _HashingReader(source, digest)
+    if head.startswith(GZIP_MAGIC):
+        source = gzip.GzipFile(fileobj=source, mode="rb")
+    return io.TextIOWrapper(source, encoding="utf-8-sig", newline="")
+
+
+def _parse_csv_upload(
+    file_storage,
+    required_columns: Tuple[str, ...],
+    kept_columns: Tuple[str, ...],
+    hash_content: bool = False,
+) -> Tuple[List[Record], float, int, Optional[str]]:
+    """Materializza le righe di un upload misurando il tempo di parsing.
+
+    Con ``hash_content`` restituisce anche l'impronta dell'upload, calcolata sui
+    byte letti dal parsing.
+    """
+
+    started = perf_counter()
+    header: Dict[str, int] = {}
+    digest = _new_digest(kept_columns) if hash_content else None
+    rows = list(_iter_csv_rows(file_storage, required_columns, kept_columns, header, digest))
+    return (
+        rows,
+        perf_counter() - started,
+        header.get("dropped_columns", 0),
+        digest.hexdigest() if digest is not None else None,
+    )
+
+
+def _parse_csv_file(
+    path: str,
+    required_columns: Tuple[str, ...],
+    kept_columns: Tuple[str, ...],
+    hash_content: bool = False,
+    member: Optional[str] = None,
+) -> Tuple[List[Record], float, int, Optional[str]]:
+    """Punto di ingresso dei processi worker: analizza un CSV (o un membro zip) salvato su disco."""
+
+    with open(path, "rb") as handle:
+        if member is None:
+            return _parse_csv_upload(handle, required_columns, kept_columns, hash_content)
+        with zipfile.ZipFile(handle) as archive:
+            upload = ArchiveMember(archive, member, handle, os.path.basename(path))
+            return _parse_csv_upload(upload, required_columns, kept_columns, hash_content)
+
+
+def _spool_to_disk(file_storage) -> str:
+    """Copia l'upload in un file temporaneo e ne restituisce il percorso."""
+
+    source = getattr(file_storage, "stream", file_storage)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    with tempfile.NamedTemporaryFile(prefix="sfbpca_", suffix=".upload", delete=False) as handle:
+        if isinstance(source, (bytes, bytearray)):
+            handle.write(source)
+        elif isinstance(source, str):
+            handle.write(source.encode("utf-8"))
+        else:
+            shutil.copyfileobj(source, handle)
+        return handle.name
+
+
+def _parse_extra_columns(value: str) -> Dict[str, List[str]]:
+    """Interpreta una lista del tipo ``contacts:Title,Department;accounts:Type``."""
+
+    extra_columns: Dict[str, List[str]] = {}
+    for chunk in value.split(";"):
+        entity, _, columns = chunk.partition(":")
+        entity = entity.strip()
+        if not entity:
+            continue
+        extra_columns.setdefault(entity, []).extend(
+            column.strip() for column in columns.split(",") if column.strip()
+        )
+    return extra_columns
+
+
+def coordinator_from_env(store=None, snapshot_path: Optional[Path] = None) -> CSVImportCoordinator:
+    """Crea un coordinatore con le impostazioni ``SFBPCA_IMPORT_*``.
+
+    Senza ``store`` usa l'archivio principale e lo snapshot configurato; per gli altri
+    archivi lo snapshot è ``snapshot_path``. Lo snapshot binario serve solo agli archivi
+    in memoria: SQLite è già persistente.
+    """
+
+    if store is None:
+        store = DATA_STORE
+        snapshot_path = configured_snapshot_path()
+    workers = os.environ.get("SFBPCA_IMPORT_WORKERS")
+    return CSVImportCoordinator(
+        store,
+        parse_mode=os.environ.get("SFBPCA_IMPORT_MODE", "serial"),
+        max_workers=int(workers) if workers else None,
+        extra_columns=_parse_extra_columns(os.environ.get("SFBPCA_IMPORT_EXTRA_COLUMNS", "")),
+        snapshot_path=snapshot_path if isinstance(store, SalesforceRelationshipStore) else None,
+    )
 
 
-IMPORT_COORDINATOR = CSVImportCoordinator()
+IMPORT_COORDINATOR = coordinator_from_env()
@@ -2,29 +2,392 @@
 
 from __future__ import annotations
 
+import heapq
+import os
+import sys
+import threading
+from array import array
 from collections import defaultdict
-from dataclasses import dataclass
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
 from datetime import datetime
-from typing import Dict, Iterable, List, Optional, Sequence
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Tuple
 
+from .indexes import CSRIndex, PositionView, SortedIndex
 from .logbook import log_loop_event
+from .normalization import (
+    IDENTIFIER_KINDS,
+    ContactKeys,
+    attach_keys,
+    browse_key,
+    cached_keys,
+    contact_identifiers,
+    contact_keys_for,
+)
+from .records import Record
+from .snapshots import SnapshotError, read_snapshot, write_snapshot
+
+
+class ContactView(Mapping):
+    """A contact record paired with its AccountContact relation under ``_relation``.
+
+    Behaves like ``{**contact, "_relation": relation}`` but only references the
+    two records held by the store.
+    """
+
+    __slots__ = ("_contact", "_relation")
+
+    def __init__(self, contact: Mapping[str, Optional[str]], relation: Mapping[str, Optional[str]]) -> None:
+        self._contact = contact
+        self._relation = relation
+
+    def __getitem__(self, key: str):
+        if key == "_relation":
+            return self._relation
+        return self._contact[key]
+
+    def get(self, key: str, default=None):
+        if key == "_relation":
+            return self._relation
+        return self._contact.get(key, default)
+
+    def __contains__(self, key: object) -> bool:
+        return key == "_relation" or key in self._contact
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._contact
+        yield "_relation"
+
+    def __len__(self) -> int:
+        return len(self._contact) + 1
+
+    @property
+    def derived(self) -> Optional[tuple]:
+        """Alert keys of the underlying contact record (see :mod:`new_impl.normalization`)."""
+
+        return getattr(self._contact, "derived", None)
+
+    @derived.setter
+    def derived(self, keys: tuple) -> None:
+        self._contact.derived = keys
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
 
 
-@dataclass
 class AccountContext:
-    """Aggregated view over an account and its related records."""
+    """Read-only view over an account and its related records.
+
+    ``account`` and ``relations`` reference the store's records. ``contacts``
+    pairs each related contact with its relation through :class:`ContactView`;
+    it and the lookup maps are only built when first read. ``store`` is the
+    store the context was read from, for the lookups made by alert modules.
+    """
+
+    __slots__ = (
+        "account_id",
+        "account",
+        "relations",
+        "store",
+        "_contact_records",
+        "_contacts",
+        "_contact_index",
+        "_contact_to_individual",
+        "_individual_to_contacts",
+    )
+
+    def __init__(
+        self,
+        account_id: str,
+        account: Mapping[str, Optional[str]],
+        relations: Sequence[Mapping[str, Optional[str]]],
+        contact_records: Mapping[str, Mapping[str, Optional[str]]],
+        store: Optional["SalesforceRelationshipStore"] = None,
+    ) -> None:
+        self.account_id = account_id
+        self.account = account
+        self.relations = relations
+        self.store = store
+        self._contact_records = contact_records
+        self._contacts: Optional[List[ContactView]] = None
+        self._contact_index: Optional[Dict[str, ContactView]] = None
+        self._contact_to_individual: Optional[Dict[str, Optional[str]]] = None
+        self._individual_to_contacts: Optional[Dict[str, List[str]]] = None
+
+    @property
+    def contacts(self) -> List[ContactView]:
+        if self._contacts is None:
+            self._contacts = enrich_contacts(self.account_id, self.relations, self._contact_records)
+        return self._contacts
+
+    @property
+    def contact_index(self) -> Dict[str, ContactView]:
+        if self._contact_index is None:
+            self._contact_index = {
+                contact.get("Id", ""): contact for contact in self.contacts if contact.get("Id")
+            }
+        return self._contact_index
+
+    @property
+    def contact_to_individual(self) -> Dict[str, Optional[str]]:
+        if self._contact_to_individual is None:
+            self._contact_to_individual = {
+                contact_id: contact.get("IndividualId") or None
+                for contact_id, contact in self.contact_index.items()
+            }
+        return self._contact_to_individual
+
+    @property
+    def individual_to_contacts(self) -> Dict[str, List[str]]:
+        if self._individual_to_contacts is None:
+            individual_to_contacts: Dict[str, List[str]] = defaultdict(list)
+            for contact_id, individual_id in self.contact_to_individual.items():
+                if individual_id:
+                    individual_to_contacts[individual_id].append(contact_id)
+            self._individual_to_contacts = dict(individual_to_contacts)
+        return self._individual_to_contacts
+
+
+@dataclass
+class StoreSnapshot:
+    """Entity maps and relationship indexes published together by the store."""
+
+    accounts: Dict[str, Dict[str, str]] = field(default_factory=dict)
+    contacts: Dict[str, Dict[str, str]] = field(default_factory=dict)
+    individuals: Dict[str, Dict[str, str]] = field(default_factory=dict)
+    account_contact_relations: List[Dict[str, str]] = field(default_factory=list)
+    contact_point_phones: List[Dict[str, str]] = field(default_factory=list)
+    contact_point_emails: List[Dict[str, str]] = field(default_factory=list)
+
+    # One-to-many indexes hold row positions: relations, phones and emails point
+    # into their entity lists, contacts point into ``contact_ids``.
+    account_to_relations: CSRIndex = field(default_factory=CSRIndex.empty)
+    contact_ids: List[str] = field(default_factory=list)
+    contact_to_individual: Dict[str, Optional[str]] = field(default_factory=dict)
+    individual_to_contacts: CSRIndex = field(default_factory=CSRIndex.empty)
+    # Normalised fiscal code, VAT number, phone and email -> contact positions, per kind.
+    identifier_to_contacts: Dict[str, CSRIndex] = field(default_factory=dict)
+    individual_to_phones: CSRIndex = field(default_factory=CSRIndex.empty)
+    individual_to_emails: CSRIndex = field(default_factory=CSRIndex.empty)
+    # ``(browse key, Id)`` pairs of accounts by name and contacts by full name.
+    account_names: SortedIndex = field(default_factory=SortedIndex.empty)
+    contact_names: SortedIndex = field(default_factory=SortedIndex.empty)
+
+    # Incremented by every change published by the store.
+    version: int = 0
+
+
+def enrich_contacts(
+    account_id: str,
+    relations: Iterable[Mapping[str, Optional[str]]],
+    contacts: Mapping[str, Mapping[str, Optional[str]]],
+) -> List[ContactView]:
+    """Pair each related contact with its AccountContact relation under ``_relation``."""
+
+    enriched_contacts: List[ContactView] = []
+    for relation in relations:
+        contact_id = relation.get("ContactId")
+        if not contact_id:
+            log_loop_event(
+                f"Relazione AccountContact senza ContactId per account {account_id}, salto."
+            )
+            continue
+        contact = contacts.get(contact_id)
+        if not contact:
+            log_loop_event(
+                f"Contatto {contact_id} non trovato per account {account_id}, salto."
+            )
+            continue
+        if contact["AccountId"] != account_id:
+            log_loop_event(
+                f"Contatto {contact_id} con altro account {contact['AccountId']} rispetto ad account {account_id}, salto."
+            )
+            continue
+        enriched_contacts.append(ContactView(contact, relation))
+    return enriched_contacts
+
+
+class ContactRow(NamedTuple):
+    """One AccountContactRelation joined with its contact, yielded by whole-store scans.
+
+    ``points`` maps ``phones`` and ``emails`` to the contact's ContactPoint rows,
+    as :meth:`get_contact_points_for_contact` does, when the scan asks for them.
+    """
 
     account_id: str
-    account: Dict[str, str]
-    relations: List[Dict[str, str]]
-    contacts: List[Dict[str, str]]
-    contact_index: Dict[str, Dict[str, str]]
-    contact_to_individual: Dict[str, Optional[str]]
-    individual_to_contacts: Dict[str, List[str]]
+    contact: ContactView
+    points: Optional[Dict[str, Sequence[Mapping[str, Optional[str]]]]]
+
+
+class BrowsePage(NamedTuple):
+    """One page of a browse query.
+
+    ``rows`` holds ``(key, token, record)`` triples in ``(key, token)`` order; the
+    pair of the last row is the cursor of the next page when ``more`` is true.
+    """
+
+    rows: List[Tuple[str, str, Mapping[str, Optional[str]]]]
+    more: bool
+
+
+def page_rows(
+    rows: Iterable[Tuple[str, str, Mapping[str, Optional[str]]]],
+    prefix: str,
+    after: Optional[Tuple[str, str]],
+    limit: int,
+) -> BrowsePage:
+    """Page over a short, unsorted list of ``(key, token, record)`` rows."""
+
+    wanted = (
+        row
+        for row in rows
+        if row[0].startswith(prefix) and (after is None or (row[0], row[1]) > after)
+    )
+    page = heapq.nsmallest(limit + 1, wanted, key=lambda row: (row[0], row[1]))
+    return BrowsePage(page[:limit], len(page) > limit)
+
+
+def build_account_context(
+    account_id: str,
+    account: Mapping[str, Optional[str]],
+    relations: Sequence[Mapping[str, Optional[str]]],
+    contacts: Mapping[str, Mapping[str, Optional[str]]],
+    store=None,
+) -> AccountContext:
+    """Assemble the :class:`AccountContext` shared by every store backend."""
+
+    return AccountContext(account_id, account, relations, contacts, store)
+
+
+def format_contact_name(contact: Mapping[str, Optional[str]], contact_id: str) -> str:
+    """Return "FirstName LastName", falling back to the contact Id."""
+
+    first = contact.get("FirstName")
+    last = contact.get("LastName")
+    if first or last:
+        return " ".join(part for part in (first, last) if part).strip()
+    return contact.get("Id") or contact_id
+
+
+def content_hash(record: Optional[Mapping[str, Optional[str]]]) -> int:
+    """Hash of a record's fields and values (``0`` for a missing record)."""
+
+    if record is None:
+        return 0
+    if isinstance(record, Record):
+        return record.content_hash()
+    return hash(tuple(record.items()))
+
+
+def is_deleted(record: Mapping[str, Optional[str]]) -> bool:
+    """Tell whether a delta row carries a true ``IsDeleted`` flag."""
+
+    return (record.get("IsDeleted") or "").strip().lower() in ("true", "1", "yes")
+
+
+def strip_delete_flag(record: Record) -> Record:
+    """Drop the ``IsDeleted`` column of a delta row, so it matches a fully imported row."""
+
+    if "IsDeleted" not in record:
+        return record
+    return Record.from_mapping({key: value for key, value in record.items() if key != "IsDeleted"})
+
+
+@dataclass
+class _DeltaTracker:
+    """Counts and Ids collected while a delta import is applied."""
+
+    upserted: Dict[str, int] = field(default_factory=dict)
+    deleted: Dict[str, int] = field(default_factory=dict)
+    accounts: set = field(default_factory=set)
+    contacts: set = field(default_factory=set)
+    individuals: set = field(default_factory=set)
+
+    def note(self, entity: str, record: Mapping[str, Optional[str]]) -> None:
+        if entity == "accounts":
+            self.accounts.add(record.get("Id"))
+        elif entity == "contacts":
+            self.contacts.add(record.get("Id"))
+            self.accounts.add(record.get("AccountId"))
+        elif entity == "individuals":
+            self.individuals.add(record.get("Id"))
+        elif entity == "account_contact_relations":
+            self.accounts.add(record.get("AccountId"))
+        else:
+            self.individuals.add(record.get("ParentId"))
+
+
+# Records sampled per entity by ``memory_estimate``.
+_ESTIMATE_SAMPLE = 256
+
+
+def _sampled_bytes(rows: Iterable[object], count: int) -> int:
+    """Extrapolate the size of ``count`` rows (records or strings) from the first few."""
+
+    sampled = 0
+    size = 0
+    for record in rows:
+        if sampled == _ESTIMATE_SAMPLE:
+            break
+        if record is None:
+            continue
+        sampled += 1
+        size += sys.getsizeof(record)
+        if isinstance(record, Mapping):
+            size += sys.getsizeof(getattr(record, "derived", None))
+            size += sum(sys.getsizeof(value) for value in record.values() if value is not None)
+    return size * count // sampled if sampled else 0
+
+
+def _index_bytes(index: CSRIndex) -> int:
+    size = sys.getsizeof(index.keys) + sys.getsizeof(index.offsets) + sys.getsizeof(index.targets)
+    size += _sampled_bytes(index.keys, len(index.keys))
+    size += sum(sys.getsizeof(patch) for patch in index.patches.values())
+    return size
+
+
+def _sorted_bytes(index: SortedIndex) -> int:
+    return sys.getsizeof(index.entries) + _sampled_bytes(index.entries, len(index.entries))
+
+
+def _account_key(account: Mapping[str, Optional[str]]) -> str:
+    return browse_key(account.get("Name"))
+
+
+def _contact_key(contact: Mapping[str, Optional[str]]) -> str:
+    return cached_keys(contact, ContactKeys, contact_keys_for).name
+
+
+def _patch_names(
+    index: SortedIndex,
+    changed: Dict[str, Tuple[Optional[Record], Optional[Record]]],
+    key_of: Callable[[Mapping[str, Optional[str]]], str],
+) -> SortedIndex:
+    """Move the changed records of an Id-keyed entity inside its name index."""
+
+    drop = [(key_of(before), record_id) for record_id, (before, _) in changed.items() if before is not None]
+    add = [(key_of(after), record_id) for record_id, (_, after) in changed.items() if after is not None]
+    return index.patched(drop, add)
+
+
+def _identifiers_of(contact: Mapping[str, Optional[str]]) -> Iterator[Tuple[str, str]]:
+    return contact_identifiers(cached_keys(contact, ContactKeys, contact_keys_for))
+
+
+def _snapshot_field(name: str) -> property:
+    return property(lambda self: getattr(self._view(), name), doc=f"Current snapshot {name}.")
 
 
 class SalesforceRelationshipStore:
-    """Stores imported Salesforce data and keeps relationship indexes in sync."""
+    """Stores imported Salesforce data and keeps relationship indexes in sync.
+
+    Every import builds a new :class:`StoreSnapshot` and publishes it with one
+    assignment; published snapshots are never modified. Writers are serialised
+    by a lock, readers take no lock at all. Inside :meth:`pinned` every read of
+    the calling thread is served by the snapshot current when the block was
+    entered, so a long alert run keeps a consistent view while imports go on.
+    """
 
     ENTITY_KEYS = (
         "accounts",
@@ -35,101 +398,560 @@ class SalesforceRelationshipStore:
         "contact_point_emails",
     )
 
+    accounts = _snapshot_field("accounts")
+    contacts = _snapshot_field("contacts")
+    individuals = _snapshot_field("individuals")
+    account_contact_relations = _snapshot_field("account_contact_relations")
+    contact_point_phones = _snapshot_field("contact_point_phones")
+    contact_point_emails = _snapshot_field("contact_point_emails")
+
+    account_to_relations = _snapshot_field("account_to_relations")
+    contact_ids = _snapshot_field("contact_ids")
+    contact_to_individual = _snapshot_field("contact_to_individual")
+    individual_to_contacts = _snapshot_field("individual_to_contacts")
+    identifier_to_contacts = _snapshot_field("identifier_to_contacts")
+    individual_to_phones = _snapshot_field("individual_to_phones")
+    individual_to_emails = _snapshot_field("individual_to_emails")
+
     def __init__(self) -> None:
-        self.reset()
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+        self._state = StoreSnapshot()
+        self._estimate: Optional[Tuple[int, int]] = None
+        # Account fingerprints of one snapshot version; delta imports carry over the untouched ones.
+        self._fingerprints: Tuple[int, Dict[str, int]] = (-1, {})
 
     def reset(self) -> None:
-        self.accounts: Dict[str, Dict[str, str]] = {}
-        self.contacts: Dict[str, Dict[str, str]] = {}
-        self.individuals: Dict[str, Dict[str, str]] = {}
-        self.account_contact_relations: List[Dict[str, str]] = []
-        self.contact_point_phones: List[Dict[str, str]] = []
-        self.contact_point_emails: List[Dict[str, str]] = []
+        with self._write_lock:
+            self._state = StoreSnapshot(version=self._state.version + 1)
+
+    # ------------------------------------------------------------------
+    # Versions
+    # ------------------------------------------------------------------
+    def _view(self) -> StoreSnapshot:
+        """Snapshot pinned by the current thread, or the latest published one."""
+
+        return getattr(self._local, "pinned", None) or self._state
+
+    @property
+    def version(self) -> int:
+        """Version of the snapshot the current thread reads."""
+
+        return self._view().version
 
-        self.account_to_relations: Dict[str, List[Dict[str, str]]] = defaultdict(list)
-        self.contact_to_individual: Dict[str, Optional[str]] = {}
-        self.individual_to_contacts: Dict[str, List[str]] = defaultdict(list)
-        self.individual_to_phones: Dict[str, List[Dict[str, str]]] = defaultdict(list)
-        self.individual_to_emails: Dict[str, List[Dict[str, str]]] = defaultdict(list)
+    @contextmanager
+    def pinned(self) -> Iterator[int]:
+        """Serve the current thread's reads from the snapshot current on entry.
+
+        Yields the pinned version. Nested blocks keep the outer pin.
+        """
+
+        if getattr(self._local, "pinned", None) is not None:
+            yield self._local.pinned.version
+            return
+        self._local.pinned = self._state
+        try:
+            yield self._local.pinned.version
+        finally:
+            self._local.pinned = None
+
+    def after_fork(self) -> None:
+        """Called in a forked child process; the inherited snapshot is read as is."""
+
+        return None
 
     # ------------------------------------------------------------------
     # Data ingestion helpers
     # ------------------------------------------------------------------
-    def replace_entity(self, entity: str, records: Sequence[Dict[str, str]]) -> None:
-        if entity not in self.ENTITY_KEYS:
-            raise ValueError(f"Unsupported entity '{entity}'. Expected one of {', '.join(self.ENTITY_KEYS)}")
+    def replace_entity(self, entity: str, records: Iterable[Dict[str, str]]) -> None:
+        self.bulk_replace({entity: records})
 
-        if entity == "accounts":
-            self.accounts = {record.get("Id", ""): record for record in records if record.get("Id")}
-        elif entity == "contacts":
-            self.contacts = {record.get("Id", ""): record for record in records if record.get("Id")}
-        elif entity == "individuals":
-            self.individuals = {record.get("Id", ""): record for record in records if record.get("Id")}
-        elif entity == "account_contact_relations":
-            self.account_contact_relations = list(records)
-        elif entity == "contact_point_phones":
-            self.contact_point_phones = list(records)
-        elif entity == "contact_point_emails":
-            self.contact_point_emails = list(records)
-        else:  # pragma: no cover - defensive branch
-            raise ValueError(f"Unknown entity: {entity}")
+    def bulk_replace(
+        self,
+        payload: Dict[str, Iterable[Dict[str, str]]],
+        on_indexing: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """Replace several entities at once and publish them with a single swap.
 
-        self._rebuild_indexes()
+        The new maps are built on a staged copy of the current snapshot, only
+        the indexes that depend on the replaced entities are rebuilt, and the
+        staged snapshot becomes visible to readers in one assignment. Plain
+        dictionaries are converted to compact :class:`Record` rows on the way in,
+        and every row gets its normalised alert keys (:func:`attach_keys`).
 
-    def bulk_replace(self, payload: Dict[str, Sequence[Dict[str, str]]]) -> None:
-        for entity in self.ENTITY_KEYS:
-            records = payload.get(entity)
-            if records is not None:
-                self.replace_entity(entity, records)
+        ``on_indexing`` is called once every row has been read, before the
+        indexes are rebuilt: streamed uploads are parsed while the rows are read.
+        """
+
+        unknown = [entity for entity in payload if entity not in self.ENTITY_KEYS]
+        if unknown:
+            raise ValueError(
+                f"Unsupported entity '{unknown[0]}'. Expected one of {', '.join(self.ENTITY_KEYS)}"
+            )
+
+        with self._write_lock:
+            staged = replace(self._state, version=self._state.version + 1)
+            for entity in self.ENTITY_KEYS:
+                records = payload.get(entity)
+                if records is None:
+                    continue
+                compact = (attach_keys(entity, Record.from_mapping(record)) for record in records)
+                if entity in ("accounts", "contacts", "individuals"):
+                    setattr(
+                        staged,
+                        entity,
+                        {record.get("Id", ""): record for record in compact if record.get("Id")},
+                    )
+                else:
+                    setattr(staged, entity, list(compact))
+
+            if on_indexing is not None:
+                on_indexing()
+            for entity, builder in self._INDEX_BUILDERS.items():
+                if entity in payload:
+                    getattr(self, builder)(staged)
+
+            self._state = staged
 
     # ------------------------------------------------------------------
-    # Relationship rebuilders
+    # Delta imports
     # ------------------------------------------------------------------
-    def _rebuild_indexes(self) -> None:
-        self.account_to_relations = defaultdict(list)
-        for relation in self.account_contact_relations:
-            account_id = relation.get("AccountId")
-            contact_id = relation.get("ContactId")
-            if account_id and contact_id:
-                self.account_to_relations[account_id].append(relation)
-            else:
-                log_loop_event(
-                    "Relazione AccountContact scartata per ID mancanti "
-                    f"(AccountId={account_id!r}, ContactId={contact_id!r})."
-                )
+    def apply_delta(
+        self,
+        upserts: Dict[str, Iterable[Dict[str, str]]],
+        deleted_ids: Iterable[str] = (),
+    ) -> Dict[str, object]:
+        """Upsert records by ``Id`` and delete ``deleted_ids`` from every entity.
+
+        Rows whose ``IsDeleted`` column is true count as deletions. Only the
+        index entries of the keys touched by the change set are rewritten (as
+        :meth:`CSRIndex.patched` overlays); an entity is compacted and fully
+        re-indexed only once its overlays or tombstones exceed a quarter of its
+        size. Returns the per-entity upsert and delete counts together with the
+        sorted Ids of every account whose data changed.
+        """
+
+        unknown = [entity for entity in upserts if entity not in self.ENTITY_KEYS]
+        if unknown:
+            raise ValueError(
+                f"Unsupported entity '{unknown[0]}'. Expected one of {', '.join(self.ENTITY_KEYS)}"
+            )
+
+        deleted = set(deleted_ids)
+        changes: Dict[str, Dict[str, Record]] = {}
+        for entity in self.ENTITY_KEYS:
+            records = upserts.get(entity)
+            if records is None:
+                continue
+            rows = changes[entity] = {}
+            for record in records:
+                record = Record.from_mapping(record)
+                record_id = record.get("Id")
+                if not record_id:
+                    continue
+                if is_deleted(record):
+                    deleted.add(record_id)
+                else:
+                    rows[record_id] = attach_keys(entity, strip_delete_flag(record))
+        for rows in changes.values():
+            for record_id in deleted.intersection(rows):
+                del rows[record_id]
+
+        with self._write_lock:
+            state = self._state
+            staged = replace(state, version=state.version + 1)
+            tracker = _DeltaTracker()
+            accounts = self._delta_map(staged, "accounts", changes.get("accounts", {}), deleted, tracker)
+            if accounts:
+                staged.account_names = _patch_names(staged.account_names, accounts, _account_key)
+            self._delta_map(staged, "individuals", changes.get("individuals", {}), deleted, tracker)
+            self._delta_contacts(staged, changes.get("contacts", {}), deleted, tracker)
+            for entity in self._LIST_INDEXES:
+                self._delta_list(staged, entity, changes.get(entity, {}), deleted, tracker)
+
+            touched_accounts = self._touched_accounts(state, staged, tracker)
+            self._state = staged
+            memo_version, memo = self._fingerprints
+            if memo_version == state.version:
+                carried = dict(memo)
+                for account_id in touched_accounts:
+                    carried.pop(account_id, None)
+                self._fingerprints = (staged.version, carried)
+        return {
+            "upserted": tracker.upserted,
+            "deleted": tracker.deleted,
+            "touched_accounts": sorted(touched_accounts),
+        }
+
+    @staticmethod
+    def _delta_map(
+        staged: StoreSnapshot,
+        entity: str,
+        rows: Dict[str, Record],
+        deleted: set,
+        tracker: "_DeltaTracker",
+    ) -> Dict[str, Tuple[Optional[Record], Optional[Record]]]:
+        """Apply the change set to an Id-keyed entity, returning ``{Id: (before, after)}``."""
+
+        current = getattr(staged, entity)
+        removing = deleted.intersection(current)
+        if not rows and not removing:
+            return {}
 
-        self.contact_to_individual = {}
-        self.individual_to_contacts = defaultdict(list)
-        for contact_id, contact in self.contacts.items():
-            individual_id = contact.get("IndividualId")
+        updated = dict(current)
+        changed: Dict[str, Tuple[Optional[Record], Optional[Record]]] = {}
+        for record_id in removing:
+            before = updated.pop(record_id)
+            tracker.note(entity, before)
+            changed[record_id] = (before, None)
+        for record_id, record in rows.items():
+            before = updated.get(record_id)
+            if before is not None:
+                tracker.note(entity, before)
+            tracker.note(entity, record)
+            updated[record_id] = record
+            changed[record_id] = (before, record)
+
+        setattr(staged, entity, updated)
+        tracker.upserted[entity] = len(rows)
+        tracker.deleted[entity] = len(removing)
+        return changed
+
+    def _delta_contacts(
+        self,
+        staged: StoreSnapshot,
+        rows: Dict[str, Record],
+        deleted: set,
+        tracker: "_DeltaTracker",
+    ) -> None:
+        changed = self._delta_map(staged, "contacts", rows, deleted, tracker)
+        if not changed:
+            return
+
+        contact_ids: List[Optional[str]] = list(staged.contact_ids)
+        positions = {
+            contact_id: position
+            for position, contact_id in enumerate(contact_ids)
+            if contact_id in changed
+        }
+        contact_to_individual = dict(staged.contact_to_individual)
+        drop: Dict[str, set] = defaultdict(set)
+        add: Dict[str, set] = defaultdict(set)
+        drop_identifiers = {kind: defaultdict(set) for kind in IDENTIFIER_KINDS}
+        add_identifiers = {kind: defaultdict(set) for kind in IDENTIFIER_KINDS}
+        for contact_id, (before, after) in changed.items():
+            position = positions.get(contact_id)
+            if before is not None and position is not None:
+                if before.get("IndividualId"):
+                    drop[before["IndividualId"]].add(position)
+                for kind, value in _identifiers_of(before):
+                    drop_identifiers[kind][value].add(position)
+            if after is None:
+                contact_to_individual.pop(contact_id, None)
+                if position is not None:
+                    contact_ids[position] = None
+                continue
+            if position is None:
+                position = len(contact_ids)
+                contact_ids.append(contact_id)
+            for kind, value in _identifiers_of(after):
+                add_identifiers[kind][value].add(position)
+            individual_id = after.get("IndividualId")
             if individual_id:
-                self.contact_to_individual[contact_id] = individual_id
-                self.individual_to_contacts[individual_id].append(contact_id)
+                contact_to_individual[contact_id] = individual_id
+                add[individual_id].add(position)
             else:
-                self.contact_to_individual[contact_id] = None
+                contact_to_individual[contact_id] = None
                 log_loop_event(
                     f"Contatto {contact_id} senza IndividualId associato, salto associazione."
                 )
 
-        self.individual_to_phones = defaultdict(list)
-        for phone in self.contact_point_phones:
-            parent_id = phone.get("ParentId")
-            if parent_id:
-                self.individual_to_phones[parent_id].append(phone)
-            else:
-                log_loop_event(
-                    "ContactPointPhone scartato per ParentId mancante: " f"{phone}"
-                )
+        index = self._patch_index(staged.individual_to_contacts, drop, add)
+        identifiers = {
+            kind: self._patch_index(
+                staged.identifier_to_contacts.get(kind) or CSRIndex.empty(),
+                drop_identifiers[kind],
+                add_identifiers[kind],
+            )
+            for kind in IDENTIFIER_KINDS
+        }
+        tombstones = contact_ids.count(None)
+        if any(
+            self._needs_compaction(patched, tombstones, len(contact_ids))
+            for patched in (index, *identifiers.values())
+        ):
+            self._index_contacts(staged)
+            return
+        staged.contact_ids = contact_ids
+        staged.contact_to_individual = contact_to_individual
+        staged.individual_to_contacts = index
+        staged.identifier_to_contacts = identifiers
+        staged.contact_names = _patch_names(staged.contact_names, changed, _contact_key)
+
+    def _delta_list(
+        self,
+        staged: StoreSnapshot,
+        entity: str,
+        rows: Dict[str, Record],
+        deleted: set,
+        tracker: "_DeltaTracker",
+    ) -> None:
+        if not rows and not deleted:
+            return
 
-        self.individual_to_emails = defaultdict(list)
-        for email in self.contact_point_emails:
-            parent_id = email.get("ParentId")
-            if parent_id:
-                self.individual_to_emails[parent_id].append(email)
+        items: List[Optional[Record]] = list(getattr(staged, entity))
+        wanted = deleted.union(rows)
+        positions: Dict[str, int] = {}
+        for position, record in enumerate(items):
+            if record is not None and record.get("Id") in wanted:
+                positions[record["Id"]] = position
+
+        index_name, key_of, label = self._LIST_INDEXES[entity]
+        drop: Dict[str, set] = defaultdict(set)
+        add: Dict[str, set] = defaultdict(set)
+        removed = 0
+        for record_id in deleted.intersection(positions):
+            position = positions[record_id]
+            before = items[position]
+            tracker.note(entity, before)
+            if key_of(before):
+                drop[key_of(before)].add(position)
+            items[position] = None
+            removed += 1
+        for record_id, record in rows.items():
+            position = positions.get(record_id)
+            if position is None:
+                position = len(items)
+                items.append(record)
             else:
-                log_loop_event(
-                    "ContactPointEmail scartato per ParentId mancante: " f"{email}"
-                )
+                before = items[position]
+                tracker.note(entity, before)
+                if key_of(before):
+                    drop[key_of(before)].add(position)
+                items[position] = record
+            tracker.note(entity, record)
+            key = key_of(record)
+            if key:
+                add[key].add(position)
+            else:
+                log_loop_event(f"{label} {record_id} senza chiave di relazione, escluso dagli indici.")
+
+        if not rows and not removed:
+            return
+        tracker.upserted[entity] = len(rows)
+        tracker.deleted[entity] = removed
+
+        index = self._patch_index(getattr(staged, index_name), drop, add)
+        if self._needs_compaction(index, items.count(None), len(items)):
+            setattr(staged, entity, [record for record in items if record is not None])
+            getattr(self, self._INDEX_BUILDERS[entity])(staged)
+            return
+        setattr(staged, entity, items)
+        setattr(staged, index_name, index)
+
+    @staticmethod
+    def _patch_index(index: CSRIndex, drop: Dict[str, set], add: Dict[str, set]) -> CSRIndex:
+        changes = {}
+        for key in drop.keys() | add.keys():
+            targets = set(index.targets_for(key)) - drop.get(key, set()) | add.get(key, set())
+            changes[key] = array("I", sorted(targets))
+        return index.patched(changes) if changes else index
+
+    @staticmethod
+    def _needs_compaction(index: CSRIndex, tombstones: int, size: int) -> bool:
+        return len(index.patches) * 4 > max(len(index.keys), 64) or tombstones * 4 > max(size, 64)
+
+    @staticmethod
+    def _touched_accounts(
+        before: StoreSnapshot, after: StoreSnapshot, tracker: "_DeltaTracker"
+    ) -> set:
+        accounts = set(tracker.accounts)
+        contacts = set(tracker.contacts)
+        for individual_id in tracker.individuals:
+            for state in (before, after):
+                for position in state.individual_to_contacts.targets_for(individual_id):
+                    contact_id = state.contact_ids[position]
+                    if contact_id:
+                        contacts.add(contact_id)
+        if contacts:
+            for relation in after.account_contact_relations:
+                if relation is not None and relation.get("ContactId") in contacts:
+                    accounts.add(relation.get("AccountId"))
+        accounts.discard(None)
+        accounts.discard("")
+        return accounts
+
+    # ------------------------------------------------------------------
+    # Memory accounting
+    # ------------------------------------------------------------------
+    def memory_estimate(self) -> int:
+        """Approximate bytes held by the latest snapshot, records and indexes included.
+
+        Record sizes are extrapolated from a sample of each entity, and strings
+        shared between rows are counted once per row, so the figure errs high.
+        The result is cached per snapshot version.
+        """
+
+        state = self._state
+        cached = self._estimate
+        if cached is not None and cached[0] == state.version:
+            return cached[1]
+        total = 0
+        for entity in self.ENTITY_KEYS:
+            rows = getattr(state, entity)
+            records = rows.values() if isinstance(rows, dict) else rows
+            total += sys.getsizeof(rows) + _sampled_bytes(records, len(rows))
+        indexes = [
+            state.account_to_relations,
+            state.individual_to_contacts,
+            state.individual_to_phones,
+            state.individual_to_emails,
+            *state.identifier_to_contacts.values(),
+        ]
+        for index in indexes:
+            total += _index_bytes(index)
+        total += _sorted_bytes(state.account_names) + _sorted_bytes(state.contact_names)
+        total += sys.getsizeof(state.contact_ids) + sys.getsizeof(state.contact_to_individual)
+        self._estimate = (state.version, total)
+        return total
+
+    # ------------------------------------------------------------------
+    # Snapshot persistence
+    # ------------------------------------------------------------------
+    def save_snapshot(self, path: Path) -> int:
+        """Write the current snapshot, records and indexes included, to ``path``."""
+
+        return write_snapshot(self._state, path)
+
+    def load_snapshot(self, path: Path) -> None:
+        """Replace the store content with a snapshot previously saved to ``path``."""
+
+        state = read_snapshot(path)
+        if not isinstance(state, StoreSnapshot):
+            raise SnapshotError(f"Snapshot {path} does not contain a store snapshot.")
+        with self._write_lock:
+            state.version = self._state.version + 1
+            self._state = state
+
+    # ------------------------------------------------------------------
+    # Relationship rebuilders
+    # ------------------------------------------------------------------
+    # Each index is rebuilt only when the entity it is derived from changes.
+    _INDEX_BUILDERS = {
+        "accounts": "_index_accounts",
+        "account_contact_relations": "_index_relations",
+        "contacts": "_index_contacts",
+        "contact_point_phones": "_index_phones",
+        "contact_point_emails": "_index_emails",
+    }
+
+    # Entity lists maintained in place by delta imports: index name, key and log label.
+    _LIST_INDEXES = {
+        "account_contact_relations": (
+            "account_to_relations",
+            lambda record: record.get("AccountId") if record.get("ContactId") else None,
+            "AccountContactRelation",
+        ),
+        "contact_point_phones": (
+            "individual_to_phones",
+            lambda record: record.get("ParentId") or None,
+            "ContactPointPhone",
+        ),
+        "contact_point_emails": (
+            "individual_to_emails",
+            lambda record: record.get("ParentId") or None,
+            "ContactPointEmail",
+        ),
+    }
+
+    @staticmethod
+    def _index_accounts(snapshot: StoreSnapshot) -> None:
+        snapshot.account_names = SortedIndex.build(
+            (_account_key(account), account_id) for account_id, account in snapshot.accounts.items()
+        )
+
+    @staticmethod
+    def _index_relations(snapshot: StoreSnapshot) -> None:
+        def pairs() -> Iterator[Tuple[str, int]]:
+            for position, relation in enumerate(snapshot.account_contact_relations):
+                if relation is None:
+                    continue
+                account_id = relation.get("AccountId")
+                contact_id = relation.get("ContactId")
+                if account_id and contact_id:
+                    yield account_id, position
+                else:
+                    log_loop_event(
+                        "Relazione AccountContact scartata per ID mancanti "
+                        f"(AccountId={account_id!r}, ContactId={contact_id!r})."
+                    )
+
+        snapshot.account_to_relations = CSRIndex.build(pairs())
+
+    @staticmethod
+    def _index_contacts(snapshot: StoreSnapshot) -> None:
+        contact_ids = list(snapshot.contacts)
+        contact_to_individual: Dict[str, Optional[str]] = {}
+
+        def pairs() -> Iterator[Tuple[str, int]]:
+            for position, contact_id in enumerate(contact_ids):
+                individual_id = snapshot.contacts[contact_id].get("IndividualId")
+                if individual_id:
+                    contact_to_individual[contact_id] = individual_id
+                    yield individual_id, position
+                else:
+                    contact_to_individual[contact_id] = None
+                    log_loop_event(
+                        f"Contatto {contact_id} senza IndividualId associato, salto associazione."
+                    )
+
+        snapshot.individual_to_contacts = CSRIndex.build(pairs())
+        snapshot.contact_ids = contact_ids
+        snapshot.contact_to_individual = contact_to_individual
+        snapshot.contact_names = SortedIndex.build(
+            (_contact_key(contact), contact_id) for contact_id, contact in snapshot.contacts.items()
+        )
+        SalesforceRelationshipStore._index_identifiers(snapshot)
+
+    @staticmethod
+    def _index_identifiers(snapshot: StoreSnapshot) -> None:
+        values: Dict[str, List[str]] = {kind: [] for kind in IDENTIFIER_KINDS}
+        positions: Dict[str, array] = {kind: array("I") for kind in IDENTIFIER_KINDS}
+        for position, contact_id in enumerate(snapshot.contact_ids):
+            if contact_id is None:
+                continue
+            for kind, value in _identifiers_of(snapshot.contacts[contact_id]):
+                values[kind].append(value)
+                positions[kind].append(position)
+        snapshot.identifier_to_contacts = {
+            kind: CSRIndex.build(zip(values[kind], positions[kind])) for kind in IDENTIFIER_KINDS
+        }
+
+    @staticmethod
+    def _index_contact_points(points: List[Dict[str, str]], label: str) -> CSRIndex:
+        def pairs() -> Iterator[Tuple[str, int]]:
+            for position, point in enumerate(points):
+                if point is None:
+                    continue
+                parent_id = point.get("ParentId")
+                if parent_id:
+                    yield parent_id, position
+                else:
+                    log_loop_event(f"{label} scartato per ParentId mancante: {point}")
+
+        return CSRIndex.build(pairs())
+
+    @classmethod
+    def _index_phones(cls, snapshot: StoreSnapshot) -> None:
+        snapshot.individual_to_phones = cls._index_contact_points(
+            snapshot.contact_point_phones, "ContactPointPhone"
+        )
+
+    @classmethod
+    def _index_emails(cls, snapshot: StoreSnapshot) -> None:
+        snapshot.individual_to_emails = cls._index_contact_points(
+            snapshot.contact_point_emails, "ContactPointEmail"
+        )
 
     # ------------------------------------------------------------------
     # Lookup helpers
@@ -140,30 +962,14 @@ class SalesforceRelationshipStore:
     def get_account(self, account_id: str) -> Optional[Dict[str, str]]:
         return self.accounts.get(account_id)
 
-    def get_contacts_for_account(self, account_id: str) -> List[Dict[str, str]]:
-        contacts: List[Dict[str, str]] = []
-        for relation in self.account_to_relations.get(account_id, []):
-            contact_id = relation.get("ContactId")
-            if not contact_id:
-                log_loop_event(
-                    f"Relazione AccountContact senza ContactId per account {account_id}, salto."
-                )
-                continue
-            contact = self.contacts.get(contact_id)
-            if not contact:
-                log_loop_event(
-                    f"Contatto {contact_id} non trovato per account {account_id}, salto."
-                )
-                continue
-            enriched = dict(contact)
-            if enriched["AccountId"] != account_id:
-                log_loop_event(
-                    f"Contatto {contact_id} con altro account {enriched['AccountId']} rispetto ad account {account_id}, salto."
-                )
-                continue
-            enriched["_relation"] = relation
-            contacts.append(enriched)
-        return contacts
+    def get_relations_for_account(self, account_id: str) -> Sequence[Dict[str, str]]:
+        state = self._view()
+        return PositionView(
+            state.account_contact_relations, state.account_to_relations.targets_for(account_id)
+        )
+
+    def get_contacts_for_account(self, account_id: str) -> List[ContactView]:
+        return enrich_contacts(account_id, self.get_relations_for_account(account_id), self.contacts)
 
     def get_individual_for_contact(self, contact_id: str) -> Optional[Dict[str, str]]:
         individual_id = self.contact_to_individual.get(contact_id)
@@ -171,54 +977,244 @@ class SalesforceRelationshipStore:
             return None
         return self.individuals.get(individual_id)
 
-    def get_contact_points_for_contact(self, contact_id: str) -> Dict[str, List[Dict[str, str]]]:
-        individual_id = self.contact_to_individual.get(contact_id)
+    def get_contact_points_for_contact(self, contact_id: str) -> Dict[str, Sequence[Dict[str, str]]]:
+        return self._contact_points(self._view(), contact_id)
+
+    @staticmethod
+    def _contact_points(state: StoreSnapshot, contact_id: str) -> Dict[str, Sequence[Dict[str, str]]]:
+        individual_id = state.contact_to_individual.get(contact_id)
         if not individual_id:
-            return {"phones": [], "emails": []}
+            return {"phones": (), "emails": ()}
         return {
-            "phones": list(self.individual_to_phones.get(individual_id, [])),
-            "emails": list(self.individual_to_emails.get(individual_id, [])),
+            "phones": PositionView(
+                state.contact_point_phones, state.individual_to_phones.targets_for(individual_id)
+            ),
+            "emails": PositionView(
+                state.contact_point_emails, state.individual_to_emails.targets_for(individual_id)
+            ),
         }
 
+    def get_contacts_for_identifier(self, kind: str, value: str) -> List[str]:
+        """Return the Ids of the contacts whose normalised ``kind`` identifier equals ``value``."""
+
+        state = self._view()
+        index = state.identifier_to_contacts.get(kind) or CSRIndex.empty()
+        return [state.contact_ids[position] for position in index.targets_for(value)]
+
+    def iter_shared_identifiers(self, kind: str) -> Iterator[Tuple[str, List[str]]]:
+        """Yield ``(value, contact_ids)`` for every ``kind`` identifier held by two or more contacts.
+
+        ``kind`` is one of :data:`IDENTIFIER_KINDS`; values are normalised like
+        the alert keys. This is a single pass over the inverted index.
+        """
+
+        state = self._view()
+        index = state.identifier_to_contacts.get(kind) or CSRIndex.empty()
+        for value in index:
+            positions = index.targets_for(value)
+            if len(positions) > 1:
+                yield value, [state.contact_ids[position] for position in positions]
+
+    def iter_account_contacts(self) -> Iterator[Tuple[str, str]]:
+        """Yield ``(account_id, contact_id)`` for every AccountContactRelation, in file order."""
+
+        for relation in self._view().account_contact_relations:
+            if relation is None:
+                continue
+            account_id = relation.get("AccountId")
+            contact_id = relation.get("ContactId")
+            if account_id and contact_id:
+                yield account_id, contact_id
+
+    def iter_contact_rows(self, with_points: bool = False) -> Iterator[ContactRow]:
+        """Yield every relation joined with its contact, in file order.
+
+        Relations are kept or skipped exactly as :func:`enrich_contacts` does for
+        one account, without logging, so the rows of an account come in the
+        order of :meth:`get_contacts_for_account`.
+        """
+
+        state = self._view()
+        contacts = state.contacts
+        for relation in state.account_contact_relations:
+            if relation is None:
+                continue
+            account_id = relation.get("AccountId")
+            contact_id = relation.get("ContactId")
+            if not account_id or not contact_id:
+                continue
+            contact = contacts.get(contact_id)
+            if not contact or contact.get("AccountId") != account_id:
+                continue
+            points = self._contact_points(state, contact_id) if with_points else None
+            yield ContactRow(account_id, ContactView(contact, relation), points)
+
+    def account_fingerprint(self, account_id: str) -> int:
+        """Content hash of every record the per-account alerts read for ``account_id``.
+
+        Covers the account, its relations, their contacts, the contacts'
+        individuals and contact points. Equal fingerprints mean the account's
+        alerts can be reused from a previous run.
+
+        Fingerprints of the latest version are memoised; a delta import keeps
+        those of the accounts outside its ``touched_accounts``.
+        """
+
+        state = self._view()
+        memo_version, memo = self._fingerprints
+        if memo_version != state.version and state is self._state:
+            memo_version, memo = self._fingerprints = (state.version, {})
+        if memo_version == state.version:
+            fingerprint = memo.get(account_id)
+            if fingerprint is None:
+                fingerprint = memo[account_id] = self._fingerprint(state, account_id)
+            return fingerprint
+        return self._fingerprint(state, account_id)
+
+    def _fingerprint(self, state: StoreSnapshot, account_id: str) -> int:
+        parts = [content_hash(state.accounts.get(account_id))]
+        for position in state.account_to_relations.targets_for(account_id):
+            relation = state.account_contact_relations[position]
+            contact_id = relation.get("ContactId")
+            parts.append(content_hash(relation))
+            parts.append(content_hash(state.contacts.get(contact_id)))
+            individual_id = state.contact_to_individual.get(contact_id)
+            if not individual_id:
+                continue
+            parts.append(content_hash(state.individuals.get(individual_id)))
+            points = self._contact_points(state, contact_id)
+            parts.extend(content_hash(point) for point in points["phones"])
+            parts.extend(content_hash(point) for point in points["emails"])
+        return hash(tuple(parts))
+
+    def get_contacts_for_individual(self, individual_id: str) -> List[str]:
+        state = self._view()
+        return [
+            state.contact_ids[position]
+            for position in state.individual_to_contacts.targets_for(individual_id)
+        ]
+
     def describe_account(self, account_id: str) -> AccountContext:
-        account = self.accounts.get(account_id, {})
-        relations = list(self.account_to_relations.get(account_id, []))
-        contacts = self.get_contacts_for_account(account_id)
-        contact_index = {contact.get("Id", ""): contact for contact in contacts if contact.get("Id")}
-        contact_to_individual = {
-            contact_id: self.contact_to_individual.get(contact_id)
-            for contact_id in contact_index
-        }
-        individual_to_contacts = defaultdict(list)
-        for contact_id, individual_id in contact_to_individual.items():
-            if individual_id:
-                individual_to_contacts[individual_id].append(contact_id)
-
-        return AccountContext(
-            account_id=account_id,
-            account=account,
-            relations=relations,
-            contacts=contacts,
-            contact_index=contact_index,
-            contact_to_individual=dict(contact_to_individual),
-            individual_to_contacts=dict(individual_to_contacts),
+        state = self._view()
+        relations = PositionView(
+            state.account_contact_relations, state.account_to_relations.targets_for(account_id)
+        )
+        return build_account_context(
+            account_id, state.accounts.get(account_id, {}), relations, state.contacts, self
+        )
+
+    # ------------------------------------------------------------------
+    # Browsing
+    # ------------------------------------------------------------------
+    def page_accounts(
+        self, prefix: str = "", after: Optional[Tuple[str, str]] = None, limit: int = 50
+    ) -> BrowsePage:
+        """Accounts sorted by name (then Id) whose name starts with ``prefix``."""
+
+        state = self._view()
+        pairs = state.account_names.page(browse_key(prefix), after, limit + 1)
+        rows = [(key, account_id, state.accounts[account_id]) for key, account_id in pairs]
+        return BrowsePage(rows[:limit], len(rows) > limit)
+
+    def page_contacts(
+        self, prefix: str = "", after: Optional[Tuple[str, str]] = None, limit: int = 50
+    ) -> BrowsePage:
+        """Contacts sorted by full name (then Id) whose full name starts with ``prefix``."""
+
+        state = self._view()
+        pairs = state.contact_names.page(browse_key(prefix), after, limit + 1)
+        rows = [(key, contact_id, state.contacts[contact_id]) for key, contact_id in pairs]
+        return BrowsePage(rows[:limit], len(rows) > limit)
+
+    def page_account_contacts(
+        self,
+        account_id: str,
+        prefix: str = "",
+        after: Optional[Tuple[str, str]] = None,
+        limit: int = 50,
+    ) -> BrowsePage:
+        """Contacts related to ``account_id`` as :class:`ContactView` rows, by full name.
+
+        The token of each row is the relation Id (the contact Id if it has none).
+        """
+
+        state = self._view()
+        relations = PositionView(
+            state.account_contact_relations, state.account_to_relations.targets_for(account_id)
         )
+        rows = []
+        for relation in relations:
+            contact_id = relation.get("ContactId")
+            contact = state.contacts.get(contact_id) if contact_id else None
+            if contact is not None:
+                rows.append(
+                    (_contact_key(contact), relation.get("Id") or contact_id, ContactView(contact, relation))
+                )
+        return page_rows(rows, browse_key(prefix), after, limit)
+
+    def page_contact_points(
+        self, individual_id: str, after: Optional[Tuple[str, str]] = None, limit: int = 50
+    ) -> BrowsePage:
+        """ContactPointEmail and ContactPointPhone rows of ``individual_id``.
+
+        The key of each row is ``emails`` or ``phones``; the token is the record Id
+        (``#<position>`` if it has none).
+        """
+
+        state = self._view()
+        rows = []
+        for kind, points, index in (
+            ("emails", state.contact_point_emails, state.individual_to_emails),
+            ("phones", state.contact_point_phones, state.individual_to_phones),
+        ):
+            for position in index.targets_for(individual_id):
+                point = points[position]
+                rows.append((kind, point.get("Id") or f"#{position}", point))
+        return page_rows(rows, "", after, limit)
 
     def resolve_account_name(self, account_id: str) -> str:
         account = self.get_account(account_id) or {}
         return account.get("Name") or account_id
 
     def resolve_contact_name(self, contact_id: str) -> str:
-        contact = self.contacts.get(contact_id) or {}
-        first = contact.get("FirstName")
-        last = contact.get("LastName")
-        if first or last:
-            return " ".join(part for part in (first, last) if part).strip()
-        return contact.get("Id") or contact_id
+        return format_contact_name(self.contacts.get(contact_id) or {}, contact_id)
 
     def timestamp(self) -> str:
         return datetime.utcnow().isoformat(timespec="seconds") + "Z"
 
 
-DATA_STORE = SalesforceRelationshipStore()
+STORE_BACKENDS = ("memory", "sqlite")
+
+
+def configured_backend() -> str:
+    """Return the backend selected by ``SFBPCA_STORE_BACKEND`` (``memory`` by default)."""
+
+    return (os.environ.get("SFBPCA_STORE_BACKEND") or "memory").strip().lower()
+
+
+def configured_database_path() -> Path:
+    """Return the SQLite file selected by ``SFBPCA_SQLITE_PATH``."""
+
+    from .sqlite_store import DEFAULT_DATABASE_FILE
+
+    return Path(os.environ.get("SFBPCA_SQLITE_PATH") or DEFAULT_DATABASE_FILE)
+
+
+def create_store(backend: Optional[str] = None, path: Optional[Path] = None):
+    """Build the store selected by ``SFBPCA_STORE_BACKEND`` (``memory`` or ``sqlite``).
+
+    ``path`` overrides the SQLite file, so that several stores can coexist.
+    """
+
+    backend = (backend or configured_backend()).strip().lower()
+    if backend == "memory":
+        return SalesforceRelationshipStore()
+    if backend == "sqlite":
+        from .sqlite_store import SQLiteRelationshipStore
+
+        return SQLiteRelationshipStore(Path(path) if path else configured_database_path())
+    raise ValueError(f"Unsupported store backend '{backend}'. Expected one of {', '.join(STORE_BACKENDS)}")
+
+
+DATA_STORE = create_store()
 """Singleton instance used throughout the alternate application."""
@@ -0,0 +1,210 @@
+"""Import dei CSV eseguiti in background con avanzamento consultabile."""
+
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from time import perf_counter
+from typing import Dict, List, Optional
+
+from werkzeug.datastructures import FileStorage
+
+from .csv_import import ImportProgress
+from .logbook import log_loop_event
+from .workspaces import DEFAULT_WORKSPACE, WORKSPACES, WorkspaceRegistry
+
+IMPORT_MODES = ("replace", "delta")
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+def _timestamp() -> str:
+    return datetime.utcnow().isoformat(timespec="seconds") + "Z"
+
+
+class ImportJob(ImportProgress):
+    """Stato di un import in background, aggiornato dal worker e letto dalle richieste HTTP."""
+
+    def __init__(self, job_id: str, mode: str, workspace: str = DEFAULT_WORKSPACE) -> None:
+        self.id = job_id
+        self.mode = mode
+        self.workspace = workspace
+        self.status = "queued"
+        self.phase_name = "queued"
+        self.created_at = _timestamp()
+        self.finished_at: Optional[str] = None
+        self.error: Optional[str] = None
+        self.result: Optional[Dict[str, object]] = None
+        self._rows: Dict[str, int] = {}
+        self._started: Optional[float] = None
+        self._finished: Optional[float] = None
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # ImportProgress
+    # ------------------------------------------------------------------
+    def phase(self, name: str) -> None:
+        with self._lock:
+            self.phase_name = name
+
+    def rows(self, entity: str, count: int) -> None:
+        with self._lock:
+            self._rows[entity] = count
+
+    # ------------------------------------------------------------------
+    # Ciclo di vita
+    # ------------------------------------------------------------------
+    def start(self) -> None:
+        with self._lock:
+            self.status = "running"
+            self._started = perf_counter()
+
+    def finish(self, result: Optional[Dict[str, object]] = None, error: Optional[str] = None) -> None:
+        with self._lock:
+            self.status = "failed" if error else "completed"
+            self.phase_name = self.status
+            self.result = result
+            self.error = error
+            self.finished_at = _timestamp()
+            self._finished = perf_counter()
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def to_dict(self) -> Dict[str, object]:
+        with self._lock:
+            elapsed = 0.0
+            if self._started is not None:
+                elapsed = (self._finished or perf_counter()) - self._started
+            rows_per_second = round(sum(self._rows.values()) / elapsed) if elapsed > 0 else 0
+            payload: Dict[str, object] = {
+                "job": self.id,
+                "mode": self.mode,
+                "workspace": self.workspace,
+                "status": self.status,
+                "phase": self.phase_name,
+                "created_at": self.created_at,
+                "finished_at": self.finished_at,
+                "elapsed_seconds": round(elapsed, 2),
+                "rows": dict(self._rows),
+                "rows_per_second": rows_per_second,
+                "error": self.error,
+            }
+            if self.result is not None:
+                payload.update(self.result)
+            return payload
+
+
+class ImportJobRegistry:
+    """Accoda gli import nei worker dedicati e conserva gli ultimi job conclusi.
+
+    Import di aree di lavoro diverse procedono in parallelo; quelli della stessa
+    area restano in sequenza perché il coordinatore dell'area li serializza.
+    """
+
+    def __init__(
+        self,
+        workspaces: WorkspaceRegistry,
+        *,
+        history: int = 20,
+        workers: Optional[int] = None,
+    ) -> None:
+        self.workspaces = workspaces
+        self.history = history
+        self._jobs: "OrderedDict[str, ImportJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or min(4, os.cpu_count() or 1), thread_name_prefix="sfbpca-import"
+        )
+
+    def submit(
+        self, payload: Dict[str, object], mode: str = "replace", workspace_id: str = DEFAULT_WORKSPACE
+    ) -> ImportJob:
+        """Copia gli upload su disco e avvia l'import senza attendere il parsing."""
+
+        if mode not in IMPORT_MODES:
+            raise ValueError(f"Modalità di import '{mode}' non supportata.")
+        job = ImportJob(uuid.uuid4().hex, mode, workspace_id)
+        spool_dir = tempfile.mkdtemp(prefix="sfbpca_import_")
+        try:
+            spooled = _spool_payload(payload, spool_dir)
+        except BaseException:
+            shutil.rmtree(spool_dir, ignore_errors=True)
+            raise
+
+        with self._lock:
+            self._jobs[job.id] = job
+            self._trim()
+        print(f"[Import] Job {job.id} accodato ({mode}, area {workspace_id}).")
+        self._executor.submit(self._run, job, spooled, spool_dir)
+        return job
+
+    def get(self, job_id: str) -> Optional[ImportJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: ImportJob, payload: Dict[str, object], spool_dir: str) -> None:
+        job.start()
+        print(f"[Import] Job {job.id} avviato.")
+        try:
+            with self.workspaces.use(job.workspace) as workspace:
+                if job.mode == "delta":
+                    result = workspace.coordinator.import_delta(payload, job)
+                else:
+                    result = {"summary": workspace.coordinator.import_payload(payload, job)}
+        except ValueError as error:
+            print(f"[Import] Job {job.id} non riuscito: {error}")
+            job.finish(error=str(error))
+        except Exception as error:  # pragma: no cover - errore inatteso nel worker
+            print(f"[Import] Job {job.id} interrotto da un errore inatteso: {error}")
+            log_loop_event(f"Import in background {job.id} interrotto: {error!r}.")
+            job.finish(error=f"Errore inatteso durante l'import: {error}")
+        else:
+            print(f"[Import] Job {job.id} completato.")
+            job.finish(result=result)
+        finally:
+            _close_payload(payload)
+            shutil.rmtree(spool_dir, ignore_errors=True)
+
+    def _trim(self) -> None:
+        """Elimina i job conclusi più vecchi oltre il limite della cronologia."""
+
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[: max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+
+
+def _spool_payload(payload: Dict[str, object], directory: str) -> Dict[str, object]:
+    """Salva ogni upload in ``directory`` e lo riapre come ``FileStorage`` su disco."""
+
+    spooled: Dict[str, object] = {}
+    for key, value in payload.items():
+        if isinstance(value, list):
+            spooled[key] = [_spool_file(item, directory) for item in value if item]
+        elif value:
+            spooled[key] = _spool_file(value, directory)
+    return spooled
+
+
+def _spool_file(file_storage: FileStorage, directory: str) -> FileStorage:
+    handle, path = tempfile.mkstemp(suffix=".upload", dir=directory)
+    with os.fdopen(handle, "wb") as output:
+        shutil.copyfileobj(file_storage.stream, output)
+    return FileStorage(stream=open(path, "rb"), filename=file_storage.filename, name=file_storage.name)
+
+
+def _close_payload(payload: Dict[str, object]) -> None:
+    files: List[FileStorage] = []
+    for value in payload.values():
+        files.extend(value if isinstance(value, list) else [value])
+    for file_storage in files:
+        file_storage.stream.close()
+
+
+IMPORT_JOBS = ImportJobRegistry(WORKSPACES)
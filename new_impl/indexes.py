@@ -0,0 +1,191 @@
+"""Compact relationship indexes used by the relationship store."""
+
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Sequence
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class CSRIndex:
+    """One-to-many index stored as compressed sparse row arrays.
+
+    Every distinct key is mapped to a dense integer ``key_id``; the targets of
+    ``key_id`` are ``targets[offsets[key_id]:offsets[key_id + 1]]``. Targets are
+    row positions inside the entity list the index was built from, kept in the
+    order in which they were first seen.
+
+    Delta imports do not rebuild the arrays: :meth:`patched` returns a new index
+    sharing them, with the target list of the affected keys overridden in
+    ``patches``.
+    """
+
+    __slots__ = ("keys", "offsets", "targets", "patches")
+
+    def __init__(
+        self,
+        keys: Dict[str, int],
+        offsets: array,
+        targets: array,
+        patches: Optional[Dict[str, array]] = None,
+    ) -> None:
+        self.keys = keys
+        self.offsets = offsets
+        self.targets = targets
+        self.patches = patches or {}
+
+    @classmethod
+    def build(cls, pairs: Iterable[Tuple[str, int]]) -> "CSRIndex":
+        """Build the index from ``(key, target)`` pairs with a stable counting sort."""
+
+        keys: Dict[str, int] = {}
+        counts = array("I")
+        key_ids = array("I")
+        values = array("I")
+        for key, target in pairs:
+            key_id = keys.get(key)
+            if key_id is None:
+                key_id = keys[key] = len(counts)
+                counts.append(0)
+            counts[key_id] += 1
+            key_ids.append(key_id)
+            values.append(target)
+
+        offsets = array("I", [0]) * (len(counts) + 1)
+        running = 0
+        for key_id, count in enumerate(counts):
+            offsets[key_id] = running
+            running += count
+        offsets[len(counts)] = running
+
+        cursor = offsets[:-1]
+        targets = array("I", [0]) * len(values)
+        for key_id, target in zip(key_ids, values):
+            targets[cursor[key_id]] = target
+            cursor[key_id] += 1
+        return cls(keys, offsets, targets)
+
+    @classmethod
+    def empty(cls) -> "CSRIndex":
+        return cls({}, array("I", [0]), array("I"))
+
+    def patched(self, changes: Dict[str, array]) -> "CSRIndex":
+        """Return a copy of the index where ``changes`` replace the targets of their keys."""
+
+        return CSRIndex(self.keys, self.offsets, self.targets, {**self.patches, **changes})
+
+    def targets_for(self, key: str) -> memoryview:
+        """Return a zero-copy view over the targets of ``key`` (empty if unknown)."""
+
+        if self.patches:
+            patch = self.patches.get(key)
+            if patch is not None:
+                return memoryview(patch)
+        key_id = self.keys.get(key)
+        if key_id is None:
+            return memoryview(self.targets)[0:0]
+        return memoryview(self.targets)[self.offsets[key_id] : self.offsets[key_id + 1]]
+
+    def count(self, key: str) -> int:
+        return len(self.targets_for(key))
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.keys or key in self.patches
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.keys
+        for key in self.patches:
+            if key not in self.keys:
+                yield key
+
+    def __len__(self) -> int:
+        return len(self.keys) + sum(1 for key in self.patches if key not in self.keys)
+
+
+class SortedIndex:
+    """``(key, id)`` pairs kept sorted, for prefix search and keyset pagination.
+
+    A page is located with two binary searches: one for the prefix and one for
+    the ``(key, id)`` cursor of the previous page, so reading any page costs
+    ``O(log n + limit)`` whatever its depth. Delta imports use :meth:`patched`,
+    which copies the list and moves only the changed pairs.
+    """
+
+    __slots__ = ("entries",)
+
+    def __init__(self, entries: List[Tuple[str, str]]) -> None:
+        self.entries = entries
+
+    @classmethod
+    def build(cls, pairs: Iterable[Tuple[str, str]]) -> "SortedIndex":
+        return cls(sorted(pairs))
+
+    @classmethod
+    def empty(cls) -> "SortedIndex":
+        return cls([])
+
+    def patched(
+        self, drop: Iterable[Tuple[str, str]], add: Iterable[Tuple[str, str]]
+    ) -> "SortedIndex":
+        """Return a copy of the index without the ``drop`` pairs and with the ``add`` pairs."""
+
+        drop = list(drop)
+        add = list(add)
+        if (len(drop) + len(add)) * 16 > len(self.entries):
+            # Large change sets: one filtered sort is cheaper than many list shifts.
+            dropped = set(drop)
+            return SortedIndex.build([*(pair for pair in self.entries if pair not in dropped), *add])
+        entries = list(self.entries)
+        for pair in drop:
+            position = bisect_left(entries, pair)
+            if position < len(entries) and entries[position] == pair:
+                del entries[position]
+        for pair in add:
+            insort(entries, pair)
+        return SortedIndex(entries)
+
+    def page(
+        self, prefix: str = "", after: Optional[Tuple[str, str]] = None, limit: int = 50
+    ) -> List[Tuple[str, str]]:
+        """Return up to ``limit`` pairs whose key starts with ``prefix``, following ``after``."""
+
+        entries = self.entries
+        start = bisect_left(entries, (prefix,))
+        if after is not None:
+            start = max(start, bisect_right(entries, after))
+        page: List[Tuple[str, str]] = []
+        for pair in entries[start : start + limit]:
+            if not pair[0].startswith(prefix):
+                break
+            page.append(pair)
+        return page
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class PositionView(Sequence):
+    """Read-only sequence over ``rows[position]`` for the given positions, without copying rows."""
+
+    __slots__ = ("_rows", "_positions")
+
+    def __init__(self, rows: Sequence, positions: Sequence[int]) -> None:
+        self._rows = rows
+        self._positions = positions
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return PositionView(self._rows, self._positions[index])
+        return self._rows[self._positions[index]]
+
+    def __iter__(self) -> Iterator:
+        rows = self._rows
+        for position in self._positions:
+            yield rows[position]
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __repr__(self) -> str:
+        return repr(list(self))
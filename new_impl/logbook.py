@@ -1,44 +1,131 @@
-"""Simple logging helpers to capture loop decisions in a downloadable file."""
+"""Simple logging helpers to capture loop decisions in a downloadable file.
+
+Every workspace writes to its own log file. The scope is set per thread with
+:func:`log_scope`; events logged outside any scope go to the shared ``run.log``.
+"""
 
 from __future__ import annotations
 
 import logging
+import os
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterator, List, Optional
 
 BASE_DIR = Path(__file__).resolve().parent
-LOG_DIR = BASE_DIR / "logs"
+# ``SFBPCA_LOG_DIR`` is read once, before the shared log is opened below.
+LOG_DIR = Path(os.environ.get("SFBPCA_LOG_DIR") or BASE_DIR / "logs")
 LOG_FILE = LOG_DIR / "run.log"
 
 LOG_DIR.mkdir(parents=True, exist_ok=True)
 
-_logger = logging.getLogger("sfbpca.looplog")
-if not _logger.handlers:
-    handler = logging.FileHandler(LOG_FILE, encoding="utf-8")
-    formatter = logging.Formatter("%(asctime)sZ - %(message)s")
-    handler.setFormatter(formatter)
-    _logger.addHandler(handler)
-    _logger.setLevel(logging.INFO)
-    _logger.propagate = False
+_FORMATTER = logging.Formatter("%(asctime)sZ - %(message)s")
+_local = threading.local()
+_loggers: Dict[Optional[str], logging.Logger] = {}
+_loggers_lock = threading.Lock()
+
+
+def log_file(scope: Optional[str] = None) -> Path:
+    """Return the log file of ``scope`` (``None`` is the shared log)."""
+
+    return LOG_FILE if scope is None else LOG_DIR / f"run-{scope}.log"
+
+
+def _logger_for(scope: Optional[str]) -> logging.Logger:
+    with _loggers_lock:
+        logger = _loggers.get(scope)
+        if logger is None:
+            name = "sfbpca.looplog" if scope is None else f"sfbpca.looplog.{scope}"
+            logger = logging.getLogger(name)
+            if not logger.handlers:
+                handler = logging.FileHandler(log_file(scope), encoding="utf-8")
+                handler.setFormatter(_FORMATTER)
+                logger.addHandler(handler)
+                logger.setLevel(logging.INFO)
+                logger.propagate = False
+            _loggers[scope] = logger
+        return logger
+
+
+# Handlers inherited by a forked child, kept referenced so they are never flushed or closed there.
+_inherited_handlers: List[logging.Handler] = []
+
+
+def _reset_after_fork() -> None:
+    """Give a forked child its own lock and log files.
+
+    Another thread of the parent may hold ``_loggers_lock``, or the internal lock
+    of a log file's buffer, at the moment of the fork: the child would inherit it
+    held and block on its first event. The child therefore drops the inherited
+    handlers without touching them and reopens each file on its next event.
+    """
+
+    global _loggers_lock
+    _loggers_lock = threading.Lock()
+    for logger in _loggers.values():
+        _inherited_handlers.extend(logger.handlers)
+        logger.handlers = []
+    _loggers.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+@contextmanager
+def log_scope(scope: Optional[str]) -> Iterator[None]:
+    """Route the events logged by the current thread to the log of ``scope``."""
+
+    previous = getattr(_local, "scope", None)
+    _local.scope = scope
+    try:
+        yield
+    finally:
+        _local.scope = previous
+
+
+def current_scope() -> Optional[str]:
+    """Return the log scope of the current thread."""
+
+    return getattr(_local, "scope", None)
+
+
+def close_log_scope(scope: Optional[str]) -> None:
+    """Release the file handle of ``scope``; the file is reopened on the next event."""
+
+    if scope is None:
+        return
+    with _loggers_lock:
+        logger = _loggers.pop(scope, None)
+    if logger is not None:
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+
+
+_logger_for(None)
 
 
 def log_loop_event(message: str) -> None:
-    """Append an informational entry to the shared loop log."""
+    """Append an informational entry to the loop log of the current scope."""
 
-    _logger.info(message)
+    _logger_for(current_scope()).info(message)
 
 
-def read_log_lines() -> List[str]:
+def read_log_lines(scope: Optional[str] = None) -> List[str]:
     """Return the current log as a list of lines."""
 
-    if LOG_FILE.exists():
-        return LOG_FILE.read_text(encoding="utf-8").splitlines()
+    path = log_file(scope)
+    if path.exists():
+        return path.read_text(encoding="utf-8").splitlines()
     return []
 
 
-def read_log_bytes() -> bytes:
+def read_log_bytes(scope: Optional[str] = None) -> bytes:
     """Return the raw log content for download purposes."""
 
-    if LOG_FILE.exists():
-        return LOG_FILE.read_bytes()
+    path = log_file(scope)
+    if path.exists():
+        return path.read_bytes()
     return b""
@@ -0,0 +1,205 @@
+"""Normalised alert keys derived once per record when it is imported.
+
+The alert modules compare contacts, relations and contact points on normalised
+forms of a handful of columns (names, phone digits, lower-cased identifiers and
+role lists). :func:`attach_keys` computes them when the store ingests a record
+and keeps them on :attr:`Record.derived` as a small named tuple, so alert runs
+read them back instead of re-normalising every row for every module. Records
+that arrive without keys (for example rows decoded from SQLite) get them on
+first access through :func:`cached_keys`.
+"""
+
+from __future__ import annotations
+
+import sys
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, Mapping, NamedTuple, Optional, Tuple, TypeVar
+
+from .records import Record
+
+EMPTY_TOKEN = "tool-vuoto"
+REFERENTE_SOL_ROLE = "referente sol-app"
+
+
+def normalise_text(value: Optional[str]) -> str:
+    """Lower-case and strip ``value``; missing values become ``"tool-vuoto"``."""
+
+    return (value or "TOOL-VUOTO").strip().lower()
+
+
+def normalise_name(contact: Mapping[str, Optional[str]]) -> str:
+    """Return the contact's first and last name joined and lower-cased."""
+
+    parts = [contact.get("FirstName"), contact.get("LastName")]
+    return " ".join(part.strip() for part in parts if part and part.strip()).lower()
+
+
+def browse_key(value: Optional[str]) -> str:
+    """Sort and prefix-search key of the names listed by the browse API."""
+
+    return (value or "").strip().lower()
+
+
+def normalise_phone(value: Optional[str]) -> str:
+    """Reduce a phone number to its digits."""
+
+    return "".join(ch for ch in (value or "") if ch.isdigit())
+
+
+def split_roles(value: Optional[str]) -> Tuple[str, ...]:
+    """Split a ``;``-separated ``Roles`` value into its non-empty, stripped roles."""
+
+    return tuple(role.strip() for role in (value or "").split(";") if role.strip())
+
+
+def _shared(raw: Optional[str], normalised: str) -> str:
+    """Reuse the raw string when normalising did not change it."""
+
+    return raw if raw == normalised else normalised
+
+
+def _token(value: Optional[str]) -> str:
+    # Low-cardinality columns: every row with the same value shares one string.
+    return sys.intern(normalise_text(value))
+
+
+def _has_value(value: Optional[str]) -> bool:
+    return bool((value or "").strip())
+
+
+class ContactKeys(NamedTuple):
+    name: str
+    phone: str
+    mobile_phone: str
+    email: str
+    fiscal_code: str
+    vat_number: str
+    company: str
+    reachable: bool
+
+
+class RelationKeys(NamedTuple):
+    roles: Tuple[str, ...]
+    role_tokens: Tuple[str, ...]
+    role_set: Tuple[str, ...]
+    referente_sol: bool
+
+
+class PhoneKeys(NamedTuple):
+    number: str
+
+
+class EmailKeys(NamedTuple):
+    address: str
+    type: str
+    has_address: bool
+
+
+def contact_keys_for(contact: Mapping[str, Optional[str]]) -> ContactKeys:
+    phone = contact.get("Phone")
+    mobile_phone = contact.get("MobilePhone")
+    email = contact.get("Email")
+    fiscal_code = contact.get("FiscalCode__c")
+    vat_number = contact.get("VATNumber__c")
+    return ContactKeys(
+        name=normalise_name(contact),
+        phone=_shared(phone, normalise_phone(phone)),
+        mobile_phone=_shared(mobile_phone, normalise_phone(mobile_phone)),
+        email=_shared(email, normalise_text(email)),
+        fiscal_code=_shared(fiscal_code, normalise_text(fiscal_code)),
+        vat_number=_shared(vat_number, normalise_text(vat_number)),
+        company=_token(contact.get("Company__c")),
+        reachable=_has_value(phone) or _has_value(mobile_phone) or _has_value(email),
+    )
+
+
+# Identifiers indexed across accounts by the store, in the order the alerts report them.
+IDENTIFIER_KINDS = ("fiscal_code", "vat_number", "phone", "email")
+
+
+def contact_identifiers(keys: ContactKeys) -> Iterator[Tuple[str, str]]:
+    """Yield the ``(kind, value)`` pairs under which a contact is indexed across accounts."""
+
+    if keys.fiscal_code and keys.fiscal_code != EMPTY_TOKEN:
+        yield "fiscal_code", keys.fiscal_code
+    if keys.vat_number and keys.vat_number != EMPTY_TOKEN:
+        yield "vat_number", keys.vat_number
+    if keys.phone:
+        yield "phone", keys.phone
+    if keys.mobile_phone and keys.mobile_phone != keys.phone:
+        yield "phone", keys.mobile_phone
+    if keys.email and keys.email != EMPTY_TOKEN:
+        yield "email", keys.email
+
+
+# Distinct ``Roles`` values whose keys are shared; rarer combinations are recomputed.
+ROLE_KEYS_CACHE_SIZE = 4096
+
+
+def relation_keys_for(relation: Mapping[str, Optional[str]]) -> RelationKeys:
+    return _role_keys(relation.get("Roles") or "")
+
+
+@lru_cache(maxsize=ROLE_KEYS_CACHE_SIZE)
+def _role_keys(raw: str) -> RelationKeys:
+    # Relations repeat a small set of role combinations: share one tuple per distinct value.
+    roles = tuple(sys.intern(role) for role in split_roles(raw))
+    tokens = tuple(sys.intern(normalise_text(role)) for role in roles)
+    return RelationKeys(
+        roles=roles,
+        role_tokens=tokens,
+        role_set=tuple(sorted(sys.intern(role.lower()) for role in roles)),
+        referente_sol=REFERENTE_SOL_ROLE in tokens,
+    )
+
+
+def phone_keys_for(point: Mapping[str, Optional[str]]) -> PhoneKeys:
+    number = point.get("TelephoneNumber")
+    return PhoneKeys(number=_shared(number, normalise_phone(number)))
+
+
+def email_keys_for(point: Mapping[str, Optional[str]]) -> EmailKeys:
+    address = point.get("EmailAddress")
+    return EmailKeys(
+        address=_shared(address, normalise_text(address)),
+        type=_token(point.get("Type__c")),
+        has_address=_has_value(address),
+    )
+
+
+_BUILDERS: Dict[str, Callable[[Mapping[str, Optional[str]]], tuple]] = {
+    "contacts": contact_keys_for,
+    "account_contact_relations": relation_keys_for,
+    "contact_point_phones": phone_keys_for,
+    "contact_point_emails": email_keys_for,
+}
+
+_Keys = TypeVar("_Keys", bound=tuple)
+
+
+def attach_keys(entity: str, record: Record) -> Record:
+    """Store the alert keys of ``entity`` on ``record`` (a no-op for entities without keys)."""
+
+    builder = _BUILDERS.get(entity)
+    if builder is not None:
+        record.derived = builder(record)
+    return record
+
+
+def cached_keys(
+    record: Mapping[str, Optional[str]],
+    kind: type,
+    builder: Callable[[Mapping[str, Optional[str]]], _Keys],
+) -> _Keys:
+    """Return the ``kind`` keys held by ``record``, deriving and caching them if missing."""
+
+    derived = getattr(record, "derived", None)
+    if type(derived) is kind:
+        return derived
+    derived = builder(record)
+    try:
+        record.derived = derived
+    except AttributeError:
+        # Plain dictionaries cannot hold the keys: they are derived on every call.
+        pass
+    return derived
@@ -0,0 +1,120 @@
+"""Compact record types used by the relationship store."""
+
+from __future__ import annotations
+
+import sys
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+# Columns whose values repeat across many rows (foreign keys, picklists) and are
+# therefore shared through ``sys.intern`` instead of being stored once per row.
+INTERNED_COLUMNS = frozenset(
+    {
+        "AccountId",
+        "ParentId",
+        "IndividualId",
+        "Roles",
+        "Company__c",
+        "Type__c",
+    }
+)
+
+
+class RecordSchema:
+    """Column layout shared by every record parsed from the same file."""
+
+    __slots__ = ("fields", "positions", "_interned")
+
+    def __init__(self, fields: Sequence[str]) -> None:
+        self.fields: Tuple[str, ...] = tuple(fields)
+        self.positions: Dict[str, int] = {name: index for index, name in enumerate(self.fields)}
+        self._interned = tuple(
+            index for index, name in enumerate(self.fields) if name in INTERNED_COLUMNS
+        )
+
+    def build(self, values: list) -> "Record":
+        """Create a record from a list of values ordered like ``fields``."""
+
+        for index in self._interned:
+            value = values[index]
+            if value:
+                values[index] = sys.intern(value)
+        return Record(self, tuple(values))
+
+    def __reduce__(self):
+        return (schema_for, (self.fields,))
+
+
+_SCHEMA_CACHE: Dict[Tuple[str, ...], RecordSchema] = {}
+
+
+def schema_for(fields: Iterable[str]) -> RecordSchema:
+    """Return a cached schema for the given column names."""
+
+    key = tuple(fields)
+    schema = _SCHEMA_CACHE.get(key)
+    if schema is None:
+        schema = _SCHEMA_CACHE[key] = RecordSchema(key)
+    return schema
+
+
+class Record(Mapping):
+    """Read-only, tuple-backed row that behaves like a ``Dict[str, str]``.
+
+    ``derived`` holds the normalised alert keys computed when the store ingests
+    the row (see :mod:`new_impl.normalization`); it is not part of the mapping.
+    """
+
+    __slots__ = ("_schema", "_values", "derived")
+
+    def __init__(
+        self,
+        schema: RecordSchema,
+        values: Tuple[Optional[str], ...],
+        derived: Optional[tuple] = None,
+    ) -> None:
+        self._schema = schema
+        self._values = values
+        self.derived = derived
+
+    @classmethod
+    def from_mapping(cls, mapping: Mapping) -> "Record":
+        if isinstance(mapping, Record):
+            return mapping
+        return schema_for(mapping.keys()).build(list(mapping.values()))
+
+    def __getitem__(self, key: str) -> Optional[str]:
+        return self._values[self._schema.positions[key]]
+
+    def get(self, key: str, default=None):
+        position = self._schema.positions.get(key)
+        if position is None:
+            return default
+        return self._values[position]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._schema.positions
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._schema.fields)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __repr__(self) -> str:
+        return repr(dict(zip(self._schema.fields, self._values)))
+
+    def content_hash(self) -> int:
+        """Hash of the column names and values, used to notice rows that changed between runs."""
+
+        return hash((self._schema.fields, self._values))
+
+    def __sizeof__(self) -> int:
+        # The values tuple belongs to the record; the schema is shared by the whole file.
+        return object.__sizeof__(self) + sys.getsizeof(self._values)
+
+    def __getstate__(self):
+        return (self._schema, self._values, self.derived)
+
+    def __setstate__(self, state) -> None:
+        self._schema, self._values, self.derived = state
@@ -0,0 +1,100 @@
+"""Binary snapshot files used to warm-start the in-memory store."""
+
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+BASE_DIR = Path(__file__).resolve().parent
+DEFAULT_SNAPSHOT_FILE = BASE_DIR / "snapshots" / "store.snapshot"
+
+SNAPSHOT_MAGIC = b"SFBPCASN"
+# Increment whenever the pickled layout of the store snapshot changes, so that
+# files written by an older version are rejected instead of half-loaded.
+SNAPSHOT_VERSION = 5
+
+# magic, schema version, payload length, SHA-256 of the payload
+_HEADER = struct.Struct("<8sIQ32s")
+
+
+class SnapshotError(ValueError):
+    """Raised when a snapshot file is missing, stale or corrupt."""
+
+
+def configured_snapshot_path() -> Optional[Path]:
+    """Return the snapshot path from ``SFBPCA_SNAPSHOT_PATH`` (empty disables it)."""
+
+    value = os.environ.get("SFBPCA_SNAPSHOT_PATH")
+    if value is None:
+        return DEFAULT_SNAPSHOT_FILE
+    return Path(value) if value.strip() else None
+
+
+def write_snapshot(payload: object, path: Path) -> int:
+    """Serialise ``payload`` to ``path`` atomically and return the file size."""
+
+    data = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+    header = _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(data), hashlib.sha256(data).digest())
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handle, temp_name = tempfile.mkstemp(prefix=path.name, suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(handle, "wb") as output:
+            output.write(header)
+            output.write(data)
+            output.flush()
+            os.fsync(output.fileno())
+        os.replace(temp_name, path)
+    except BaseException:
+        try:
+            os.remove(temp_name)
+        except OSError:
+            pass
+        raise
+    return _HEADER.size + len(data)
+
+
+def read_snapshot(path: Path) -> object:
+    """Load a snapshot written by :func:`write_snapshot`.
+
+    The file is memory-mapped so the checksum and the unpickler work directly on
+    the page cache instead of an intermediate copy of the whole file.
+    """
+
+    try:
+        handle = open(path, "rb")
+    except FileNotFoundError as error:
+        raise SnapshotError(f"Snapshot {path} non trovato.") from error
+
+    with handle:
+        size = os.fstat(handle.fileno()).st_size
+        if size < _HEADER.size:
+            raise SnapshotError(f"Snapshot {path} troncato o vuoto.")
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            magic, version, length, digest = _HEADER.unpack_from(mapped, 0)
+            if magic != SNAPSHOT_MAGIC:
+                raise SnapshotError(f"Il file {path} non è uno snapshot dell'archivio.")
+            if version != SNAPSHOT_VERSION:
+                raise SnapshotError(
+                    f"Snapshot {path} con versione {version}, attesa {SNAPSHOT_VERSION}."
+                )
+            if _HEADER.size + length != size:
+                raise SnapshotError(f"Snapshot {path} con lunghezza inattesa.")
+
+            with memoryview(mapped) as view:
+                data = view[_HEADER.size :]
+                try:
+                    if hashlib.sha256(data).digest() != digest:
+                        raise SnapshotError(f"Checksum dello snapshot {path} non valido.")
+                    try:
+                        return pickle.loads(data)
+                    except Exception as error:  # pragma: no cover - file manomesso
+                        raise SnapshotError(f"Snapshot {path} non leggibile: {error}") from error
+                finally:
+                    data.release()
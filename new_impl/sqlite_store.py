@@ -0,0 +1,941 @@
+"""SQLite-backed relationship store for datasets larger than the worker memory."""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from itertools import groupby
+from operator import itemgetter
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from .data_store import (
+    AccountContext,
+    BrowsePage,
+    ContactRow,
+    ContactView,
+    build_account_context,
+    enrich_contacts,
+    format_contact_name,
+    is_deleted,
+    strip_delete_flag,
+)
+from .logbook import log_loop_event
+from .normalization import browse_key, contact_identifiers, contact_keys_for, normalise_name
+from .records import Record
+
+BASE_DIR = Path(__file__).resolve().parent
+DEFAULT_DATABASE_FILE = BASE_DIR / "snapshots" / "store.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    id TEXT PRIMARY KEY,
+    name_key TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS contacts (
+    id TEXT PRIMARY KEY,
+    account_id TEXT,
+    individual_id TEXT,
+    name_key TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS individuals (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS account_contact_relations (
+    position INTEGER PRIMARY KEY,
+    record_id TEXT,
+    account_id TEXT,
+    contact_id TEXT,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS contact_point_phones (
+    position INTEGER PRIMARY KEY,
+    record_id TEXT,
+    parent_id TEXT,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS contact_point_emails (
+    position INTEGER PRIMARY KEY,
+    record_id TEXT,
+    parent_id TEXT,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS contact_identifiers (
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL,
+    contact_id TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS store_version (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO store_version (id, version) VALUES (0, 0);
+"""
+
+# Created after ``_migrate`` so that databases written before delta imports get
+# their ``record_id`` column first.
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_contacts_account ON contacts (account_id);
+CREATE INDEX IF NOT EXISTS idx_contacts_individual ON contacts (individual_id);
+CREATE INDEX IF NOT EXISTS idx_relations_account ON account_contact_relations (account_id);
+CREATE INDEX IF NOT EXISTS idx_relations_contact ON account_contact_relations (contact_id);
+CREATE INDEX IF NOT EXISTS idx_phones_parent ON contact_point_phones (parent_id);
+CREATE INDEX IF NOT EXISTS idx_emails_parent ON contact_point_emails (parent_id);
+CREATE INDEX IF NOT EXISTS idx_relations_record ON account_contact_relations (record_id);
+CREATE INDEX IF NOT EXISTS idx_phones_record ON contact_point_phones (record_id);
+CREATE INDEX IF NOT EXISTS idx_emails_record ON contact_point_emails (record_id);
+CREATE INDEX IF NOT EXISTS idx_identifiers_value ON contact_identifiers (kind, value);
+CREATE INDEX IF NOT EXISTS idx_identifiers_contact ON contact_identifiers (contact_id);
+CREATE INDEX IF NOT EXISTS idx_accounts_name ON accounts (name_key, id);
+CREATE INDEX IF NOT EXISTS idx_contacts_name ON contacts (name_key, id);
+"""
+
+# Tables that keep every row in file order; delta imports find their rows by ``record_id``.
+_LIST_TABLES = ("account_contact_relations", "contact_point_phones", "contact_point_emails")
+
+# Dict-style entities keep the first position of an Id and the last record seen,
+# exactly like the in-memory store's ``{record["Id"]: record}`` maps.
+_INSERT_SQL = {
+    "accounts": (
+        "INSERT INTO accounts (id, name_key, data) VALUES (?, ?, ?) "
+        "ON CONFLICT(id) DO UPDATE SET name_key = excluded.name_key, data = excluded.data"
+    ),
+    "contacts": (
+        "INSERT INTO contacts (id, account_id, individual_id, name_key, data) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(id) DO UPDATE SET account_id = excluded.account_id, "
+        "individual_id = excluded.individual_id, name_key = excluded.name_key, data = excluded.data"
+    ),
+    "individuals": (
+        "INSERT INTO individuals (id, data) VALUES (?, ?) "
+        "ON CONFLICT(id) DO UPDATE SET data = excluded.data"
+    ),
+    "account_contact_relations": (
+        "INSERT INTO account_contact_relations (record_id, account_id, contact_id, data) "
+        "VALUES (?, ?, ?, ?)"
+    ),
+    "contact_point_phones": (
+        "INSERT INTO contact_point_phones (record_id, parent_id, data) VALUES (?, ?, ?)"
+    ),
+    "contact_point_emails": (
+        "INSERT INTO contact_point_emails (record_id, parent_id, data) VALUES (?, ?, ?)"
+    ),
+}
+
+# Delta imports rewrite list rows in place, keeping their position; the trailing
+# parameter is the ``record_id`` being replaced.
+_UPDATE_SQL = {
+    "account_contact_relations": (
+        "UPDATE account_contact_relations SET record_id = ?, account_id = ?, contact_id = ?, "
+        "data = ? WHERE record_id = ?"
+    ),
+    "contact_point_phones": (
+        "UPDATE contact_point_phones SET record_id = ?, parent_id = ?, data = ? WHERE record_id = ?"
+    ),
+    "contact_point_emails": (
+        "UPDATE contact_point_emails SET record_id = ?, parent_id = ?, data = ? WHERE record_id = ?"
+    ),
+}
+
+# Id column and relationship columns read back before a delta changes a row.
+_DELTA_COLUMNS = {
+    "accounts": ("id", ()),
+    "contacts": ("id", ("account_id", "individual_id")),
+    "individuals": ("id", ()),
+    "account_contact_relations": ("record_id", ("account_id",)),
+    "contact_point_phones": ("record_id", ("parent_id",)),
+    "contact_point_emails": ("record_id", ("parent_id",)),
+}
+
+# SQLite's default limit on host parameters is 999.
+_CHUNK_SIZE = 500
+
+_ACCOUNT_CONTACT_IDS = "SELECT contact_id FROM account_contact_relations WHERE account_id = ?"
+
+# Relations joined with the contact of the same account, like ``enrich_contacts``.
+_CONTACT_ROWS = (
+    "SELECT r.account_id, r.data, c.individual_id, c.data "
+    "FROM account_contact_relations r JOIN contacts c ON c.id = r.contact_id "
+    "WHERE r.account_id IS NOT NULL AND c.account_id = r.account_id ORDER BY r.position"
+)
+
+# Raw rows hashed by ``account_fingerprint``, in a stable order.
+_ACCOUNT_INDIVIDUAL_IDS = (
+    "SELECT individual_id FROM contacts "
+    f"WHERE individual_id IS NOT NULL AND id IN ({_ACCOUNT_CONTACT_IDS})"
+)
+_FINGERPRINT_QUERIES = (
+    "SELECT data FROM accounts WHERE id = ?",
+    "SELECT data FROM account_contact_relations WHERE account_id = ? ORDER BY position",
+    f"SELECT data FROM contacts WHERE id IN ({_ACCOUNT_CONTACT_IDS}) ORDER BY id",
+    f"SELECT data FROM individuals WHERE id IN ({_ACCOUNT_INDIVIDUAL_IDS}) ORDER BY id",
+    f"SELECT data FROM contact_point_phones WHERE parent_id IN ({_ACCOUNT_INDIVIDUAL_IDS}) ORDER BY position",
+    f"SELECT data FROM contact_point_emails WHERE parent_id IN ({_ACCOUNT_INDIVIDUAL_IDS}) ORDER BY position",
+)
+
+_INSERT_IDENTIFIER_SQL = "INSERT INTO contact_identifiers (kind, value, contact_id) VALUES (?, ?, ?)"
+
+# Bumped through ``PRAGMA user_version`` by ``_migrate``; 1 = contact identifiers are indexed,
+# 2 = accounts and contacts carry the ``name_key`` used by the browse queries.
+_SCHEMA_VERSION = 2
+
+# Upper bound of a prefix range: ``key >= prefix AND key < prefix + _PREFIX_END``.
+_PREFIX_END = "\U0010ffff"
+
+_PAGE_ACCOUNTS = (
+    "SELECT name_key, id, data FROM accounts "
+    "WHERE name_key >= ? AND name_key < ? AND (name_key, id) > (?, ?) "
+    "ORDER BY name_key, id LIMIT ?"
+)
+
+_PAGE_CONTACTS = (
+    "SELECT name_key, id, data FROM contacts "
+    "WHERE name_key >= ? AND name_key < ? AND (name_key, id) > (?, ?) "
+    "ORDER BY name_key, id LIMIT ?"
+)
+
+_PAGE_ACCOUNT_CONTACTS = (
+    "SELECT name_key, token, contact, relation FROM ("
+    "SELECT c.name_key AS name_key, COALESCE(r.record_id, c.id) AS token, "
+    "c.data AS contact, r.data AS relation "
+    "FROM account_contact_relations r JOIN contacts c ON c.id = r.contact_id "
+    "WHERE r.account_id = ? AND c.name_key >= ? AND c.name_key < ?"
+    ") WHERE (name_key, token) > (?, ?) ORDER BY name_key, token LIMIT ?"
+)
+
+_PAGE_CONTACT_POINTS = (
+    "SELECT kind, token, data FROM ("
+    "SELECT 'emails' AS kind, COALESCE(record_id, '#' || position) AS token, data "
+    "FROM contact_point_emails WHERE parent_id = ? "
+    "UNION ALL "
+    "SELECT 'phones', COALESCE(record_id, '#' || position), data "
+    "FROM contact_point_phones WHERE parent_id = ?"
+    ") WHERE (kind, token) > (?, ?) ORDER BY kind, token LIMIT ?"
+)
+
+
+def _encode(record: Dict[str, str]) -> str:
+    return json.dumps(dict(record), ensure_ascii=False, separators=(",", ":"))
+
+
+def _decode(data: str) -> Record:
+    return Record.from_mapping(json.loads(data))
+
+
+def _identifier_rows(
+    contacts: Iterable[Tuple[str, Mapping[str, Optional[str]]]],
+) -> Iterator[Tuple[str, str, str]]:
+    for contact_id, contact in contacts:
+        for kind, value in contact_identifiers(contact_keys_for(contact)):
+            yield kind, value, contact_id
+
+
+def _chunks(values: Sequence[str]) -> Iterator[Sequence[str]]:
+    for start in range(0, len(values), _CHUNK_SIZE):
+        yield values[start : start + _CHUNK_SIZE]
+
+
+class SQLiteRelationshipStore:
+    """Relationship store that keeps every entity in a local SQLite file.
+
+    It exposes the same lookup interface as :class:`SalesforceRelationshipStore`.
+    Each thread gets its own connection; the database runs in WAL mode so alert
+    runs keep reading the last committed import while a new one is loading.
+    :meth:`pinned` holds one read transaction for a whole alert run, so every
+    query of the run sees the same committed version.
+    ``describe_account`` fetches the whole account neighbourhood with a handful
+    of batched queries and keeps it as the current thread's working set, so the
+    per-contact lookups made by the alert modules do not hit the database again.
+    """
+
+    ENTITY_KEYS = (
+        "accounts",
+        "contacts",
+        "individuals",
+        "account_contact_relations",
+        "contact_point_phones",
+        "contact_point_emails",
+    )
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        # Connections opened by every thread, so that :meth:`close` can release them all.
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        # Incremented by every import so that cached working sets of other threads expire.
+        self._generation = 0
+        connection = self._connection()
+        connection.executescript(_SCHEMA)
+        self._migrate(connection)
+        connection.executescript(_INDEXES)
+
+    # ------------------------------------------------------------------
+    # Connection helpers
+    # ------------------------------------------------------------------
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    def close(self) -> None:
+        """Close the connections of every thread; the next query opens a new one."""
+
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        self._local = threading.local()
+        for connection in connections:
+            connection.close()
+
+    @classmethod
+    def _migrate(cls, connection: sqlite3.Connection) -> None:
+        """Bring databases written by earlier versions up to the current schema.
+
+        List tables get the ``record_id`` column used by delta imports, and the
+        contact identifier index is filled from the stored contacts.
+        """
+
+        for table in _LIST_TABLES:
+            columns = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+            if "record_id" not in columns:
+                connection.execute(f"ALTER TABLE {table} ADD COLUMN record_id TEXT")
+                connection.execute(f"UPDATE {table} SET record_id = json_extract(data, '$.Id')")
+
+        for table in ("accounts", "contacts"):
+            columns = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+            if "name_key" not in columns:
+                connection.execute(f"ALTER TABLE {table} ADD COLUMN name_key TEXT NOT NULL DEFAULT ''")
+
+        (version,) = connection.execute("PRAGMA user_version").fetchone()
+        if version < _SCHEMA_VERSION:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                if version < 1:
+                    connection.execute("DELETE FROM contact_identifiers")
+                    cls._index_identifiers(connection)
+                if version < 2:
+                    cls._index_names(connection)
+                connection.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+    @staticmethod
+    def _index_identifiers(connection: sqlite3.Connection) -> None:
+        """Index the normalised identifiers of every stored contact."""
+
+        rows = connection.execute("SELECT id, data FROM contacts ORDER BY rowid")
+        connection.executemany(
+            _INSERT_IDENTIFIER_SQL,
+            _identifier_rows((contact_id, _decode(data)) for contact_id, data in rows),
+        )
+
+    @staticmethod
+    def _index_names(connection: sqlite3.Connection) -> None:
+        """Fill the ``name_key`` column of every stored account and contact."""
+
+        connection.create_function("browse_key", 1, browse_key, deterministic=True)
+        connection.create_function(
+            "contact_name_key",
+            2,
+            lambda first, last: normalise_name({"FirstName": first, "LastName": last}),
+            deterministic=True,
+        )
+        connection.execute("UPDATE accounts SET name_key = browse_key(json_extract(data, '$.Name'))")
+        connection.execute(
+            "UPDATE contacts SET name_key = "
+            "contact_name_key(json_extract(data, '$.FirstName'), json_extract(data, '$.LastName'))"
+        )
+
+    @contextmanager
+    def _transaction(self, mode: str = "DEFERRED") -> Iterator[sqlite3.Connection]:
+        connection = self._connection()
+        if connection.in_transaction:
+            # Reads made inside ``pinned()`` join the run's read transaction.
+            if mode != "DEFERRED":
+                raise RuntimeError("Cannot write to the store from a pinned read.")
+            yield connection
+            return
+        connection.execute(f"BEGIN {mode}")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    @staticmethod
+    def _bump_version(connection: sqlite3.Connection) -> None:
+        connection.execute("UPDATE store_version SET version = version + 1")
+
+    # ------------------------------------------------------------------
+    # Versions
+    # ------------------------------------------------------------------
+    @property
+    def version(self) -> int:
+        """Committed version seen by the current thread (the pinned one inside ``pinned``)."""
+
+        with self._transaction() as connection:
+            return connection.execute("SELECT version FROM store_version").fetchone()[0]
+
+    @contextmanager
+    def pinned(self) -> Iterator[int]:
+        """Keep one read transaction open so the thread's reads see a single version.
+
+        Yields the pinned version. Imports running on other connections commit
+        normally; nested blocks keep the outer pin.
+        """
+
+        connection = self._connection()
+        if connection.in_transaction:
+            yield self.version
+            return
+        connection.execute("BEGIN")
+        try:
+            # A deferred transaction takes its snapshot at the first read.
+            yield self.version
+        finally:
+            connection.execute("ROLLBACK")
+
+    def after_fork(self) -> None:
+        """Drop the connections inherited from the parent process; the child opens its own."""
+
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Data ingestion helpers
+    # ------------------------------------------------------------------
+    def reset(self) -> None:
+        with self._transaction("IMMEDIATE") as connection:
+            for entity in self.ENTITY_KEYS:
+                connection.execute(f"DELETE FROM {entity}")
+            connection.execute("DELETE FROM contact_identifiers")
+            self._bump_version(connection)
+        self._generation += 1
+
+    def replace_entity(self, entity: str, records: Iterable[Dict[str, str]]) -> None:
+        self.bulk_replace({entity: records})
+
+    def bulk_replace(
+        self,
+        payload: Dict[str, Iterable[Dict[str, str]]],
+        on_indexing: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """Replace the given entities with ``executemany`` inside one transaction.
+
+        Table indexes are maintained while the rows are inserted; ``on_indexing``
+        is called once every row has been read, before the contact identifiers
+        are indexed and the transaction commits.
+        """
+
+        unknown = [entity for entity in payload if entity not in self.ENTITY_KEYS]
+        if unknown:
+            raise ValueError(
+                f"Unsupported entity '{unknown[0]}'. Expected one of {', '.join(self.ENTITY_KEYS)}"
+            )
+
+        with self._transaction("IMMEDIATE") as connection:
+            for entity in self.ENTITY_KEYS:
+                records = payload.get(entity)
+                if records is None:
+                    continue
+                connection.execute(f"DELETE FROM {entity}")
+                connection.executemany(_INSERT_SQL[entity], self._rows_for(entity, records))
+            if on_indexing is not None:
+                on_indexing()
+            if "contacts" in payload:
+                # Records may be a one-shot stream: the identifiers are read back from the table.
+                connection.execute("DELETE FROM contact_identifiers")
+                self._index_identifiers(connection)
+            self._bump_version(connection)
+        self._generation += 1
+
+    def apply_delta(
+        self,
+        upserts: Dict[str, Iterable[Dict[str, str]]],
+        deleted_ids: Iterable[str] = (),
+    ) -> Dict[str, object]:
+        """Upsert records by ``Id`` and delete ``deleted_ids`` inside one transaction.
+
+        Same contract as :meth:`SalesforceRelationshipStore.apply_delta`: list
+        rows keep their position when replaced, new ones are appended.
+        """
+
+        unknown = [entity for entity in upserts if entity not in self.ENTITY_KEYS]
+        if unknown:
+            raise ValueError(
+                f"Unsupported entity '{unknown[0]}'. Expected one of {', '.join(self.ENTITY_KEYS)}"
+            )
+
+        deleted = set(deleted_ids)
+        changes: Dict[str, Dict[str, Record]] = {}
+        for entity in self.ENTITY_KEYS:
+            records = upserts.get(entity)
+            if records is None:
+                continue
+            rows = changes[entity] = {}
+            for record in records:
+                record = Record.from_mapping(record)
+                record_id = record.get("Id")
+                if not record_id:
+                    continue
+                if is_deleted(record):
+                    deleted.add(record_id)
+                else:
+                    rows[record_id] = strip_delete_flag(record)
+        for rows in changes.values():
+            for record_id in deleted.intersection(rows):
+                del rows[record_id]
+
+        upserted: Dict[str, int] = {}
+        removed: Dict[str, int] = {}
+        touched: Dict[str, set] = {"accounts": set(), "contacts": set(), "individuals": set()}
+        with self._transaction("IMMEDIATE") as connection:
+            for entity in self.ENTITY_KEYS:
+                rows = changes.get(entity, {})
+                wanted = list(deleted.union(rows))
+                if not wanted:
+                    continue
+                id_column, key_columns = _DELTA_COLUMNS[entity]
+                selected = ", ".join((id_column, *key_columns))
+                existing: Dict[str, Tuple] = {}
+                for chunk in _chunks(wanted):
+                    marks = ", ".join("?" * len(chunk))
+                    for row in connection.execute(
+                        f"SELECT {selected} FROM {entity} WHERE {id_column} IN ({marks})", chunk
+                    ):
+                        existing[row[0]] = row
+                gone = [record_id for record_id in existing if record_id in deleted]
+                if not rows and not gone:
+                    continue
+
+                for chunk in _chunks(gone):
+                    marks = ", ".join("?" * len(chunk))
+                    connection.execute(f"DELETE FROM {entity} WHERE {id_column} IN ({marks})", chunk)
+                for record_id, row in existing.items():
+                    if record_id in deleted or record_id in rows:
+                        _note_delta(touched, entity, dict(zip((id_column, *key_columns), row)))
+
+                if entity in _LIST_TABLES:
+                    new_rows = []
+                    for values in self._rows_for(entity, rows.values()):
+                        if values[0] in existing:
+                            connection.execute(_UPDATE_SQL[entity], (*values, values[0]))
+                        else:
+                            new_rows.append(values)
+                    connection.executemany(_INSERT_SQL[entity], new_rows)
+                else:
+                    connection.executemany(_INSERT_SQL[entity], self._rows_for(entity, rows.values()))
+                if entity == "contacts":
+                    for chunk in _chunks(wanted):
+                        marks = ", ".join("?" * len(chunk))
+                        connection.execute(
+                            f"DELETE FROM contact_identifiers WHERE contact_id IN ({marks})", chunk
+                        )
+                    connection.executemany(_INSERT_IDENTIFIER_SQL, _identifier_rows(rows.items()))
+                for record_id, record in rows.items():
+                    _note_delta(
+                        touched,
+                        entity,
+                        {
+                            id_column: record_id,
+                            "account_id": record.get("AccountId"),
+                            "individual_id": record.get("IndividualId"),
+                            "parent_id": record.get("ParentId"),
+                        },
+                    )
+                upserted[entity] = len(rows)
+                removed[entity] = len(gone)
+
+            accounts = touched["accounts"]
+            contacts = touched["contacts"]
+            individuals = sorted(filter(None, touched["individuals"]))
+            for chunk in _chunks(individuals):
+                marks = ", ".join("?" * len(chunk))
+                contacts.update(
+                    contact_id
+                    for (contact_id,) in connection.execute(
+                        f"SELECT id FROM contacts WHERE individual_id IN ({marks})", chunk
+                    )
+                )
+            for chunk in _chunks(sorted(filter(None, contacts))):
+                marks = ", ".join("?" * len(chunk))
+                accounts.update(
+                    account_id
+                    for (account_id,) in connection.execute(
+                        f"SELECT account_id FROM account_contact_relations WHERE contact_id IN ({marks})",
+                        chunk,
+                    )
+                )
+            self._bump_version(connection)
+        self._generation += 1
+
+        accounts.discard(None)
+        accounts.discard("")
+        return {"upserted": upserted, "deleted": removed, "touched_accounts": sorted(accounts)}
+
+    @staticmethod
+    def _rows_for(entity: str, records: Iterable[Dict[str, str]]) -> Iterator[Tuple]:
+        for record in records:
+            if entity == "accounts":
+                if record.get("Id"):
+                    yield record["Id"], browse_key(record.get("Name")), _encode(record)
+            elif entity == "individuals":
+                if record.get("Id"):
+                    yield record["Id"], _encode(record)
+            elif entity == "contacts":
+                contact_id = record.get("Id")
+                if not contact_id:
+                    continue
+                individual_id = record.get("IndividualId") or None
+                if not individual_id:
+                    log_loop_event(
+                        f"Contatto {contact_id} senza IndividualId associato, salto associazione."
+                    )
+                yield (
+                    contact_id,
+                    record.get("AccountId"),
+                    individual_id,
+                    normalise_name(record),
+                    _encode(record),
+                )
+            elif entity == "account_contact_relations":
+                account_id = record.get("AccountId")
+                contact_id = record.get("ContactId")
+                if not (account_id and contact_id):
+                    log_loop_event(
+                        "Relazione AccountContact scartata per ID mancanti "
+                        f"(AccountId={account_id!r}, ContactId={contact_id!r})."
+                    )
+                    account_id = contact_id = None
+                yield record.get("Id"), account_id, contact_id, _encode(record)
+            else:
+                parent_id = record.get("ParentId") or None
+                if not parent_id:
+                    label = "ContactPointPhone" if entity == "contact_point_phones" else "ContactPointEmail"
+                    log_loop_event(f"{label} scartato per ParentId mancante: {record}")
+                yield record.get("Id"), parent_id, _encode(record)
+
+    # ------------------------------------------------------------------
+    # Batched reads
+    # ------------------------------------------------------------------
+    def _fetch_points(
+        self, connection: sqlite3.Connection, table: str, where: str, params: Sequence[str]
+    ) -> Dict[str, Tuple[Record, ...]]:
+        points: Dict[str, List[Record]] = {}
+        rows = connection.execute(
+            f"SELECT parent_id, data FROM {table} WHERE parent_id IN ({where}) ORDER BY position",
+            params,
+        )
+        for parent_id, data in rows:
+            points.setdefault(parent_id, []).append(_decode(data))
+        return {parent_id: tuple(records) for parent_id, records in points.items()}
+
+    def _load_working_set(self, account_id: str) -> "_AccountWorkingSet":
+        generation = self._generation
+        with self._transaction() as connection:
+            row = connection.execute("SELECT data FROM accounts WHERE id = ?", (account_id,)).fetchone()
+            relations = tuple(
+                _decode(data)
+                for (data,) in connection.execute(
+                    "SELECT data FROM account_contact_relations WHERE account_id = ? ORDER BY position",
+                    (account_id,),
+                )
+            )
+            contacts = {
+                contact_id: _decode(data)
+                for contact_id, data in connection.execute(
+                    f"SELECT id, data FROM contacts WHERE id IN ({_ACCOUNT_CONTACT_IDS})",
+                    (account_id,),
+                )
+            }
+            individuals = (
+                "SELECT individual_id FROM contacts "
+                f"WHERE individual_id IS NOT NULL AND id IN ({_ACCOUNT_CONTACT_IDS})"
+            )
+            phones = self._fetch_points(connection, "contact_point_phones", individuals, (account_id,))
+            emails = self._fetch_points(connection, "contact_point_emails", individuals, (account_id,))
+
+        working_set = _AccountWorkingSet(
+            generation=generation,
+            account_id=account_id,
+            account=_decode(row[0]) if row else None,
+            relations=relations,
+            contacts=contacts,
+            phones=phones,
+            emails=emails,
+        )
+        self._local.working_set = working_set
+        return working_set
+
+    def _working_set(self) -> Optional["_AccountWorkingSet"]:
+        working_set = getattr(self._local, "working_set", None)
+        if working_set is None or working_set.generation != self._generation:
+            return None
+        return working_set
+
+    def _query_record(self, sql: str, key: str) -> Optional[Record]:
+        row = self._connection().execute(sql, (key,)).fetchone()
+        return _decode(row[0]) if row else None
+
+    def _lookup_contact(self, contact_id: str) -> Optional[Record]:
+        working_set = self._working_set()
+        if working_set and contact_id in working_set.contacts:
+            return working_set.contacts[contact_id]
+        return self._query_record("SELECT data FROM contacts WHERE id = ?", contact_id)
+
+    # ------------------------------------------------------------------
+    # Lookup helpers
+    # ------------------------------------------------------------------
+    def iter_account_ids(self) -> Iterable[str]:
+        cursor = self._connection().execute("SELECT id FROM accounts ORDER BY rowid")
+        for (account_id,) in cursor:
+            yield account_id
+
+    def get_account(self, account_id: str) -> Optional[Dict[str, str]]:
+        working_set = self._working_set()
+        if working_set and working_set.account_id == account_id:
+            return working_set.account
+        return self._query_record("SELECT data FROM accounts WHERE id = ?", account_id)
+
+    def get_relations_for_account(self, account_id: str) -> Sequence[Dict[str, str]]:
+        working_set = self._working_set()
+        if not working_set or working_set.account_id != account_id:
+            working_set = self._load_working_set(account_id)
+        return working_set.relations
+
+    def get_contacts_for_account(self, account_id: str) -> List[ContactView]:
+        working_set = self._working_set()
+        if not working_set or working_set.account_id != account_id:
+            working_set = self._load_working_set(account_id)
+        return enrich_contacts(account_id, working_set.relations, working_set.contacts)
+
+    def get_individual_for_contact(self, contact_id: str) -> Optional[Dict[str, str]]:
+        contact = self._lookup_contact(contact_id) or {}
+        individual_id = contact.get("IndividualId")
+        if not individual_id:
+            return None
+        return self._query_record("SELECT data FROM individuals WHERE id = ?", individual_id)
+
+    def get_contact_points_for_contact(self, contact_id: str) -> Dict[str, Sequence[Dict[str, str]]]:
+        working_set = self._working_set()
+        if working_set and contact_id in working_set.contacts:
+            individual_id = working_set.contacts[contact_id].get("IndividualId")
+            if not individual_id:
+                return {"phones": (), "emails": ()}
+            return {
+                "phones": working_set.phones.get(individual_id, ()),
+                "emails": working_set.emails.get(individual_id, ()),
+            }
+
+        contact = self._lookup_contact(contact_id) or {}
+        individual_id = contact.get("IndividualId")
+        if not individual_id:
+            return {"phones": (), "emails": ()}
+        connection = self._connection()
+        return {
+            "phones": self._fetch_points(connection, "contact_point_phones", "?", (individual_id,)).get(
+                individual_id, ()
+            ),
+            "emails": self._fetch_points(connection, "contact_point_emails", "?", (individual_id,)).get(
+                individual_id, ()
+            ),
+        }
+
+    def get_contacts_for_identifier(self, kind: str, value: str) -> List[str]:
+        rows = self._connection().execute(
+            "SELECT contact_id FROM contact_identifiers WHERE kind = ? AND value = ? ORDER BY rowid",
+            (kind, value),
+        )
+        return [contact_id for (contact_id,) in rows]
+
+    def iter_shared_identifiers(self, kind: str) -> Iterator[Tuple[str, List[str]]]:
+        rows = self._connection().execute(
+            "SELECT value, contact_id FROM contact_identifiers WHERE kind = ? AND value IN ("
+            "SELECT value FROM contact_identifiers WHERE kind = ? GROUP BY value HAVING COUNT(*) > 1"
+            ") ORDER BY value, rowid",
+            (kind, kind),
+        )
+        for value, group in groupby(rows, key=itemgetter(0)):
+            yield value, [contact_id for _value, contact_id in group]
+
+    def iter_account_contacts(self) -> Iterator[Tuple[str, str]]:
+        yield from self._connection().execute(
+            "SELECT account_id, contact_id FROM account_contact_relations "
+            "WHERE account_id IS NOT NULL AND contact_id IS NOT NULL ORDER BY position"
+        )
+
+    def iter_contact_rows(self, with_points: bool = False) -> Iterator[ContactRow]:
+        """Yield every relation joined with its contact, in file order.
+
+        Rows are read in chunks; with ``with_points`` the contact points of a
+        chunk's individuals are fetched with one query per table, so memory stays
+        bounded by the chunk size.
+        """
+
+        with self._transaction() as connection:
+            cursor = connection.execute(_CONTACT_ROWS)
+            while True:
+                chunk = cursor.fetchmany(_CHUNK_SIZE)
+                if not chunk:
+                    return
+                phones: Dict[str, Tuple[Record, ...]] = {}
+                emails: Dict[str, Tuple[Record, ...]] = {}
+                if with_points:
+                    individuals = sorted({row[2] for row in chunk if row[2]})
+                    if individuals:
+                        where = ",".join("?" * len(individuals))
+                        phones = self._fetch_points(connection, "contact_point_phones", where, individuals)
+                        emails = self._fetch_points(connection, "contact_point_emails", where, individuals)
+                for account_id, relation, individual_id, contact in chunk:
+                    points = None
+                    if with_points:
+                        points = {
+                            "phones": phones.get(individual_id, ()) if individual_id else (),
+                            "emails": emails.get(individual_id, ()) if individual_id else (),
+                        }
+                    yield ContactRow(account_id, ContactView(_decode(contact), _decode(relation)), points)
+
+    def account_fingerprint(self, account_id: str) -> int:
+        """Same contract as the in-memory store; hashes the stored JSON without decoding it."""
+
+        with self._transaction() as connection:
+            parts = tuple(
+                tuple(row for (row,) in connection.execute(query, (account_id,)))
+                for query in _FINGERPRINT_QUERIES
+            )
+        return hash(parts)
+
+    def get_contacts_for_individual(self, individual_id: str) -> List[str]:
+        rows = self._connection().execute(
+            "SELECT id FROM contacts WHERE individual_id = ? ORDER BY rowid", (individual_id,)
+        )
+        return [contact_id for (contact_id,) in rows]
+
+    def describe_account(self, account_id: str) -> AccountContext:
+        working_set = self._load_working_set(account_id)
+        return build_account_context(
+            account_id, working_set.account or {}, working_set.relations, working_set.contacts, self
+        )
+
+    def memory_estimate(self) -> int:
+        """Records live in the database file; only per-thread working sets stay in memory."""
+
+        return 0
+
+    # ------------------------------------------------------------------
+    # Browsing
+    # ------------------------------------------------------------------
+    # Same contract as the in-memory store; every page is a single range scan
+    # over the ``(name_key, id)`` indexes or over the parent's rows.
+    def page_accounts(
+        self, prefix: str = "", after: Optional[Tuple[str, str]] = None, limit: int = 50
+    ) -> BrowsePage:
+        return self._page(_PAGE_ACCOUNTS, browse_key(prefix), after, limit)
+
+    def page_contacts(
+        self, prefix: str = "", after: Optional[Tuple[str, str]] = None, limit: int = 50
+    ) -> BrowsePage:
+        return self._page(_PAGE_CONTACTS, browse_key(prefix), after, limit)
+
+    def page_account_contacts(
+        self,
+        account_id: str,
+        prefix: str = "",
+        after: Optional[Tuple[str, str]] = None,
+        limit: int = 50,
+    ) -> BrowsePage:
+        prefix = browse_key(prefix)
+        rows = self._connection().execute(
+            _PAGE_ACCOUNT_CONTACTS,
+            (account_id, prefix, prefix + _PREFIX_END, *(after or ("", "")), limit + 1),
+        )
+        page = [
+            (key, token, ContactView(_decode(contact), _decode(relation)))
+            for key, token, contact, relation in rows
+        ]
+        return BrowsePage(page[:limit], len(page) > limit)
+
+    def page_contact_points(
+        self, individual_id: str, after: Optional[Tuple[str, str]] = None, limit: int = 50
+    ) -> BrowsePage:
+        rows = self._connection().execute(
+            _PAGE_CONTACT_POINTS, (individual_id, individual_id, *(after or ("", "")), limit + 1)
+        )
+        page = [(kind, token, _decode(data)) for kind, token, data in rows]
+        return BrowsePage(page[:limit], len(page) > limit)
+
+    def _page(
+        self, sql: str, prefix: str, after: Optional[Tuple[str, str]], limit: int
+    ) -> BrowsePage:
+        rows = self._connection().execute(
+            sql, (prefix, prefix + _PREFIX_END, *(after or ("", "")), limit + 1)
+        )
+        page = [(key, record_id, _decode(data)) for key, record_id, data in rows]
+        return BrowsePage(page[:limit], len(page) > limit)
+
+    def resolve_account_name(self, account_id: str) -> str:
+        account = self.get_account(account_id) or {}
+        return account.get("Name") or account_id
+
+    def resolve_contact_name(self, contact_id: str) -> str:
+        return format_contact_name(self._lookup_contact(contact_id) or {}, contact_id)
+
+    def timestamp(self) -> str:
+        return datetime.utcnow().isoformat(timespec="seconds") + "Z"
+
+
+def _note_delta(touched: Dict[str, set], entity: str, row: Dict[str, Optional[str]]) -> None:
+    """Record the accounts, contacts and individuals reached by a changed row."""
+
+    if entity == "accounts":
+        touched["accounts"].add(row["id"])
+    elif entity == "contacts":
+        touched["contacts"].add(row["id"])
+        touched["accounts"].add(row.get("account_id"))
+    elif entity == "individuals":
+        touched["individuals"].add(row["id"])
+    elif entity == "account_contact_relations":
+        touched["accounts"].add(row.get("account_id"))
+    else:
+        touched["individuals"].add(row.get("parent_id"))
+
+
+class _AccountWorkingSet:
+    """Records fetched for the account currently analysed by a thread."""
+
+    __slots__ = ("generation", "account_id", "account", "relations", "contacts", "phones", "emails")
+
+    def __init__(
+        self,
+        *,
+        generation: int,
+        account_id: str,
+        account: Optional[Record],
+        relations: Tuple[Record, ...],
+        contacts: Dict[str, Record],
+        phones: Dict[str, Tuple[Record, ...]],
+        emails: Dict[str, Tuple[Record, ...]],
+    ) -> None:
+        self.generation = generation
+        self.account_id = account_id
+        self.account = account
+        self.relations = relations
+        self.contacts = contacts
+        self.phones = phones
+        self.emails = emails
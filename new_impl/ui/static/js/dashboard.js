@@ -115,6 +115,22 @@
     contact_point_emails: ['Id', 'ParentId', 'EmailAddress', 'Type__c'],
   };
 
+  const IMPORT_POLL_INTERVAL_MS = 500;
+  const IMPORT_PHASE_LABELS = {
+    queued: 'in coda',
+    running: 'avvio',
+    hashing: 'confronto con l\'ultimo import',
+    parsing: 'lettura dei file',
+    indexing: 'costruzione degli indici',
+    snapshot: 'salvataggio dello snapshot',
+  };
+
+  const GZIP_MAGIC = [0x1f, 0x8b];
+  const ZIP_MAGIC = [0x50, 0x4b, 0x03, 0x04];
+  const HEADER_PREVIEW_LENGTH = 4096;
+  // Record di fine archivio (22 byte) più il commento zip più lungo ammesso.
+  const ZIP_MAX_TAIL_LENGTH = 22 + 0xffff;
+
   function formatIds(ids) {
     return ids.map((value) => `'${value}'`).join(', ');
   }
@@ -189,16 +205,110 @@
   }
 
   async function readCsvColumns(file) {
-    const source = typeof file.slice === 'function' ? file.slice(0, 4096) : file;
+    if (startsWithBytes(await readLeadingBytes(file), GZIP_MAGIC)) {
+      const text = await readStreamPrefix(file.stream().pipeThrough(createDecompressor('gzip')));
+      return extractCsvHeaderColumns(text);
+    }
+    const source = typeof file.slice === 'function' ? file.slice(0, HEADER_PREVIEW_LENGTH) : file;
     const text = typeof source.text === 'function' ? await source.text() : await file.text();
     return extractCsvHeaderColumns(text);
   }
 
+  async function readLeadingBytes(file) {
+    if (typeof file.slice !== 'function') return new Uint8Array();
+    return new Uint8Array(await file.slice(0, 4).arrayBuffer());
+  }
+
+  function startsWithBytes(bytes, magic) {
+    return magic.every((value, index) => bytes[index] === value);
+  }
+
+  function createDecompressor(format) {
+    if (typeof DecompressionStream === 'undefined') {
+      throw new Error('Il browser non supporta la lettura dei file compressi.');
+    }
+    return new DecompressionStream(format);
+  }
+
+  async function readStreamPrefix(stream) {
+    // Decomprime solo quanto basta per leggere l'intestazione, poi interrompe lo stream.
+    const reader = stream.pipeThrough(new TextDecoderStream()).getReader();
+    let text = '';
+    try {
+      while (text.length < HEADER_PREVIEW_LENGTH && !/\r?\n/.test(text)) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        text += value;
+      }
+    } finally {
+      reader.cancel().catch(() => {});
+    }
+    return text;
+  }
+
+  async function listZipEntries(file) {
+    const tailLength = Math.min(file.size, ZIP_MAX_TAIL_LENGTH);
+    const tail = new DataView(await file.slice(file.size - tailLength).arrayBuffer());
+    let end = -1;
+    for (let offset = tail.byteLength - 22; offset >= 0; offset -= 1) {
+      if (tail.getUint32(offset, true) === 0x06054b50) {
+        end = offset;
+        break;
+      }
+    }
+    if (end < 0) {
+      throw new Error('Archivio zip non valido.');
+    }
+
+    const count = tail.getUint16(end + 10, true);
+    const directoryLength = tail.getUint32(end + 12, true);
+    const directoryOffset = tail.getUint32(end + 16, true);
+    const directory = new DataView(
+      await file.slice(directoryOffset, directoryOffset + directoryLength).arrayBuffer()
+    );
+    const decoder = new TextDecoder();
+    const entries = [];
+    let cursor = 0;
+    for (let index = 0; index < count && cursor + 46 <= directory.byteLength; index += 1) {
+      if (directory.getUint32(cursor, true) !== 0x02014b50) break;
+      const nameLength = directory.getUint16(cursor + 28, true);
+      entries.push({
+        method: directory.getUint16(cursor + 10, true),
+        compressedSize: directory.getUint32(cursor + 20, true),
+        localOffset: directory.getUint32(cursor + 42, true),
+        name: decoder.decode(new Uint8Array(directory.buffer, cursor + 46, nameLength)),
+      });
+      cursor +=
+        46 + nameLength + directory.getUint16(cursor + 30, true) + directory.getUint16(cursor + 32, true);
+    }
+    return entries.filter(
+      ({ name }) => !name.endsWith('/') && !name.startsWith('__MACOSX/') && /\.csv$/i.test(name)
+    );
+  }
+
+  async function readZipEntryColumns(file, entry) {
+    const local = new DataView(
+      await file.slice(entry.localOffset, entry.localOffset + 30).arrayBuffer()
+    );
+    if (local.byteLength < 30 || local.getUint32(0, true) !== 0x04034b50) {
+      throw new Error('Voce dell\'archivio non leggibile.');
+    }
+    const start = entry.localOffset + 30 + local.getUint16(26, true) + local.getUint16(28, true);
+    let stream = file.slice(start, start + entry.compressedSize).stream();
+    if (entry.method === 8) {
+      stream = stream.pipeThrough(createDecompressor('deflate-raw'));
+    } else if (entry.method !== 0) {
+      throw new Error('Metodo di compressione non supportato.');
+    }
+    return extractCsvHeaderColumns(await readStreamPrefix(stream));
+  }
+
   function getMatchingEntities(columns) {
+    // Le entità con più colonne attese vengono prima: un CSV di contatti ha anche le colonne degli Individual.
     return SUPPORTED_ENTITIES.filter((entity) => {
       const expected = EXPECTED_COLUMNS[entity] || [];
       return expected.every((column) => columns.includes(column));
-    });
+    }).sort((left, right) => EXPECTED_COLUMNS[right].length - EXPECTED_COLUMNS[left].length);
   }
 
   async function classifyFiles(files) {
@@ -206,22 +316,39 @@
     const unmatched = [];
     const usedEntities = new Set();
 
+    const classify = (item, columns) => {
+      const matches = getMatchingEntities(columns);
+      if (!matches.length) {
+        unmatched.push({ ...item, reason: 'Intestazioni non riconosciute.' });
+        return;
+      }
+      const [entity] = matches;
+      if (usedEntities.has(entity)) {
+        const label = ENTITY_LABELS[entity] || entity;
+        unmatched.push({ ...item, reason: `File duplicato per ${label}.` });
+        return;
+      }
+      usedEntities.add(entity);
+      matched.push({ entity, ...item });
+    };
+
     for (const file of files) {
       try {
-        const columns = await readCsvColumns(file);
-        const matches = getMatchingEntities(columns);
-        if (!matches.length) {
-          unmatched.push({ file, reason: 'Intestazioni non riconosciute.' });
+        if (startsWithBytes(await readLeadingBytes(file), ZIP_MAGIC)) {
+          const entries = await listZipEntries(file);
+          if (!entries.length) {
+            unmatched.push({ file, reason: 'Nessun CSV nell\'archivio.' });
+          }
+          for (const entry of entries) {
+            try {
+              classify({ file, member: entry.name }, await readZipEntryColumns(file, entry));
+            } catch (error) {
+              unmatched.push({ file, member: entry.name, reason: error.message || 'File non leggibile.' });
+            }
+          }
           continue;
         }
-        const available = matches.find((entity) => !usedEntities.has(entity));
-        if (available) {
-          usedEntities.add(available);
-          matched.push({ entity: available, file });
-        } else {
-          const label = ENTITY_LABELS[matches[0]] || matches[0];
-          unmatched.push({ file, reason: `File duplicato per ${label}.` });
-        }
+        classify({ file }, await readCsvColumns(file));
       } catch (error) {
         unmatched.push({ file, reason: error.message || 'File non leggibile.' });
       }
@@ -230,36 +357,49 @@
     return { matched, unmatched };
   }
 
-  function assignFileToInput(entity, file) {
+  function assignFilesToInput(name, files) {
     if (!importForm) return;
-    const input = importForm.querySelector(`input[name="${entity}"]`);
+    const input = importForm.querySelector(`input[name="${name}"]`);
     if (!input) return;
     const dataTransfer = new DataTransfer();
-    dataTransfer.items.add(file);
+    files.forEach((file) => dataTransfer.items.add(file));
     input.files = dataTransfer.files;
     input.dispatchEvent(new Event('change', { bubbles: true }));
   }
 
   function applyBulkAssignments(result) {
-    result.matched.forEach(({ entity, file }) => {
-      assignFileToInput(entity, file);
+    // I CSV contenuti negli zip viaggiano nell'archivio, che il server smista con le stesse regole.
+    const archives = [];
+    result.matched.forEach(({ entity, file, member }) => {
+      if (member) {
+        assignFilesToInput(entity, []);
+        if (!archives.includes(file)) archives.push(file);
+      } else {
+        assignFilesToInput(entity, [file]);
+      }
     });
+    assignFilesToInput('archives', archives);
+  }
+
+  function describeFile(file, member) {
+    const fileName = file && file.name ? file.name : 'File sconosciuto';
+    return member ? `${fileName} › ${member}` : fileName;
   }
 
   function buildModalListMarkup(result) {
     const items = [];
 
-    result.matched.forEach(({ entity, file }) => {
+    result.matched.forEach(({ entity, file, member }) => {
       const label = ENTITY_LABELS[entity] || entity;
-      const fileName = file && file.name ? file.name : 'File sconosciuto';
+      const fileName = describeFile(file, member);
       items.push(
         `<li class="matched"><strong>${escapeHtml(fileName)}</strong><span>Assegnato a ${escapeHtml(label)}</span></li>`
       );
     });
 
-    result.unmatched.forEach(({ file, reason }) => {
+    result.unmatched.forEach(({ file, member, reason }) => {
       const detail = reason || 'File non riconosciuto.';
-      const fileName = file && file.name ? file.name : 'File sconosciuto';
+      const fileName = describeFile(file, member);
       items.push(
         `<li class="unmatched"><strong>${escapeHtml(fileName)}</strong><span>${escapeHtml(detail)}</span></li>`
       );
@@ -400,22 +540,70 @@
     event.preventDefault();
     if (!importForm) return;
     const formData = new FormData(importForm);
+    formData.set('async', '1');
     setFeedback('Caricamento dei file in corso...', 'pending');
     try {
       const response = await fetch('/api/import', { method: 'POST', body: formData });
       if (!response.ok) {
-        throw new Error(`Import non riuscito: stato ${response.status}`);
+        const failure = await response.json().catch(() => ({}));
+        throw new Error(failure.error || `Import non riuscito: stato ${response.status}`);
       }
-      const payload = await response.json();
+      const payload = await waitForImportJob(await response.json());
       const imported = Object.entries(payload.summary || {})
-        .map(([entity, count]) => `${entity.replace(/_/g, ' ')}: ${count}`)
+        .map(([entity, info]) => formatImportEntry(entity, info))
         .join(', ');
-      setFeedback(imported ? `Import eseguito per ${imported}.` : 'Nessun file elaborato.', 'success');
+      const touched = Array.isArray(payload.touched_accounts)
+        ? ` Account interessati: ${formatInteger(payload.touched_accounts.length)}.`
+        : '';
+      setFeedback(
+        imported ? `Import eseguito per ${imported}.${touched}` : 'Nessun file elaborato.',
+        'success'
+      );
     } catch (error) {
       setFeedback(error.message || 'Import non riuscito.', 'error');
     }
   }
 
+  async function waitForImportJob(job) {
+    let state = job;
+    while (state.status !== 'completed' && state.status !== 'failed') {
+      setFeedback(formatImportProgress(state), 'pending');
+      await new Promise((resolve) => setTimeout(resolve, IMPORT_POLL_INTERVAL_MS));
+      const response = await fetch(`/api/import/${encodeURIComponent(job.job)}`);
+      if (!response.ok) {
+        throw new Error(`Stato dell'import non disponibile: stato ${response.status}`);
+      }
+      state = await response.json();
+    }
+    if (state.status === 'failed') {
+      throw new Error(state.error || 'Import non riuscito.');
+    }
+    return state;
+  }
+
+  function formatImportProgress(state) {
+    const phase = IMPORT_PHASE_LABELS[state.phase] || state.phase;
+    const rows = Object.entries(state.rows || {})
+      .map(([entity, count]) => `${entity.replace(/_/g, ' ')}: ${formatInteger(count)}`)
+      .join(', ');
+    const speed = state.rows_per_second ? ` (${formatInteger(state.rows_per_second)} righe/s)` : '';
+    return `Import in corso, fase: ${phase}.${rows ? ` Righe lette: ${rows}${speed}.` : ''}`;
+  }
+
+  function formatImportEntry(entity, info) {
+    const label = entity.replace(/_/g, ' ');
+    const details = info || {};
+    const seconds = Number(details.parse_seconds || 0).toFixed(2);
+    const dropped = details.dropped_columns
+      ? `, ${formatInteger(details.dropped_columns)} colonne scartate`
+      : '';
+    if (details.status === 'unchanged') {
+      return `${label}: ${formatInteger(details.records)} (invariato)`;
+    }
+    const deleted = details.deleted ? `, ${formatInteger(details.deleted)} eliminati` : '';
+    return `${label}: ${formatInteger(details.records)}${deleted} (${seconds}s${dropped})`;
+  }
+
   function handleImportReset() {
     setFeedback('Selezioni azzerate.', 'info');
   }
@@ -466,18 +654,65 @@
     }
   }
 
+  async function readEventStream(response, onEvent) {
+    // Risposta NDJSON: un evento JSON per riga, elaborato appena la riga è completa.
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+      const { value, done } = await reader.read();
+      buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+      const lines = buffer.split('\n');
+      buffer = lines.pop();
+      lines.filter((line) => line.trim()).forEach((line) => onEvent(JSON.parse(line)));
+      if (done) break;
+    }
+    if (buffer.trim()) {
+      onEvent(JSON.parse(buffer));
+    }
+  }
+
+  function formatAlertProgress(event) {
+    const seconds = Number(event.elapsed || 0).toFixed(1);
+    return `Analisi in corso... ${formatInteger(event.processed)}/${formatInteger(event.total)} account (${seconds}s)`;
+  }
+
   async function runAlerts() {
     if (!alertButton) return;
     alertButton.disabled = true;
     alertButton.textContent = 'Analisi in corso...';
     try {
-      const response = await fetch('/api/alerts/run', { method: 'POST' });
-      if (!response.ok) {
+      const response = await fetch('/api/alerts/run/stream', {
+        method: 'POST',
+        headers: { Accept: 'application/x-ndjson' },
+      });
+      if (!response.ok || !response.body) {
         throw new Error(`Esecuzione allerte non riuscita: stato ${response.status}`);
       }
-      const payload = await response.json();
-      renderAlerts(payload.details || []);
-      renderSummary(payload.summary || [], payload.statistics || null);
+      const details = [];
+      let finalEvent = null;
+      if (alertList) alertList.innerHTML = '';
+      if (alertCount) alertCount.textContent = '';
+      await readEventStream(response, (event) => {
+        if (event.event === 'alerts') {
+          const alerts = event.alerts || [];
+          appendAlerts(alerts, details.length);
+          alerts.forEach((alert) => details.push(alert));
+        } else if (event.event === 'progress') {
+          alertButton.textContent = formatAlertProgress(event);
+        } else if (event.event === 'done') {
+          finalEvent = event;
+        } else if (event.event === 'error') {
+          throw new Error(event.error || 'Errore durante le allerte.');
+        }
+      });
+      if (!finalEvent) {
+        throw new Error('Ciclo allerte interrotto prima della conclusione.');
+      }
+      if (!details.length) {
+        renderAlerts([]);
+      }
+      renderSummary(details, finalEvent.statistics || null);
     } catch (error) {
       renderAlerts([]);
       renderSummary([], null);
@@ -490,18 +725,25 @@
     }
   }
 
+  async function loadLastAlerts() {
+    // Il browser rivalida con l'ETag: se il ciclo non è cambiato riceve 304 e riusa la copia in cache.
+    try {
+      const response = await fetch('/api/alerts/results');
+      if (response.status !== 200) return;
+      const payload = await response.json();
+      renderAlerts(payload.details || []);
+      renderSummary(payload.summary || [], payload.statistics || null);
+    } catch (error) {
+      // Nessun risultato precedente da mostrare.
+    }
+  }
+
   function formatMultiline(text) {
     return escapeHtml(text || '').replace(/\n/g, '<br />');
   }
 
-  function renderAlerts(alerts) {
-    if (!alertList) return;
-    if (!alerts.length) {
-      alertList.innerHTML = '<li class="alert-item">Nessuna allerta generata.</li>';
-    } else {
-      const markup = alerts
-        .map(
-          (alert) => `
+  function alertMarkup(alert) {
+    return `
             <li class="alert-item">
               <h3>${escapeHtml(alert.alert_type || 'Allerta')}</h3>
               <p>${formatMultiline(alert.message || '')}</p>
@@ -510,16 +752,33 @@
                 <div><dt>Contatti</dt><dd>${escapeHtml(alert.contact_name || alert.contact_id || 'N/D')}</dd></div>
               </dl>
             </li>
-          `,
-        )
-        .join('');
-      alertList.innerHTML = markup;
+          `;
+  }
+
+  function renderAlerts(alerts) {
+    if (!alertList) return;
+    if (!alerts.length) {
+      alertList.innerHTML = '<li class="alert-item">Nessuna allerta generata.</li>';
+    } else {
+      alertList.innerHTML = alerts.map(alertMarkup).join('');
     }
     if (alertCount) {
       alertCount.textContent = alerts.length ? `${alerts.length} allerte` : '';
     }
   }
 
+  function appendAlerts(alerts, shown) {
+    // Aggiunge in coda le allerte arrivate dallo stream senza ridisegnare quelle già mostrate.
+    if (!alertList || !alerts.length) return;
+    if (!shown) {
+      alertList.innerHTML = '';
+    }
+    alertList.insertAdjacentHTML('beforeend', alerts.map(alertMarkup).join(''));
+    if (alertCount) {
+      alertCount.textContent = `${shown + alerts.length} allerte`;
+    }
+  }
+
   function normaliseFilterValue(value) {
     return (value || '').trim();
   }
@@ -891,4 +1150,5 @@
 
   addInitialSection();
   renderQueryResults([]);
+  loadLastAlerts();
 })();
@@ -0,0 +1,451 @@
+"""Aree di lavoro isolate: archivio, riepilogo allerte e log separati per utente.
+
+Ogni area di lavoro ha il proprio archivio, il proprio coordinatore degli import,
+il proprio ciclo allerte (e quindi il proprio riepilogo) e un file di log dedicato.
+L'area ``default`` riusa i singleton storici dell'applicazione.
+
+La memoria occupata dalle aree in memoria è limitata da ``SFBPCA_WORKSPACE_MEMORY_MB``:
+quando il totale stimato supera il limite, le aree inattive vengono scaricate a
+partire da quella usata meno di recente. Con ``SFBPCA_WORKSPACE_EVICTION=snapshot``
+(predefinito) il contenuto viene salvato su uno snapshot e ricaricato al prossimo
+accesso; con ``drop`` viene semplicemente scartato. L'area ``default`` non viene
+mai scaricata.
+
+Anche il numero di aree è limitato: ``SFBPCA_WORKSPACE_MAX`` aree oltre quella
+predefinita, e un'area inattiva da più di ``SFBPCA_WORKSPACE_IDLE_MINUTES`` minuti
+viene ritirata. Un'area ritirata esce dal registro e chiude il proprio file di log;
+il contenuto segue la stessa politica dello scaricamento. Solo le richieste che
+modificano i dati creano un'area: le letture su un'area inesistente ricevono
+``WorkspaceNotFound``.
+
+Lo snapshot di un'area che non può più essere ripristinata viene eliminato subito;
+snapshot e database SQLite delle aree ritirate restano su disco per
+``SFBPCA_WORKSPACE_RETENTION_DAYS`` giorni dall'ultima modifica.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from time import perf_counter
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from .alert_loop import ALERT_LOOP, AlertLoopRunner
+from .alert_summary import AlertSummaryStore
+from .csv_import import IMPORT_COORDINATOR, CSVImportCoordinator, coordinator_from_env
+from .data_store import (
+    DATA_STORE,
+    SalesforceRelationshipStore,
+    configured_backend,
+    configured_database_path,
+    create_store,
+)
+from .logbook import close_log_scope, log_loop_event, log_scope
+from .snapshots import SnapshotError, configured_snapshot_path
+
+DEFAULT_WORKSPACE = "default"
+EVICTION_POLICIES = ("snapshot", "drop")
+# Aree oltre quella predefinita e minuti di inattività prima del ritiro.
+DEFAULT_MAX_WORKSPACES = 100
+DEFAULT_IDLE_MINUTES = 60.0
+# Giorni per cui restano su disco i file delle aree ritirate.
+DEFAULT_RETENTION_DAYS = 7.0
+WORKSPACE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def validate_workspace_id(workspace_id: str) -> str:
+    """Restituisce l'identificativo se valido, altrimenti solleva ``ValueError``."""
+
+    if not WORKSPACE_ID_PATTERN.match(workspace_id or ""):
+        raise ValueError(
+            f"Area di lavoro '{workspace_id}' non valida: usare da 1 a 64 lettere, cifre, '-' o '_'."
+        )
+    return workspace_id
+
+
+def _remove_files(paths: Iterable[Path]) -> None:
+    for path in paths:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            continue
+        except OSError as error:
+            print(f"[Aree] Impossibile eliminare {path}: {error}")
+            log_loop_event(f"Eliminazione di {path} non riuscita: {error}.")
+
+
+class WorkspaceNotFound(LookupError):
+    """L'area richiesta non esiste e la richiesta non è autorizzata a crearla."""
+
+
+class WorkspaceLimitReached(RuntimeError):
+    """Tutte le aree consentite sono in uso: non se ne possono creare altre."""
+
+
+class Workspace:
+    """Archivio, coordinatore degli import e ciclo allerte di un'area di lavoro."""
+
+    def __init__(
+        self,
+        workspace_id: str,
+        store,
+        coordinator: CSVImportCoordinator,
+        alert_loop: AlertLoopRunner,
+        *,
+        snapshot_path: Optional[Path] = None,
+        log_scope: Optional[str] = None,
+    ) -> None:
+        self.id = workspace_id
+        self.store = store
+        self.coordinator = coordinator
+        self.alert_loop = alert_loop
+        self.snapshot_path = snapshot_path
+        self.log_scope = log_scope
+        # Richieste e import in corso: un'area attiva non viene mai scaricata.
+        self.active = 0
+        self.last_used = perf_counter()
+        self.loaded = False
+        # Falso dopo uno scaricamento senza snapshot: l'area riparte vuota.
+        self.restorable = True
+        self._lock = threading.Lock()
+
+    @property
+    def in_memory(self) -> bool:
+        return isinstance(self.store, SalesforceRelationshipStore)
+
+    def memory_estimate(self) -> int:
+        return self.store.memory_estimate() if self.loaded else 0
+
+    def files(self) -> List[Path]:
+        """File su disco dell'area: lo snapshot, oppure il database SQLite con WAL e memoria condivisa."""
+
+        if self.in_memory:
+            return [self.snapshot_path] if self.snapshot_path else []
+        path = self.store.path
+        return [path, path.with_name(f"{path.name}-wal"), path.with_name(f"{path.name}-shm")]
+
+    def ensure_loaded(self) -> None:
+        """Ricarica lo snapshot dell'area se è stata scaricata (o al primo accesso)."""
+
+        with self._lock:
+            if self.loaded:
+                return
+            self.loaded = True
+            path = self.snapshot_path
+            if not self.restorable or not self.in_memory or not path:
+                return
+            if not path.exists():
+                # Area nuova, oppure snapshot rimosso dopo uno scaricamento: si riparte vuoti.
+                self._forget_data()
+                return
+            started = perf_counter()
+            try:
+                self.store.load_snapshot(path)
+            except SnapshotError as error:
+                print(f"[Aree] Snapshot dell'area {self.id} ignorato: {error}")
+                log_loop_event(f"Snapshot {path} dell'area {self.id} scartato: {error}")
+                self.store.reset()
+                self._forget_data()
+                return
+            print(
+                f"[Aree] Area {self.id} caricata da {path} in {perf_counter() - started:.2f}s "
+                f"({len(self.store.accounts)} account)."
+            )
+
+    def unload(self, save: bool) -> int:
+        """Libera la memoria dell'area e restituisce i byte stimati rilasciati.
+
+        Con ``save`` il contenuto viene prima scritto sullo snapshot dell'area; se il
+        salvataggio non riesce, o se l'area non ha uno snapshot, i dati vanno persi come
+        con la politica ``drop``.
+        """
+
+        with self._lock:
+            return self._unload(save)
+
+    def _forget_data(self) -> None:
+        # I dati non tornano più: le impronte degli import e il riepilogo non sono più validi,
+        # e uno snapshot rimasto su disco è illeggibile o più vecchio dei dati scartati.
+        self.coordinator.forget_imports()
+        self.alert_loop.clear_summary()
+        self.restorable = False
+        if self.id != DEFAULT_WORKSPACE and self.in_memory:
+            _remove_files(self.files())
+
+    def _unload(self, save: bool) -> int:
+        # Chiamato con ``self._lock`` acquisito.
+        if not self.loaded:
+            return 0
+        released = self.store.memory_estimate()
+        saved = False
+        if save and self.snapshot_path:
+            try:
+                self.store.save_snapshot(self.snapshot_path)
+                saved = True
+            except OSError as error:
+                print(f"[Aree] Impossibile salvare lo snapshot dell'area {self.id}: {error}")
+                log_loop_event(f"Salvataggio snapshot dell'area {self.id} non riuscito: {error}.")
+        self.store.reset()
+        if not saved:
+            self._forget_data()
+        self.loaded = False
+        self.restorable = saved
+        # Il file di log viene riaperto alla prossima scrittura.
+        close_log_scope(self.log_scope)
+        return released
+
+
+class WorkspaceRegistry:
+    """Crea le aree di lavoro su richiesta e le scarica oltre il limite di memoria.
+
+    ``max_workspaces`` e ``idle_timeout`` (in secondi) limitano le aree registrate,
+    ``retention`` (in secondi) i file lasciati su disco da quelle ritirate; ``0``
+    disattiva il rispettivo limite.
+    """
+
+    def __init__(
+        self,
+        *,
+        memory_budget: int = 0,
+        eviction: str = "snapshot",
+        max_workspaces: int = DEFAULT_MAX_WORKSPACES,
+        idle_timeout: float = DEFAULT_IDLE_MINUTES * 60,
+        retention: float = DEFAULT_RETENTION_DAYS * 86400,
+    ) -> None:
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(
+                f"Politica di scaricamento '{eviction}' non supportata. "
+                f"Valori ammessi: {', '.join(EVICTION_POLICIES)}"
+            )
+        self.memory_budget = memory_budget
+        self.eviction = eviction
+        self.max_workspaces = max_workspaces
+        self.idle_timeout = idle_timeout
+        self.retention = retention
+        # Ordine di utilizzo: la prima area è quella usata meno di recente.
+        self._workspaces: "OrderedDict[str, Workspace]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._workspaces[DEFAULT_WORKSPACE] = Workspace(
+            DEFAULT_WORKSPACE,
+            DATA_STORE,
+            IMPORT_COORDINATOR,
+            ALERT_LOOP,
+            snapshot_path=IMPORT_COORDINATOR.snapshot_path,
+        )
+
+    @property
+    def default(self) -> Workspace:
+        return self._workspaces[DEFAULT_WORKSPACE]
+
+    def get(self, workspace_id: str, *, create: bool = True) -> Workspace:
+        """Restituisce l'area richiesta, creandola vuota se non esiste.
+
+        Con ``create`` falso un'area inesistente solleva ``WorkspaceNotFound``; oltre
+        ``max_workspaces`` aree viene prima ritirata quella inattiva meno recente, e se
+        sono tutte in uso si solleva ``WorkspaceLimitReached``.
+        """
+
+        validate_workspace_id(workspace_id)
+        with self._lock:
+            self.expire_idle()
+            workspace = self._workspaces.get(workspace_id)
+            if workspace is None:
+                if not create:
+                    raise WorkspaceNotFound(f"Area di lavoro '{workspace_id}' inesistente.")
+                self._make_room()
+                workspace = self._workspaces[workspace_id] = self._create(workspace_id)
+                print(f"[Aree] Creata l'area di lavoro {workspace_id}.")
+            return workspace
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            return list(self._workspaces)
+
+    @contextmanager
+    def use(self, workspace_id: str, *, create: bool = True) -> Iterator[Workspace]:
+        """Segna l'area come attiva per la durata del blocco e ne instrada il log."""
+
+        with self._lock:
+            workspace = self.get(workspace_id, create=create)
+            workspace.active += 1
+            self._workspaces.move_to_end(workspace.id)
+        try:
+            workspace.ensure_loaded()
+            with log_scope(workspace.log_scope):
+                yield workspace
+        finally:
+            with self._lock:
+                workspace.active -= 1
+                workspace.last_used = perf_counter()
+            self.enforce_budget()
+
+    def expire_idle(self) -> None:
+        """Ritira le aree inattive da più di ``idle_timeout`` secondi."""
+
+        if self.idle_timeout <= 0:
+            return
+        now = perf_counter()
+        with self._lock:
+            for workspace in list(self._workspaces.values()):
+                if workspace.id == DEFAULT_WORKSPACE or workspace.active:
+                    continue
+                if now - workspace.last_used > self.idle_timeout:
+                    self._retire(workspace, "inattiva")
+
+    def _make_room(self) -> None:
+        # Chiamato con ``self._lock`` acquisito, prima di creare una nuova area.
+        if self.max_workspaces <= 0:
+            return
+        while len(self._workspaces) - 1 >= self.max_workspaces:
+            victim = next(
+                (
+                    workspace
+                    for workspace in self._workspaces.values()
+                    if workspace.id != DEFAULT_WORKSPACE and workspace.active == 0
+                ),
+                None,
+            )
+            if victim is None:
+                raise WorkspaceLimitReached(
+                    f"Raggiunto il limite di {self.max_workspaces} aree di lavoro, tutte in uso: riprovare più tardi."
+                )
+            self._retire(victim, "oltre il limite di aree")
+
+    def _retire(self, workspace: Workspace, reason: str) -> None:
+        """Toglie dal registro un'area inattiva, salvandola come in uno scaricamento."""
+
+        # Chiamato con ``self._lock`` acquisito: nessuna richiesta può riattivarla nel frattempo.
+        with workspace._lock:
+            if workspace.in_memory:
+                workspace._unload(save=self.eviction == "snapshot")
+            else:
+                workspace.store.close()
+        del self._workspaces[workspace.id]
+        close_log_scope(workspace.log_scope)
+        self._prune_files()
+        print(f"[Aree] Area {workspace.id} ritirata ({reason}).")
+        log_loop_event(f"Area di lavoro {workspace.id} ritirata ({reason}, {self.eviction}).")
+
+    def memory_estimate(self) -> int:
+        with self._lock:
+            workspaces = list(self._workspaces.values())
+        return sum(workspace.memory_estimate() for workspace in workspaces)
+
+    def enforce_budget(self) -> None:
+        """Scarica le aree inattive meno recenti finché la memoria stimata rientra nel limite."""
+
+        if self.memory_budget <= 0:
+            return
+        total = self.memory_estimate()
+        while total > self.memory_budget:
+            with self._lock:
+                victim = self._next_victim()
+                if victim is None:
+                    break
+                # Il lock dell'area si prende prima di rilasciare quello del registro: una
+                # richiesta arrivata nel frattempo attende lo scaricamento e poi ricarica.
+                victim._lock.acquire()
+            try:
+                released = victim._unload(save=self.eviction == "snapshot")
+            finally:
+                victim._lock.release()
+            total -= released
+            print(f"[Aree] Area {victim.id} scaricata ({self.eviction}, {released / 1_048_576:.1f} MB).")
+            log_loop_event(
+                f"Area di lavoro {victim.id} scaricata ({self.eviction}): "
+                f"liberati circa {released / 1_048_576:.1f} MB."
+            )
+            self._forget(victim)
+
+    def _next_victim(self) -> Optional[Workspace]:
+        # Chiamato con ``self._lock`` acquisito; gli archivi SQLite stimano 0 byte e restano.
+        for workspace in self._workspaces.values():
+            if workspace.id == DEFAULT_WORKSPACE:
+                continue
+            if workspace.active == 0 and workspace.memory_estimate() > 0:
+                return workspace
+        return None
+
+    def _forget(self, workspace: Workspace) -> None:
+        """Rimuove un'area scaricata che non ha snapshot da cui ripartire."""
+
+        if workspace.id == DEFAULT_WORKSPACE or workspace.restorable:
+            return
+        with self._lock:
+            if workspace.active == 0 and not workspace.loaded and self._workspaces.get(workspace.id) is workspace:
+                del self._workspaces[workspace.id]
+                close_log_scope(workspace.log_scope)
+                self._prune_files()
+
+    def _file_folders(self) -> List[Tuple[Path, str]]:
+        """Cartelle con i file delle aree e il pattern dei file di ciascuna."""
+
+        folders = [(configured_database_path().parent / "workspaces", "*.sqlite3*")]
+        default_snapshot = configured_snapshot_path()
+        if default_snapshot is not None:
+            folders.append((default_snapshot.parent / "workspaces", "*.snapshot"))
+        return folders
+
+    def _prune_files(self) -> None:
+        """Elimina i file delle aree non registrate modificati più di ``retention`` secondi fa."""
+
+        if self.retention <= 0:
+            return
+        cutoff = time.time() - self.retention
+        with self._lock:
+            registered = set(self._workspaces)
+            expired: List[Path] = []
+            for folder, pattern in self._file_folders():
+                for path in folder.glob(pattern):
+                    # Il nome dei file inizia con l'identificativo dell'area, che non contiene punti.
+                    if path.name.split(".", 1)[0] in registered:
+                        continue
+                    try:
+                        if path.stat().st_mtime < cutoff:
+                            expired.append(path)
+                    except FileNotFoundError:
+                        continue
+            _remove_files(expired)
+
+    def _create(self, workspace_id: str) -> Workspace:
+        backend = configured_backend()
+        snapshot_path = None
+        database_path = None
+        if backend == "sqlite":
+            database_path = configured_database_path().parent / "workspaces" / f"{workspace_id}.sqlite3"
+        elif self.eviction == "snapshot":
+            default_snapshot = configured_snapshot_path()
+            if default_snapshot is not None:
+                snapshot_path = default_snapshot.parent / "workspaces" / f"{workspace_id}.snapshot"
+        store = create_store(backend, database_path)
+        coordinator = coordinator_from_env(store, snapshot_path=snapshot_path)
+        return Workspace(
+            workspace_id,
+            store,
+            coordinator,
+            AlertLoopRunner(store, AlertSummaryStore()),
+            snapshot_path=snapshot_path,
+            log_scope=workspace_id,
+        )
+
+
+def _registry_from_env() -> WorkspaceRegistry:
+    budget = os.environ.get("SFBPCA_WORKSPACE_MEMORY_MB")
+    max_workspaces = os.environ.get("SFBPCA_WORKSPACE_MAX")
+    idle_minutes = os.environ.get("SFBPCA_WORKSPACE_IDLE_MINUTES")
+    retention_days = os.environ.get("SFBPCA_WORKSPACE_RETENTION_DAYS")
+    return WorkspaceRegistry(
+        memory_budget=int(float(budget) * 1_048_576) if budget else 0,
+        eviction=(os.environ.get("SFBPCA_WORKSPACE_EVICTION") or "snapshot").strip().lower(),
+        max_workspaces=int(max_workspaces) if max_workspaces else DEFAULT_MAX_WORKSPACES,
+        idle_timeout=float(idle_minutes if idle_minutes else DEFAULT_IDLE_MINUTES) * 60,
+        retention=float(retention_days if retention_days else DEFAULT_RETENTION_DAYS) * 86400,
+    )
+
+
+WORKSPACES = _registry_from_env()
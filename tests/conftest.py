@@ -0,0 +1,192 @@
+"""Shared fixtures: small synthetic Salesforce exports and helpers to import them."""
+
+from __future__ import annotations
+
+import csv
+import io
+import os
+import random
+import shutil
+import tempfile
+from typing import Dict, Iterable, List, Optional
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+# The application singletons and the shared log are set up on import: keep them away from
+# the developer's snapshot and logs.
+os.environ["SFBPCA_SNAPSHOT_PATH"] = ""
+os.environ["SFBPCA_LOG_DIR"] = tempfile.mkdtemp(prefix="sfbpca-logs-")
+
+from new_impl.alert_loop import AlertLoopRunner  # noqa: E402
+from new_impl.alert_summary import AlertSummaryStore  # noqa: E402
+from new_impl.csv_import import CSVImportCoordinator  # noqa: E402
+from new_impl.data_store import SalesforceRelationshipStore  # noqa: E402
+
+Dataset = Dict[str, List[Dict[str, str]]]
+
+ENTITIES = (
+    "accounts",
+    "contacts",
+    "individuals",
+    "account_contact_relations",
+    "contact_point_phones",
+    "contact_point_emails",
+)
+COLUMNS = {
+    "accounts": ["Id", "Name"],
+    "contacts": [
+        "Id",
+        "FirstName",
+        "LastName",
+        "IndividualId",
+        "AccountId",
+        "FiscalCode__c",
+        "VATNumber__c",
+        "MobilePhone",
+        "Phone",
+        "Email",
+        "Company__c",
+    ],
+    "individuals": ["Id", "FirstName", "LastName"],
+    "account_contact_relations": ["Id", "AccountId", "ContactId", "Roles"],
+    "contact_point_phones": ["Id", "ParentId", "TelephoneNumber"],
+    "contact_point_emails": ["Id", "ParentId", "EmailAddress", "Type__c"],
+}
+
+FIRST_NAMES = ["Mario", "Luca", "Anna", "Giulia", "Paolo"]
+LAST_NAMES = ["Rossi", "Bianchi", "Verdi"]
+ROLES = ["Titolare", "Referente SOL-APP", "Amministratore", "", "Titolare;Amministratore"]
+
+
+def sfid(prefix: str, number: int) -> str:
+    return f"{prefix}{number:015d}"
+
+
+def generate_dataset(accounts: int = 120, seed: int = 1) -> Dataset:
+    """Accounts with a few contacts each, sharing names and identifiers so every alert fires."""
+
+    rng = random.Random(seed)
+    data: Dataset = {entity: [] for entity in ENTITIES}
+    contact_number = 0
+    for account_number in range(accounts):
+        account_id = sfid("001", account_number)
+        data["accounts"].append({"Id": account_id, "Name": f"Azienda {account_number}"})
+        for _ in range(rng.randint(0, 6)):
+            contact_id = sfid("003", contact_number)
+            individual_id = sfid("0PK", contact_number) if rng.random() < 0.9 else ""
+            contact_number += 1
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            data["contacts"].append(
+                {
+                    "Id": contact_id,
+                    "FirstName": first,
+                    "LastName": last,
+                    "IndividualId": individual_id,
+                    "AccountId": account_id,
+                    "FiscalCode__c": rng.choice(["", "CF1", "CF2"]),
+                    "VATNumber__c": rng.choice(["", "IVA1"]),
+                    "MobilePhone": rng.choice(["", "333 1234", "+39 333-999"]),
+                    "Phone": rng.choice(["", "02 1234"]),
+                    "Email": rng.choice(["", "a@b.it", "X@Y.it"]),
+                    "Company__c": rng.choice(["", "SIL1"]),
+                }
+            )
+            if individual_id:
+                data["individuals"].append({"Id": individual_id, "FirstName": first, "LastName": last})
+                for _ in range(rng.randint(0, 2)):
+                    data["contact_point_phones"].append(
+                        {
+                            "Id": sfid("0OP", len(data["contact_point_phones"])),
+                            "ParentId": individual_id,
+                            "TelephoneNumber": rng.choice(["3331234", "021234", "555"]),
+                        }
+                    )
+                for _ in range(rng.randint(0, 2)):
+                    data["contact_point_emails"].append(
+                        {
+                            "Id": sfid("9PE", len(data["contact_point_emails"])),
+                            "ParentId": individual_id,
+                            "EmailAddress": rng.choice(["a@b.it", "x@y.it", ""]),
+                            "Type__c": rng.choice(["E-mail SOL", "Altro", ""]),
+                        }
+                    )
+            data["account_contact_relations"].append(
+                {
+                    "Id": sfid("07k", len(data["account_contact_relations"])),
+                    "AccountId": account_id,
+                    "ContactId": contact_id,
+                    "Roles": rng.choice(ROLES),
+                }
+            )
+    return data
+
+
+def csv_bytes(entity: str, rows: Iterable[Dict[str, str]], extra_columns: Iterable[str] = ()) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=[*COLUMNS[entity], *extra_columns], lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue().encode("utf-8-sig")
+
+
+def uploads(data: Dataset, entities: Optional[Iterable[str]] = None) -> Dict[str, FileStorage]:
+    """Form payload with one CSV file per entity, as Werkzeug hands it to the coordinator."""
+
+    return {
+        entity: FileStorage(io.BytesIO(csv_bytes(entity, data[entity])), f"{entity}.csv")
+        for entity in (entities or ENTITIES)
+    }
+
+
+def load_store(data: Dataset, store=None):
+    store = store if store is not None else SalesforceRelationshipStore()
+    CSVImportCoordinator(store).import_payload(uploads(data))
+    return store
+
+
+def store_contents(store) -> Dict[str, object]:
+    """Everything the store answers for each account, as plain dictionaries."""
+
+    def rows(records) -> List[Dict[str, str]]:
+        return sorted((dict(record) for record in records), key=lambda record: record.get("Id", ""))
+
+    contents = {}
+    for account_id in sorted(store.iter_account_ids()):
+        contacts = {}
+        for contact in store.get_contacts_for_account(account_id):
+            points = store.get_contact_points_for_contact(contact["Id"])
+            individual = store.get_individual_for_contact(contact["Id"])
+            contacts[contact["Id"]] = {
+                "contact": dict(contact),
+                "individual": dict(individual) if individual else None,
+                "phones": rows(points["phones"]),
+                "emails": rows(points["emails"]),
+            }
+        contents[account_id] = {
+            "account": dict(store.get_account(account_id)),
+            "relations": rows(store.get_relations_for_account(account_id)),
+            "contacts": contacts,
+        }
+    return contents
+
+
+def run_alerts(store, **options) -> Dict[str, object]:
+    """Full alert run on ``store``; serial and non-incremental unless ``options`` say otherwise."""
+
+    options.setdefault("workers", 1)
+    options.setdefault("engine", "account")
+    options.setdefault("incremental", False)
+    return AlertLoopRunner(store, AlertSummaryStore(), **options).run()
+
+
+@pytest.fixture(scope="session")
+def dataset() -> Dataset:
+    return generate_dataset()
+
+
+@pytest.fixture(autouse=True, scope="session")
+def _remove_logs():
+    yield
+    shutil.rmtree(os.environ["SFBPCA_LOG_DIR"], ignore_errors=True)
+
@@ -0,0 +1,106 @@
+"""The incremental alert loop recomputes only what changed and still matches a full run."""
+
+from __future__ import annotations
+
+import io
+from typing import Dict, List
+
+from werkzeug.datastructures import FileStorage
+
+from new_impl.alert_loop import AlertLoopRunner
+from new_impl.alert_summary import AlertSummaryStore
+from new_impl.csv_import import CSVImportCoordinator
+
+from .conftest import Dataset, csv_bytes, generate_dataset, load_store, run_alerts, sfid
+
+
+def apply_delta(store, entity: str, rows: List[Dict[str, str]]) -> List[str]:
+    payload = {
+        entity: FileStorage(
+            io.BytesIO(csv_bytes(entity, [{**row, "IsDeleted": "false"} for row in rows], ("IsDeleted",))),
+            f"{entity}.csv",
+        )
+    }
+    return CSVImportCoordinator(store).import_delta(payload)["touched_accounts"]
+
+
+def incremental_runner(store) -> AlertLoopRunner:
+    return AlertLoopRunner(store, AlertSummaryStore(), workers=1, engine="account", incremental=True)
+
+
+def assert_matches_full_run(store, results) -> None:
+    expected = run_alerts(store)
+    assert results["details"] == expected["details"]
+    assert results["statistics"] == expected["statistics"]
+
+
+def test_only_changed_accounts_are_recomputed():
+    data = generate_dataset()
+    store = load_store(data)
+    runner = incremental_runner(store)
+    total = len(data["accounts"])
+    assert runner.run()["recomputed_accounts"] == total
+
+    contact = data["contacts"][10]
+    touched = apply_delta(store, "contacts", [{**contact, "LastName": "Neri"}])
+    results = runner.run()
+
+    assert touched and len(touched) < total
+    assert results["recomputed_accounts"] == len(touched)
+    assert_matches_full_run(store, results)
+
+
+def test_new_store_version_without_account_changes_reuses_every_account():
+    data = generate_dataset()
+    store = load_store(data)
+    runner = incremental_runner(store)
+    runner.run()
+
+    # A phone of an individual no contact points to: the version changes, no account does.
+    orphan = {"Id": sfid("0OP", 900000), "ParentId": sfid("0PK", 900000), "TelephoneNumber": "555"}
+    assert apply_delta(store, "contact_point_phones", [orphan]) == []
+    results = runner.run()
+
+    assert results["recomputed_accounts"] == 0
+    assert_matches_full_run(store, results)
+
+
+def first_titolare_relation(data: Dataset) -> Dict[str, str]:
+    accounts = [account["Id"] for account in data["accounts"]]
+    relations = sorted(
+        data["account_contact_relations"], key=lambda relation: accounts.index(relation["AccountId"])
+    )
+    return next(relation for relation in relations if "Titolare" in relation["Roles"].split(";"))
+
+
+def test_role_label_change_invalidates_accounts_that_did_not_change():
+    data = generate_dataset()
+    store = load_store(data)
+    runner = incremental_runner(store)
+    runner.run()
+
+    # The first spelling of a role labels the alerts of every account: respelling it in
+    # the first account changes the alerts of accounts whose own data is untouched.
+    relation = first_titolare_relation(data)
+    touched = apply_delta(
+        store, "account_contact_relations", [{**relation, "Roles": relation["Roles"].replace("Titolare", "TITOLARE")}]
+    )
+    results = runner.run()
+
+    relabelled = {
+        alert["account_id"]
+        for alert in results["details"]
+        if alert["alert_type"] == "Duplicati per ruolo e identificativo" and alert["contact_roles"] == "TITOLARE"
+    }
+    assert relabelled - set(touched)
+    assert results["recomputed_accounts"] == len(data["accounts"])
+    assert_matches_full_run(store, results)
+
+
+def test_clear_summary_drops_the_cached_accounts():
+    store = load_store(generate_dataset())
+    runner = incremental_runner(store)
+    runner.run()
+    runner.clear_summary()
+
+    assert runner.run()["recomputed_accounts"] == len(list(store.iter_account_ids()))
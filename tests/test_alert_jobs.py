@@ -0,0 +1,106 @@
+"""Background alert jobs: polled, paged, cancelled between accounts and trimmed from the history."""
+
+from __future__ import annotations
+
+import time
+
+import pytest
+
+from new_impl import app_factory
+from new_impl.alert_jobs import AlertJob, AlertJobRegistry
+
+from .conftest import generate_dataset, uploads
+
+
+@pytest.fixture
+def client():
+    return app_factory.create_app().test_client()
+
+
+def import_files(client, workspace: str, accounts: int = 40) -> None:
+    response = client.post("/api/import", data={**uploads(generate_dataset(accounts)), "workspace": workspace})
+    assert response.status_code == 200
+
+
+def wait(job: AlertJob) -> None:
+    deadline = time.monotonic() + 30
+    while not job.done:
+        assert time.monotonic() < deadline, f"alert job {job.id} still running"
+        time.sleep(0.01)
+
+
+def test_job_results_are_paged(client):
+    import_files(client, "jobs-paged")
+    query = {"workspace": "jobs-paged"}
+    response = client.post("/api/alerts/jobs", query_string=query)
+    assert response.status_code == 202
+    wait(app_factory.ALERT_JOBS.get(response.get_json()["job"]))
+
+    state = client.get(response.headers["Location"], query_string=query).get_json()
+    assert state["status"] == "completed" and state["processed"] == state["total"] == 40
+    details, offset = [], 0
+    while offset is not None:
+        page = client.get(
+            f"{response.headers['Location']}/results", query_string={**query, "offset": offset, "limit": 25}
+        ).get_json()
+        assert len(page["details"]) <= 25
+        details.extend(page["details"])
+        offset = page["next_offset"]
+
+    assert len(details) == state["alerts"]
+    assert details == client.post("/api/alerts/run", query_string=query).get_json()["details"]
+
+
+def test_running_job_is_cancelled_between_accounts(client):
+    import_files(client, "jobs-cancel")
+    registry = AlertJobRegistry(app_factory.WORKSPACES, workers=1)
+    job = AlertJob("cancel-me", "jobs-cancel")
+    account = job.account
+
+    def cancel_after_three(account_id, alerts):
+        account(account_id, alerts)
+        if job.processed == 3:
+            job.cancel()
+
+    job.account = cancel_after_three
+    registry._run(job)
+
+    assert job.status == "cancelled" and job.processed == 3
+    assert job.to_dict()["cancel_requested"] is True
+    # The cancelled run is neither published nor cached.
+    query = {"workspace": "jobs-cancel"}
+    assert client.get("/api/alerts/results", query_string=query).status_code == 204
+    assert client.post("/api/alerts/run", query_string=query).headers["X-Alert-Cache"] == "miss"
+
+
+def test_queued_job_cancelled_before_it_starts(client):
+    import_files(client, "jobs-queued", accounts=5)
+    job = AlertJob("queued", "jobs-queued")
+    job.cancel()
+
+    AlertJobRegistry(app_factory.WORKSPACES, workers=1)._run(job)
+
+    assert job.status == "cancelled" and job.processed == 0 and job.alerts == []
+
+
+def test_finished_jobs_beyond_the_history_are_dropped(client):
+    import_files(client, "jobs-history", accounts=5)
+    registry = AlertJobRegistry(app_factory.WORKSPACES, history=2, workers=1)
+    jobs = []
+    for _ in range(4):
+        jobs.append(registry.submit("jobs-history"))
+        wait(jobs[-1])
+
+    assert [registry.get(job.id) for job in jobs] == [None, None, jobs[2], jobs[3]]
+
+
+def test_jobs_belong_to_their_workspace(client):
+    import_files(client, "jobs-owner", accounts=5)
+    response = client.post("/api/alerts/jobs", query_string={"workspace": "jobs-owner"})
+    wait(app_factory.ALERT_JOBS.get(response.get_json()["job"]))
+
+    # Asked from the default workspace.
+    assert client.get(response.headers["Location"]).status_code == 404
+    cancelled = client.post(f"{response.headers['Location']}/cancel", query_string={"workspace": "jobs-owner"})
+    # Cancelling a finished job changes nothing.
+    assert cancelled.get_json()["status"] == "completed"
@@ -0,0 +1,138 @@
+"""The alert loop: isolated concurrent runs, engine parity, the fused visitor and cached results."""
+
+from __future__ import annotations
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from new_impl import alert_loop
+from new_impl.alert_engine import run_module_major
+from new_impl.alert_loop import ALERT_MODULES, AlertLoopRunner
+from new_impl.alert_summary import AlertSummaryStore
+from new_impl.alerts import check_contatti_senza_ruolo, visitor
+from new_impl.alerts.visitor import run_single, visit_account
+
+from .conftest import generate_dataset, load_store, run_alerts
+
+
+def test_concurrent_runs_keep_their_own_summary(dataset):
+    store = load_store(dataset)
+    expected = run_alerts(store)
+    runner = AlertLoopRunner(store, AlertSummaryStore(), workers=1, engine="account", incremental=False)
+    results = []
+
+    def run():
+        results.append(runner.run())
+
+    threads = [threading.Thread(target=run) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    # An import published while the runs are going on is only seen by later runs.
+    store.bulk_replace(
+        {entity: rows for entity, rows in generate_dataset(10, seed=2).items() if entity != "accounts"}
+    )
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 3
+    for result in results:
+        assert result["details"] in (expected["details"], run_alerts(store)["details"])
+    assert runner.summary.all_alerts() in [result["details"] for result in results]
+
+
+def per_account(store, modules):
+    return [
+        alert
+        for account_id in store.iter_account_ids()
+        for alerts in visit_account(store.describe_account(account_id), modules)
+        for alert in alerts
+    ]
+
+
+@pytest.mark.parametrize("module", ALERT_MODULES, ids=lambda module: module.__name__.rsplit(".", 1)[-1])
+def test_module_major_engine_matches_the_account_loop(dataset, module):
+    store = load_store(dataset)
+    summary = AlertSummaryStore()
+
+    run_module_major(store, list(store.iter_account_ids()), summary, [module])
+
+    assert summary.all_alerts() == per_account(store, [module])
+
+
+def test_parity_engine_reports_matching_engines(dataset):
+    store = load_store(dataset)
+
+    results = run_alerts(store, engine="parity")
+
+    assert results["engine_parity"] == {"matching": True, "difference": None}
+    assert results["details"] == run_alerts(store)["details"]
+
+
+def test_parity_engine_reports_a_diverging_module(monkeypatch, dataset):
+    store = load_store(dataset)
+    run_batch = check_contatti_senza_ruolo.run_batch
+
+    def lossy(scan, *, store, emit):
+        emitted = []
+        run_batch(scan, store=store, emit=lambda index, alert: emitted.append((index, alert)))
+        for index, alert in emitted[1:]:
+            emit(index, alert)
+
+    monkeypatch.setattr(check_contatti_senza_ruolo, "run_batch", lossy)
+
+    parity = run_alerts(store, engine="parity")["engine_parity"]
+
+    assert parity["matching"] is False and parity["difference"]
+
+
+def test_fused_visit_matches_each_module_run_alone(dataset):
+    store = load_store(dataset)
+
+    for account_id in store.iter_account_ids():
+        fused = visit_account(store.describe_account(account_id), ALERT_MODULES)
+        for module, alerts in zip(ALERT_MODULES, fused):
+            alone = AlertSummaryStore()
+            run_single(module, store.describe_account(account_id), summary=alone)
+            assert alerts == alone.all_alerts()
+
+
+def test_contacts_are_visited_once_for_every_module(monkeypatch, dataset):
+    store = load_store(dataset)
+    states = []
+    contact_state = visitor.ContactState
+    monkeypatch.setattr(
+        visitor, "ContactState", lambda contact, store: states.append(contact) or contact_state(contact, store)
+    )
+    account_id = max(store.iter_account_ids(), key=lambda account: len(store.get_relations_for_account(account)))
+    legacy = SimpleNamespace(run=lambda context, *, summary: summary.record({"account_id": context.account_id}))
+
+    alerts = visit_account(store.describe_account(account_id), [*ALERT_MODULES, legacy])
+
+    assert len(states) == len(store.get_contacts_for_account(account_id))
+    # Modules with only ``run`` keep working next to the visitor ones.
+    assert alerts[-1] == [{"account_id": account_id}]
+
+
+def test_results_are_cached_until_the_store_or_the_modules_change(monkeypatch, dataset):
+    store = load_store(dataset)
+    runner = AlertLoopRunner(store, AlertSummaryStore(), workers=1, engine="account", incremental=False)
+    first, cached = runner.execute()
+    assert not cached
+
+    renders = []
+    assert first.artifact("csv", lambda: renders.append(1) or b"csv") == b"csv"
+    again, cached = runner.execute()
+    assert cached and again is first
+    assert again.artifact("csv", lambda: renders.append(1) or b"other") == b"csv" and len(renders) == 1
+
+    store.bulk_replace({"accounts": dataset["accounts"]})
+    after_import, cached = runner.execute()
+    assert not cached and after_import.etag != first.etag
+    assert after_import.results["details"] == first.results["details"]
+
+    monkeypatch.setattr(alert_loop, "MODULE_SIGNATURE", "modules changed")
+    assert runner.execute()[1] is False
+    # Runs limited to some accounts are never served from the cache.
+    assert runner.execute([dataset["accounts"][0]["Id"]])[1] is False
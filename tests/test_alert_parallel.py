@@ -0,0 +1,93 @@
+"""Alert runs split across forked workers return exactly what a serial run returns."""
+
+from __future__ import annotations
+
+import multiprocessing
+
+import pytest
+
+from new_impl import alert_loop
+from new_impl.alert_loop import AlertLoopRunner
+from new_impl.alert_summary import AlertSummaryStore
+
+from .conftest import Dataset, generate_dataset, load_store, run_alerts
+
+pytestmark = pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(), reason="parallel alert runs need fork"
+)
+
+ROLE_ALERT = "Duplicati per ruolo e identificativo"
+SPELLINGS = ("titolare", "TITOLARE", "Titolare")
+
+
+def assert_same_results(results, expected) -> None:
+    assert results["details"] == expected["details"]
+    assert results["statistics"] == expected["statistics"]
+
+
+def varied_roles(data: Dataset) -> Dataset:
+    """Spell "Titolare" differently from one relation to the next, lowercase first."""
+
+    relations = []
+    spellings = 0
+    for relation in data["account_contact_relations"]:
+        if "Titolare" in relation["Roles"]:
+            spelling = SPELLINGS[spellings % len(SPELLINGS)]
+            relation = {**relation, "Roles": relation["Roles"].replace("Titolare", spelling)}
+            spellings += 1
+        relations.append(relation)
+    return {**data, "account_contact_relations": relations}
+
+
+def test_runs_are_split_into_several_shards(dataset):
+    store = load_store(dataset)
+    runner = AlertLoopRunner(store, AlertSummaryStore(), workers=2)
+
+    assert len(runner._shards(list(store.iter_account_ids()))) > 1
+
+
+@pytest.mark.parametrize("engine", ["account", "module"])
+def test_parallel_run_matches_serial_run(dataset, engine):
+    store = load_store(dataset)
+
+    assert_same_results(run_alerts(store, engine=engine, workers=2), run_alerts(store, engine=engine))
+
+
+def test_role_labels_are_shared_by_every_shard():
+    store = load_store(varied_roles(generate_dataset()))
+    serial = run_alerts(store)
+
+    labels = {
+        alert["contact_roles"]
+        for alert in serial["details"]
+        if alert["alert_type"] == ROLE_ALERT and alert["contact_roles"].lower() == "titolare"
+    }
+    # Accounts in later shards still use the spelling of the first account.
+    assert labels == {"titolare"}
+    assert_same_results(run_alerts(store, workers=2), serial)
+    assert_same_results(run_alerts(store, engine="module", workers=2), serial)
+
+
+class RecyclingContext:
+    """Fork context whose pools replace each worker after one shard."""
+
+    def __init__(self, context) -> None:
+        self.context = context
+
+    def Pool(self, *args, **kwargs):
+        return self.context.Pool(*args, maxtasksperchild=1, **kwargs)
+
+
+def test_replacement_workers_get_the_run_state(monkeypatch):
+    # Replacements are forked by the pool's own thread, after the pool has been created.
+    store = load_store(varied_roles(generate_dataset(accounts=300)))
+    serial = run_alerts(store)
+    get_context = multiprocessing.get_context
+    monkeypatch.setattr(
+        alert_loop.multiprocessing, "get_context", lambda method: RecyclingContext(get_context(method))
+    )
+    runner = AlertLoopRunner(store, AlertSummaryStore(), workers=2, engine="account", incremental=False)
+
+    assert len(runner._shards(list(store.iter_account_ids()))) > 2
+    assert_same_results(runner.run(), serial)
+
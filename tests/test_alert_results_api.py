@@ -0,0 +1,67 @@
+"""Alert results over HTTP: cached runs, ETags and conditional requests."""
+
+from __future__ import annotations
+
+import pytest
+
+from new_impl import app_factory
+
+from .conftest import generate_dataset, uploads
+
+
+@pytest.fixture
+def client():
+    return app_factory.create_app().test_client()
+
+
+def import_files(client, workspace: str, accounts: int = 30) -> None:
+    response = client.post("/api/import", data={**uploads(generate_dataset(accounts)), "workspace": workspace})
+    assert response.status_code == 200
+
+
+def test_post_run_always_returns_the_body(client):
+    import_files(client, "etag-post")
+    first = client.post("/api/alerts/run", query_string={"workspace": "etag-post"})
+    second = client.post(
+        "/api/alerts/run", query_string={"workspace": "etag-post"}, headers={"If-None-Match": first.headers["ETag"]}
+    )
+
+    assert second.status_code == 200
+    assert second.headers["X-Alert-Cache"] == "hit"
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert second.get_json()["details"] == first.get_json()["details"]
+
+
+def test_get_results_honours_if_none_match(client):
+    import_files(client, "etag-get")
+    etag = client.post("/api/alerts/run", query_string={"workspace": "etag-get"}).headers["ETag"]
+
+    conditional = client.get(
+        "/api/alerts/results", query_string={"workspace": "etag-get"}, headers={"If-None-Match": etag}
+    )
+    assert conditional.status_code == 304
+    assert conditional.data == b""
+    assert client.get("/api/alerts/results", query_string={"workspace": "etag-get"}).status_code == 200
+
+
+def test_import_invalidates_the_cached_results(client):
+    import_files(client, "etag-import")
+    query = {"workspace": "etag-import"}
+    first = client.post("/api/alerts/run", query_string=query)
+    download = client.get("/api/alerts/download", query_string={**query, "format": "csv"})
+    assert client.get(
+        "/api/alerts/download",
+        query_string={**query, "format": "csv"},
+        headers={"If-None-Match": download.headers["ETag"]},
+    ).status_code == 304
+
+    # Re-importing identical files changes nothing: the cache only goes when the data does.
+    import_files(client, "etag-import")
+    assert client.post("/api/alerts/run", query_string=query).headers["X-Alert-Cache"] == "hit"
+    import_files(client, "etag-import", accounts=31)
+    second = client.post("/api/alerts/run", query_string=query)
+
+    assert first.headers["X-Alert-Cache"] == second.headers["X-Alert-Cache"] == "miss"
+    assert second.headers["ETag"] != first.headers["ETag"]
+    stale = client.get("/api/alerts/results", query_string=query, headers={"If-None-Match": first.headers["ETag"]})
+    assert stale.status_code == 200
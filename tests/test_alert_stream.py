@@ -0,0 +1,72 @@
+"""Streamed alert runs send every alert of the run, progress events and the statistics last."""
+
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from new_impl import app_factory
+
+from .conftest import generate_dataset, uploads
+
+ACCOUNTS = 40
+
+
+@pytest.fixture
+def client():
+    return app_factory.create_app().test_client()
+
+
+def import_files(client, workspace: str) -> None:
+    response = client.post("/api/import", data={**uploads(generate_dataset(ACCOUNTS)), "workspace": workspace})
+    assert response.status_code == 200
+
+
+def ndjson_events(client, workspace: str):
+    response = client.post("/api/alerts/run/stream", query_string={"workspace": workspace})
+    assert response.mimetype == "application/x-ndjson"
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def streamed_alerts(events):
+    return [alert for event in events if event["event"] == "alerts" for alert in event["alerts"]]
+
+
+def test_ndjson_stream_carries_the_whole_run(client):
+    import_files(client, "stream-ndjson")
+    events = ndjson_events(client, "stream-ndjson")
+
+    assert events[0]["event"] == "start" and events[0]["total"] == ACCOUNTS
+    assert events[-1]["event"] == "done" and events[-1]["cached"] is False
+    progress = [event for event in events if event["event"] == "progress"]
+    assert progress and progress[-1]["processed"] == progress[-1]["total"] == ACCOUNTS
+    assert all(event["elapsed"] >= 0 for event in progress)
+
+    results = client.post("/api/alerts/run", query_string={"workspace": "stream-ndjson"}).get_json()
+    assert streamed_alerts(events) == results["details"]
+    assert events[-1]["statistics"] == results["statistics"]
+    assert "details" not in events[-1]
+
+
+def test_cached_run_is_streamed_again(client):
+    import_files(client, "stream-cached")
+    first = ndjson_events(client, "stream-cached")
+    second = ndjson_events(client, "stream-cached")
+
+    assert second[-1]["cached"] is True
+    assert streamed_alerts(second) == streamed_alerts(first)
+
+
+def test_server_sent_events_name_each_event(client):
+    import_files(client, "stream-sse")
+    response = client.post(
+        "/api/alerts/run/stream", query_string={"workspace": "stream-sse"}, headers={"Accept": "text/event-stream"}
+    )
+
+    assert response.mimetype == "text/event-stream"
+    blocks = [block for block in response.get_data(as_text=True).split("\n\n") if block]
+    for block in blocks:
+        name, data = block.split("\n")
+        assert name == f"event: {json.loads(data.removeprefix('data: '))['event']}"
+    assert blocks[0].startswith("event: start") and blocks[-1].startswith("event: done")
@@ -0,0 +1,83 @@
+"""Browse endpoints page through the imported store with opaque cursors and prefix search."""
+
+from __future__ import annotations
+
+import pytest
+
+from new_impl import app_factory
+from new_impl.normalization import normalise_name
+
+from .conftest import generate_dataset, uploads
+
+WORKSPACE = "browse"
+DATA = generate_dataset(60)
+
+
+@pytest.fixture(scope="module")
+def client():
+    client = app_factory.create_app().test_client()
+    response = client.post("/api/import", data={**uploads(DATA), "workspace": WORKSPACE})
+    assert response.status_code == 200
+    return client
+
+
+def walk(client, url: str, **params):
+    """Every item of ``url``, one page at a time, and the number of pages read."""
+
+    items, pages, cursor = [], 0, None
+    while True:
+        query = {"workspace": WORKSPACE, **params, **({"cursor": cursor} if cursor else {})}
+        page = client.get(url, query_string=query).get_json()
+        assert len(page["items"]) <= params.get("limit", 50)
+        items.extend(page["items"])
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return items, pages
+
+
+def test_accounts_are_paged_by_name(client):
+    items, pages = walk(client, "/api/browse/accounts", limit=7)
+
+    expected = sorted((account["Name"].lower(), account["Id"]) for account in DATA["accounts"])
+    assert [(item["Name"].lower(), item["Id"]) for item in items] == expected
+    assert pages == -(-len(expected) // 7)
+
+
+def test_prefix_search_on_account_and_contact_names(client):
+    items, _pages = walk(client, "/api/browse/accounts", prefix="AZIENDA 1", limit=4)
+    assert sorted(item["Name"] for item in items) == sorted(
+        account["Name"] for account in DATA["accounts"] if account["Name"].startswith("Azienda 1")
+    )
+
+    items, _pages = walk(client, "/api/browse/contacts", prefix="anna r", limit=10)
+    assert sorted(item["Id"] for item in items) == sorted(
+        contact["Id"] for contact in DATA["contacts"] if normalise_name(contact) == "anna rossi"
+    )
+
+
+def test_contacts_and_contact_points_of_one_record(client):
+    account_id = DATA["accounts"][0]["Id"]
+    relations = [row for row in DATA["account_contact_relations"] if row["AccountId"] == account_id]
+    items, _pages = walk(client, f"/api/browse/accounts/{account_id}/contacts", limit=2)
+    assert relations
+    assert sorted((item["Id"], item["RelationId"], item["Roles"]) for item in items) == sorted(
+        (row["ContactId"], row["Id"], row["Roles"]) for row in relations
+    )
+
+    individual_id = DATA["contact_point_emails"][0]["ParentId"]
+    items, _pages = walk(client, f"/api/browse/individuals/{individual_id}/contact-points", limit=1)
+    expected = [
+        (kind, row["Id"])
+        for kind in ("emails", "phones")
+        for row in DATA[f"contact_point_{kind}"]
+        if row["ParentId"] == individual_id
+    ]
+    assert [(item["kind"], item["Id"]) for item in items] == expected
+
+
+def test_invalid_requests_are_rejected(client):
+    query = {"workspace": WORKSPACE}
+    assert client.get("/api/browse/accounts/001missing/contacts", query_string=query).status_code == 404
+    assert client.get("/api/browse/accounts", query_string={**query, "limit": 0}).status_code == 400
+    assert client.get("/api/browse/accounts", query_string={**query, "cursor": "%%%"}).status_code == 400
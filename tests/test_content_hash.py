@@ -0,0 +1,150 @@
+"""Files identical to the last import of their entity are skipped, loose or inside a zip."""
+
+from __future__ import annotations
+
+import gzip
+import io
+import zipfile
+from typing import Dict
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from new_impl import csv_import
+from new_impl.csv_import import ARCHIVES_UPLOAD, CSVImportCoordinator
+from new_impl.data_store import SalesforceRelationshipStore
+
+from .conftest import ENTITIES, Dataset, csv_bytes, generate_dataset, uploads
+
+
+def statuses(summary: Dict[str, Dict[str, object]]) -> Dict[str, object]:
+    return {entity: details["status"] for entity, details in summary.items()}
+
+
+def archive_upload(data: Dataset) -> Dict[str, list]:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for entity in ENTITIES:
+            archive.writestr(f"{entity}.csv", csv_bytes(entity, data[entity]))
+    buffer.seek(0)
+    return {ARCHIVES_UPLOAD: [FileStorage(buffer, "export.zip")]}
+
+
+def test_identical_files_are_not_parsed_again():
+    data = generate_dataset()
+    store = SalesforceRelationshipStore()
+    coordinator = CSVImportCoordinator(store)
+    first = coordinator.import_payload(uploads(data))
+    version = store.version
+
+    second = coordinator.import_payload(uploads(data))
+
+    assert set(statuses(first).values()) == {"imported"}
+    assert set(statuses(second).values()) == {"unchanged"}
+    assert second["contacts"]["records"] == first["contacts"]["records"]
+    assert store.version == version
+
+
+def test_changed_file_is_imported_and_the_others_skipped():
+    data = generate_dataset()
+    store = SalesforceRelationshipStore()
+    coordinator = CSVImportCoordinator(store)
+    coordinator.import_payload(uploads(data))
+
+    data["accounts"][0] = {**data["accounts"][0], "Name": "Azienda rinominata"}
+    summary = statuses(coordinator.import_payload(uploads(data)))
+
+    assert summary.pop("accounts") == "imported"
+    assert set(summary.values()) == {"unchanged"}
+    assert store.get_account(data["accounts"][0]["Id"])["Name"] == "Azienda rinominata"
+
+
+def test_zip_members_are_hashed_on_their_content():
+    data = generate_dataset()
+    store = SalesforceRelationshipStore()
+    coordinator = CSVImportCoordinator(store)
+    coordinator.import_payload(archive_upload(data))
+    assert set(statuses(coordinator.import_payload(archive_upload(data))).values()) == {"unchanged"}
+
+    # Same length and same columns: only the bytes of the member tell the two files apart.
+    contact = data["contacts"][0]
+    data["contacts"][0] = {**contact, "LastName": contact["LastName"][::-1]}
+    summary = statuses(coordinator.import_payload(archive_upload(data)))
+
+    assert summary.pop("contacts") == "imported"
+    assert set(summary.values()) == {"unchanged"}
+    contacts = {row["Id"]: row for row in store.get_contacts_for_account(contact["AccountId"])}
+    assert contacts[contact["Id"]]["LastName"] == contact["LastName"][::-1]
+
+
+def test_delta_and_forget_imports_invalidate_the_fingerprints():
+    data = generate_dataset()
+    coordinator = CSVImportCoordinator(SalesforceRelationshipStore())
+    coordinator.import_payload(uploads(data))
+
+    row = {**data["accounts"][0], "IsDeleted": "false"}
+    delta = FileStorage(io.BytesIO(csv_bytes("accounts", [row], ("IsDeleted",))), "accounts.csv")
+    coordinator.import_delta({"accounts": delta})
+    summary = statuses(coordinator.import_payload(uploads(data)))
+    assert summary.pop("accounts") == "imported"
+    assert set(summary.values()) == {"unchanged"}
+
+    coordinator.forget_imports()
+    assert set(statuses(coordinator.import_payload(uploads(data))).values()) == {"imported"}
+
+
+def test_zip_of_the_imported_files_is_unchanged():
+    # The fingerprint covers the CSV bytes, not the archive: zipping the same files changes nothing.
+    data = generate_dataset()
+    coordinator = CSVImportCoordinator(SalesforceRelationshipStore())
+    coordinator.import_payload(uploads(data))
+
+    assert set(statuses(coordinator.import_payload(archive_upload(data))).values()) == {"unchanged"}
+
+
+def gzip_uploads(data: Dataset) -> Dict[str, FileStorage]:
+    compressed = {entity: gzip.compress(csv_bytes(entity, data[entity]), mtime=0) for entity in ENTITIES}
+    return {entity: FileStorage(io.BytesIO(content), f"{entity}.gz") for entity, content in compressed.items()}
+
+
+@pytest.fixture
+def pre_hashed(monkeypatch):
+    """Uploads hashed in a separate pass before parsing."""
+
+    calls = []
+    content_digest = csv_import._content_digest
+
+    def counting(upload, kept_columns):
+        calls.append(upload)
+        return content_digest(upload, kept_columns)
+
+    monkeypatch.setattr(csv_import, "_content_digest", counting)
+    return calls
+
+
+@pytest.mark.parametrize("parse_mode", ["serial", "thread", "process"])
+@pytest.mark.parametrize("payload", [uploads, gzip_uploads, archive_upload], ids=["csv", "gzip", "zip"])
+def test_fingerprint_taken_while_parsing_matches_the_one_taken_before(pre_hashed, parse_mode, payload):
+    data = generate_dataset()
+    coordinator = CSVImportCoordinator(SalesforceRelationshipStore(), parse_mode=parse_mode)
+
+    # First import: nothing to compare with, the files are hashed while they are parsed.
+    coordinator.import_payload(payload(data))
+    assert pre_hashed == []
+
+    assert set(statuses(coordinator.import_payload(payload(data))).values()) == {"unchanged"}
+    assert len(pre_hashed) == len(ENTITIES)
+
+
+def test_file_of_a_different_size_is_not_read_twice(pre_hashed):
+    data = generate_dataset()
+    coordinator = CSVImportCoordinator(SalesforceRelationshipStore())
+    coordinator.import_payload(uploads(data))
+    pre_hashed.clear()
+
+    data["accounts"][0] = {**data["accounts"][0], "Name": "Azienda con un nome più lungo"}
+    assert coordinator.import_payload(uploads(data))["accounts"]["status"] == "imported"
+    assert len(pre_hashed) == len(ENTITIES) - 1
+    # The fingerprint taken while parsing still lets the next identical upload be skipped.
+    assert coordinator.import_payload(uploads(data))["accounts"]["status"] == "unchanged"
+
@@ -0,0 +1,138 @@
+"""The CSV importer: streamed decoding, staging, parallel parsing and column projection."""
+
+from __future__ import annotations
+
+import gzip
+import io
+import zipfile
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from new_impl.csv_import import ARCHIVES_UPLOAD, CSVImportCoordinator
+from new_impl.data_store import SalesforceRelationshipStore
+
+from .conftest import ENTITIES, csv_bytes, load_store, sfid, store_contents, uploads
+
+
+class TrickleStream(io.RawIOBase):
+    """Non-seekable upload that hands out a few bytes per read, splitting multi-byte characters."""
+
+    def __init__(self, content: bytes, chunk: int = 5) -> None:
+        self.content = content
+        self.position = 0
+        self.chunk = chunk
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.content[self.position : self.position + min(self.chunk, len(buffer))]
+        buffer[: len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+
+def accounts_upload(content: bytes) -> FileStorage:
+    return FileStorage(io.BufferedReader(TrickleStream(content), buffer_size=8), "accounts.csv")
+
+
+def test_upload_is_decoded_incrementally():
+    names = ["Società Ù", "Caffè Ω", "Zoë – ß"]
+    rows = [{"Id": sfid("001", number), "Name": name} for number, name in enumerate(names)]
+    store = SalesforceRelationshipStore()
+
+    upload = accounts_upload(csv_bytes("accounts", rows))
+    summary = CSVImportCoordinator(store).import_payload({"accounts": upload})
+
+    assert summary["accounts"]["records"] == 3
+    # The byte-order mark is dropped and no character is broken across reads.
+    assert [store.get_account(row["Id"])["Name"] for row in rows] == names
+
+
+def test_header_is_validated_from_the_first_line():
+    content = "\ufeff Id , Name \n\n001000000000001, Azienda \n".encode("utf-8")
+    store = SalesforceRelationshipStore()
+    CSVImportCoordinator(store).import_payload({"accounts": accounts_upload(content)})
+    assert store.get_account("001000000000001")["Name"] == "Azienda"
+
+    with pytest.raises(ValueError, match="Name"):
+        CSVImportCoordinator(store).import_payload({"accounts": accounts_upload(b"Id,Nome\n1,x\n")})
+
+
+@pytest.mark.parametrize("parse_mode", ["thread", "process"])
+def test_parallel_parsing_matches_serial_parsing(dataset, parse_mode):
+    serial = load_store(dataset)
+    store = SalesforceRelationshipStore()
+
+    summary = CSVImportCoordinator(store, parse_mode=parse_mode, max_workers=3).import_payload(uploads(dataset))
+
+    assert store_contents(store) == store_contents(serial)
+    assert {entity: details["records"] for entity, details in summary.items()} == {
+        entity: len(dataset[entity]) for entity in ENTITIES
+    }
+    assert all(details["parse_seconds"] >= 0 for details in summary.values())
+
+
+def test_undeclared_columns_are_dropped_at_parse_time(dataset):
+    wide = ("Description", "OwnerId", "LastModifiedDate")
+    values = {"Description": "nota", "OwnerId": "005", "LastModifiedDate": "2024-01-01"}
+    contacts = [{**row, **values} for row in dataset["contacts"]]
+    payload = uploads(dataset)
+    payload["contacts"] = FileStorage(io.BytesIO(csv_bytes("contacts", contacts, wide)), "contacts.csv")
+    store = SalesforceRelationshipStore()
+
+    summary = CSVImportCoordinator(store, extra_columns={"contacts": ["OwnerId"]}).import_payload(payload)
+
+    assert summary["contacts"]["dropped_columns"] == 2
+    assert summary["accounts"]["dropped_columns"] == 0
+    contact = store.get_contacts_for_account(dataset["contacts"][0]["AccountId"])[0]
+    assert contact["OwnerId"] == "005"
+    assert "AccountId" in contact
+    assert "Description" not in contact and "LastModifiedDate" not in contact
+
+
+def zipped(files) -> io.BytesIO:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    buffer.seek(0)
+    return buffer
+
+
+def test_compressed_uploads_import_like_plain_files(dataset):
+    content = {entity: csv_bytes(entity, dataset[entity]) for entity in ENTITIES}
+    export = zipped(
+        {
+            "export/relazioni.csv": content["account_contact_relations"],
+            "export/telefoni.csv": content["contact_point_phones"],
+            "export/email.csv": content["contact_point_emails"],
+            "export/note.csv": b"Titolo,Testo\nx,y\n",
+            "export/README.txt": b"ignored",
+        }
+    )
+    payload = {
+        "accounts": FileStorage(io.BytesIO(gzip.compress(content["accounts"])), "accounts.csv.gz"),
+        # A zip in an entity field gives that entity the member with its columns.
+        "contacts": FileStorage(
+            zipped({"individui.csv": content["individuals"], "contatti.csv": content["contacts"]}), "contacts.zip"
+        ),
+        "individuals": FileStorage(io.BytesIO(content["individuals"]), "individuals.csv"),
+        ARCHIVES_UPLOAD: [FileStorage(export, "export.zip")],
+    }
+    store = SalesforceRelationshipStore()
+
+    summary = CSVImportCoordinator(store).import_payload(payload)
+
+    assert {entity: details["records"] for entity, details in summary.items()} == {
+        entity: len(dataset[entity]) for entity in ENTITIES
+    }
+    assert store_contents(store) == store_contents(load_store(dataset))
+
+
+def test_archive_without_csv_files_is_rejected():
+    archive = FileStorage(zipped({"README.txt": b"nothing here"}), "export.zip")
+
+    with pytest.raises(ValueError, match="non contiene file CSV"):
+        CSVImportCoordinator(SalesforceRelationshipStore()).import_payload({ARCHIVES_UPLOAD: [archive]})
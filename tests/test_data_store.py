@@ -0,0 +1,144 @@
+"""The in-memory relationship store: staged imports, compact rows, indexes and pinned reads."""
+
+from __future__ import annotations
+
+import pickle
+import threading
+
+import pytest
+
+from new_impl.csv_import import CSVImportCoordinator
+from new_impl.data_store import ContactView, SalesforceRelationshipStore
+from new_impl.records import Record, schema_for
+from new_impl.sqlite_store import SQLiteRelationshipStore
+
+from .conftest import generate_dataset, load_store, uploads
+
+
+def test_bulk_replace_rebuilds_only_the_dependent_indexes(monkeypatch, dataset):
+    store = load_store(dataset)
+    version = store.version
+    built = []
+
+    def counting(entity, original):
+        return staticmethod(lambda staged: built.append(entity) or original(staged))
+
+    for entity, builder in SalesforceRelationshipStore._INDEX_BUILDERS.items():
+        monkeypatch.setattr(
+            SalesforceRelationshipStore, builder, counting(entity, getattr(SalesforceRelationshipStore, builder))
+        )
+
+    store.bulk_replace({"contact_point_phones": dataset["contact_point_phones"], "accounts": dataset["accounts"]})
+
+    assert sorted(built) == ["accounts", "contact_point_phones"]
+    assert store.version == version + 1
+
+
+def test_failed_bulk_replace_publishes_nothing(dataset):
+    store = load_store(dataset)
+    version = store.version
+    account_id = dataset["accounts"][0]["Id"]
+
+    def broken_rows():
+        yield {**dataset["accounts"][0], "Name": "Mai pubblicato"}
+        raise RuntimeError("upload interrupted")
+
+    with pytest.raises(RuntimeError):
+        store.bulk_replace({"contacts": [], "accounts": broken_rows()})
+
+    assert store.version == version
+    assert store.get_account(account_id)["Name"] == dataset["accounts"][0]["Name"]
+    assert store.get_contacts_for_account(account_id)
+
+
+def test_invalid_file_leaves_the_whole_upload_unpublished(dataset):
+    store = load_store(dataset)
+    version = store.version
+    changed = generate_dataset(accounts=10, seed=2)
+    payload = uploads(changed)
+    payload["contact_point_emails"].stream.seek(0)
+    payload["contact_point_emails"].stream.write(b"Nope")
+
+    with pytest.raises(ValueError):
+        CSVImportCoordinator(store).import_payload(payload)
+
+    assert store.version == version
+    assert len(list(store.iter_account_ids())) == len(dataset["accounts"])
+
+
+def test_records_read_like_dictionaries():
+    row = {"Id": "003A", "Roles": "Titolare", "Email": ""}
+    record = Record.from_mapping(row)
+
+    assert record == row and dict(record) == row
+    assert record["Roles"] == "Titolare" and record.get("Phone", "-") == "-"
+    assert "Email" in record and "Phone" not in record
+    assert Record.from_mapping(record) is record
+    # Unpickled rows go back to the schema shared by their file.
+    assert pickle.loads(pickle.dumps(record))._schema is schema_for(row)
+
+
+def test_imported_rows_share_their_schema_and_repeated_values(dataset):
+    store = load_store(dataset)
+    relations = list(store.account_contact_relations)
+
+    assert all(isinstance(relation, Record) for relation in relations)
+    assert len({id(relation._schema) for relation in relations}) == 1
+    titolari = [relation["Roles"] for relation in relations if relation["Roles"] == "Titolare"]
+    assert len(titolari) > 1
+    assert len({id(role) for role in titolari}) == 1
+
+
+def busy_account(store) -> str:
+    return max(store.iter_account_ids(), key=lambda account_id: len(store.get_relations_for_account(account_id)))
+
+
+def test_account_context_references_the_store_records(dataset):
+    store = load_store(dataset)
+    account_id = busy_account(store)
+
+    context = store.describe_account(account_id)
+
+    assert context.account is store.accounts[account_id]
+    assert context._contacts is None and context._contact_index is None
+    contact = context.contacts[0]
+    assert isinstance(contact, ContactView)
+    assert contact._contact is store.contacts[contact["Id"]]
+    assert contact["_relation"] is context.relations[0]
+    assert dict(contact) == {**store.contacts[contact["Id"]], "_relation": context.relations[0]}
+    assert context.contact_index[contact["Id"]] is contact
+
+
+def test_contact_points_are_views_over_the_store_rows(dataset):
+    store = load_store(dataset)
+    individual_id = dataset["contact_point_phones"][0]["ParentId"]
+    contact_id = next(row["Id"] for row in dataset["contacts"] if row["IndividualId"] == individual_id)
+
+    phones = store.get_contact_points_for_contact(contact_id)["phones"]
+
+    stored = {id(row) for row in store.contact_point_phones}
+    assert phones and all(id(phone) in stored for phone in phones)
+    with pytest.raises(TypeError):
+        phones[0]["TelephoneNumber"] = "000"
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_pinned_reads_ignore_a_concurrent_import(tmp_path, dataset, backend):
+    store = SQLiteRelationshipStore(tmp_path / "store.sqlite3") if backend == "sqlite" else None
+    store = load_store(dataset, store)
+    account_id = dataset["accounts"][0]["Id"]
+    renamed = [{**dataset["accounts"][0], "Name": "Azienda rinominata"}]
+
+    with store.pinned() as version:
+        importer = threading.Thread(target=store.bulk_replace, args=({"accounts": renamed},))
+        importer.start()
+        importer.join()
+        assert store.version == version
+        assert store.get_account(account_id)["Name"] == dataset["accounts"][0]["Name"]
+        assert len(list(store.iter_account_ids())) == len(dataset["accounts"])
+
+    assert store.version > version
+    assert store.get_account(account_id)["Name"] == "Azienda rinominata"
+    assert list(store.iter_account_ids()) == [account_id]
+    if backend == "sqlite":
+        store.close()
@@ -0,0 +1,149 @@
+"""Delta imports must leave the store exactly as a full import of the merged files would."""
+
+from __future__ import annotations
+
+import io
+import random
+from typing import Dict, List, Tuple
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from new_impl.csv_import import DELETIONS_UPLOAD, CSVImportCoordinator
+from new_impl.data_store import SalesforceRelationshipStore
+from new_impl.sqlite_store import SQLiteRelationshipStore
+
+from .conftest import ENTITIES, Dataset, csv_bytes, generate_dataset, load_store, run_alerts, sfid
+
+# Fields rewritten by the delta, per entity.
+CHANGES = {
+    "accounts": ("Name", lambda row: row["Name"] + " mod"),
+    "contacts": ("LastName", lambda row: "Neri"),
+    "individuals": ("LastName", lambda row: "Neri"),
+    "account_contact_relations": ("Roles", lambda row: "Amministratore"),
+    "contact_point_phones": ("TelephoneNumber", lambda row: "9999"),
+    "contact_point_emails": ("EmailAddress", lambda row: "nuovo@b.it"),
+}
+
+
+def make_delta(data: Dataset, share: float, seed: int = 3) -> Tuple[Dataset, List[str]]:
+    """Rewrite, flag as deleted and add rows; also delete a few Ids through the deletions file."""
+
+    rng = random.Random(seed)
+    upserts: Dataset = {entity: [] for entity in ENTITIES}
+    for entity in ENTITIES:
+        field, change = CHANGES[entity]
+        for row in rng.sample(data[entity], max(1, int(len(data[entity]) * share))):
+            flagged = rng.random() < 0.2
+            upserts[entity].append(
+                {**row, field: row[field] if flagged else change(row), "IsDeleted": "true" if flagged else "false"}
+            )
+
+    # New contact, with its individual, phone and relation, on an existing account.
+    account_id = data["accounts"][5]["Id"]
+    contact_id, individual_id = sfid("003", 900000), sfid("0PK", 900000)
+    upserts["contacts"].append(
+        {
+            **data["contacts"][0],
+            "Id": contact_id,
+            "IndividualId": individual_id,
+            "AccountId": account_id,
+            "IsDeleted": "false",
+        }
+    )
+    upserts["individuals"].append({"Id": individual_id, "FirstName": "Anna", "LastName": "Neri", "IsDeleted": "false"})
+    upserts["contact_point_phones"].append(
+        {"Id": sfid("0OP", 900000), "ParentId": individual_id, "TelephoneNumber": "3331234", "IsDeleted": "false"}
+    )
+    upserts["account_contact_relations"].append(
+        {
+            "Id": sfid("07k", 900000),
+            "AccountId": account_id,
+            "ContactId": contact_id,
+            "Roles": "Titolare",
+            "IsDeleted": "false",
+        }
+    )
+    deleted = [data["accounts"][7]["Id"], data["contacts"][3]["Id"], data["account_contact_relations"][11]["Id"]]
+    return upserts, deleted
+
+
+def merge(data: Dataset, upserts: Dataset, deleted: List[str]) -> Dataset:
+    """The files a full export would contain after the delta: rows keep their position, new ones go last."""
+
+    removed = set(deleted)
+    for rows in upserts.values():
+        removed.update(row["Id"] for row in rows if row["IsDeleted"] == "true")
+    merged: Dataset = {}
+    for entity in ENTITIES:
+        rows: Dict[str, Dict[str, str]] = {row["Id"]: row for row in data[entity]}
+        for row in upserts[entity]:
+            if row["IsDeleted"] != "true":
+                rows[row["Id"]] = {key: value for key, value in row.items() if key != "IsDeleted"}
+        merged[entity] = [row for row_id, row in rows.items() if row_id not in removed]
+    return merged
+
+
+def delta_payload(upserts: Dataset, deleted: List[str]) -> Dict[str, FileStorage]:
+    payload = {
+        entity: FileStorage(io.BytesIO(csv_bytes(entity, rows, ("IsDeleted",))), f"{entity}.csv")
+        for entity, rows in upserts.items()
+    }
+    deletions = "Id\n" + "".join(f"{record_id}\n" for record_id in deleted)
+    payload[DELETIONS_UPLOAD] = FileStorage(io.BytesIO(deletions.encode("utf-8")), "deletions.csv")
+    return payload
+
+
+def store_contents(store) -> List[tuple]:
+    """Accounts in store order, with their contacts and each contact's individual and contact points."""
+
+    contents = []
+    for account_id in store.iter_account_ids():
+        contacts = []
+        for contact in store.get_contacts_for_account(account_id):
+            points = store.get_contact_points_for_contact(contact["Id"])
+            contacts.append(
+                (
+                    dict(contact),
+                    dict(store.get_individual_for_contact(contact["Id"]) or {}),
+                    sorted(point["Id"] for kind in ("phones", "emails") for point in points.get(kind, ())),
+                )
+            )
+        contents.append((dict(store.get_account(account_id)), contacts))
+    return contents
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def new_store(request, tmp_path):
+    def factory(name: str):
+        if request.param == "memory":
+            return SalesforceRelationshipStore()
+        return SQLiteRelationshipStore(tmp_path / f"{name}.sqlite3")
+
+    return factory
+
+
+@pytest.mark.parametrize("share", [0.03, 0.5], ids=["patched", "compacted"])
+def test_delta_matches_full_rebuild(new_store, share):
+    data = generate_dataset()
+    upserts, deleted = make_delta(data, share)
+
+    patched = load_store(data, new_store("patched"))
+    result = CSVImportCoordinator(patched).import_delta(delta_payload(upserts, deleted))
+    rebuilt = load_store(merge(data, upserts, deleted), new_store("rebuilt"))
+
+    assert result["summary"]
+    assert store_contents(patched) == store_contents(rebuilt)
+    patched_run, rebuilt_run = run_alerts(patched), run_alerts(rebuilt)
+    assert patched_run["details"] == rebuilt_run["details"]
+    assert patched_run["statistics"] == rebuilt_run["statistics"]
+
+
+def test_small_delta_patches_and_large_delta_compacts():
+    data = generate_dataset()
+    for share, compacted in ((0.03, False), (0.5, True)):
+        store = load_store(data)
+        CSVImportCoordinator(store).import_delta(delta_payload(*make_delta(data, share)))
+        relations = store._state.account_contact_relations
+        # Deleted rows stay as tombstones until the entity is compacted.
+        assert (None not in relations) is compacted
@@ -0,0 +1,72 @@
+"""Background imports: the upload returns a job at once and its progress is polled or streamed."""
+
+from __future__ import annotations
+
+import io
+import json
+import time
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from new_impl import app_factory
+
+from .conftest import ENTITIES, generate_dataset, uploads
+
+
+@pytest.fixture
+def client():
+    return app_factory.create_app().test_client()
+
+
+def submit(client, workspace: str, files) -> str:
+    response = client.post("/api/import", data={**files, "workspace": workspace, "async": "1"})
+    assert response.status_code == 202
+    assert response.get_json()["status"] in ("queued", "running", "completed")
+    return response.headers["Location"]
+
+
+def wait(client, location: str, workspace: str):
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        state = client.get(location, query_string={"workspace": workspace}).get_json()
+        if state["status"] in ("completed", "failed"):
+            return state
+        time.sleep(0.02)
+    raise AssertionError(f"import {location} still running")
+
+
+def test_async_import_reports_rows_and_summary(client):
+    data = generate_dataset(40)
+    location = submit(client, "jobs-ok", uploads(data))
+
+    state = wait(client, location, "jobs-ok")
+
+    assert state["status"] == state["phase"] == "completed" and state["error"] is None
+    assert state["rows"] == {entity: len(data[entity]) for entity in ENTITIES}
+    assert {entity: details["records"] for entity, details in state["summary"].items()} == state["rows"]
+    workspace = app_factory.WORKSPACES.get("jobs-ok")
+    assert len(list(workspace.store.iter_account_ids())) == 40
+
+
+def test_failed_async_import_reports_the_error(client):
+    location = submit(client, "jobs-failed", {"accounts": FileStorage(io.BytesIO(b"Id\n1\n"), "accounts.csv")})
+
+    state = wait(client, location, "jobs-failed")
+
+    assert state["status"] == "failed"
+    assert "Name" in state["error"]
+    # Jobs are only visible from the workspace that submitted them.
+    assert client.get(location, query_string={"workspace": "jobs-ok"}).status_code == 404
+
+
+def test_progress_is_streamed_until_the_job_ends(client):
+    location = submit(client, "jobs-stream", uploads(generate_dataset(20)))
+
+    response = client.get(
+        location, query_string={"workspace": "jobs-stream"}, headers={"Accept": "text/event-stream"}
+    )
+    events = [block for block in response.get_data(as_text=True).split("\n\n") if block]
+
+    assert all(block.startswith("event: progress\ndata: ") for block in events)
+    assert json.loads(events[-1].split("data: ", 1)[1])["status"] == "completed"
@@ -0,0 +1,86 @@
+"""Relationship indexes agree with a plain dictionary of lists built from the same rows."""
+
+from __future__ import annotations
+
+import random
+from array import array
+from collections import defaultdict
+
+from new_impl.indexes import CSRIndex, PositionView, SortedIndex
+
+from .conftest import load_store
+
+
+def grouped(pairs):
+    groups = defaultdict(list)
+    for key, target in pairs:
+        groups[key].append(target)
+    return groups
+
+
+def test_csr_index_matches_grouped_lists():
+    generator = random.Random(3)
+    pairs = [(f"key-{generator.randrange(40)}", position) for position in range(500)]
+    index = CSRIndex.build(pairs)
+    expected = grouped(pairs)
+
+    assert set(index) == set(expected) and len(index) == len(expected)
+    for key, targets in expected.items():
+        assert list(index.targets_for(key)) == targets
+        assert index.count(key) == len(targets)
+    assert list(index.targets_for("unknown")) == [] and "unknown" not in index
+
+
+def test_patched_index_overrides_only_the_changed_keys():
+    index = CSRIndex.build([("a", 0), ("b", 1), ("a", 2)])
+    patched = index.patched({"b": array("I", [5, 6]), "c": array("I", [7])})
+
+    assert list(patched.targets_for("a")) == [0, 2]
+    assert list(patched.targets_for("b")) == [5, 6]
+    assert list(patched.targets_for("c")) == [7]
+    assert sorted(patched) == ["a", "b", "c"]
+    # The original index is left untouched.
+    assert list(index.targets_for("b")) == [1] and "c" not in index
+
+
+def test_position_view_reads_rows_in_place():
+    rows = ["zero", "one", "two", "three"]
+    view = PositionView(rows, array("I", [3, 1]))
+
+    assert list(view) == ["three", "one"] and view[1] == "one" and len(view) == 2
+    assert list(view[1:]) == ["one"]
+
+
+def test_sorted_index_pages_by_prefix_and_cursor():
+    pairs = [(f"name {number % 13:02d}", f"id-{number:03d}") for number in range(200)]
+    index = SortedIndex.build(pairs)
+    matching = sorted(pair for pair in pairs if pair[0].startswith("name 1"))
+
+    pages, after = [], None
+    while True:
+        page = index.page("name 1", after, limit=9)
+        if not page:
+            break
+        pages.append(page)
+        after = page[-1]
+    assert [pair for page in pages for pair in page] == matching
+    assert all(len(page) == 9 for page in pages[:-1])
+
+    patched = index.patched(drop=[matching[0]], add=[("name 1z", "id-new")])
+    assert patched.page("name 1", limit=1) == [matching[1]]
+    assert patched.page("name 1z") == [("name 1z", "id-new")]
+    assert len(index) == 200
+
+
+def test_store_lookups_match_a_naive_join(dataset):
+    store = load_store(dataset)
+    relations = grouped((row["AccountId"], row["ContactId"]) for row in dataset["account_contact_relations"])
+    phones = grouped((row["ParentId"], row["Id"]) for row in dataset["contact_point_phones"])
+    individuals = {row["Id"]: row["IndividualId"] for row in dataset["contacts"]}
+
+    for account in dataset["accounts"]:
+        account_id = account["Id"]
+        assert [row["ContactId"] for row in store.get_relations_for_account(account_id)] == relations[account_id]
+        for contact_id in relations[account_id]:
+            found = store.get_contact_points_for_contact(contact_id)["phones"]
+            assert [row["Id"] for row in found] == phones[individuals[contact_id]]
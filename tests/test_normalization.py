@@ -0,0 +1,56 @@
+"""Alert keys computed at import match the normalisation helpers and are not derived again."""
+
+from __future__ import annotations
+
+from new_impl.alerts import common
+from new_impl.normalization import (
+    REFERENTE_SOL_ROLE,
+    ContactKeys,
+    RelationKeys,
+    normalise_name,
+    normalise_phone,
+    normalise_text,
+    split_roles,
+)
+
+from .conftest import load_store, run_alerts
+
+
+def test_imported_contacts_carry_their_normalised_keys(dataset):
+    store = load_store(dataset)
+
+    for row in dataset["contacts"]:
+        keys = store.contacts[row["Id"]].derived
+        assert isinstance(keys, ContactKeys)
+        assert keys.name == normalise_name(row)
+        assert keys.phone == normalise_phone(row["Phone"])
+        assert keys.mobile_phone == normalise_phone(row["MobilePhone"])
+        assert keys.email == normalise_text(row["Email"])
+        assert keys.fiscal_code == normalise_text(row["FiscalCode__c"])
+        assert keys.vat_number == normalise_text(row["VATNumber__c"])
+        assert keys.company == normalise_text(row["Company__c"])
+        assert keys.reachable == bool(row["Phone"] or row["MobilePhone"] or row["Email"])
+
+    for relation in store.account_contact_relations:
+        keys = relation.derived
+        assert isinstance(keys, RelationKeys)
+        assert keys.roles == split_roles(relation["Roles"])
+        assert keys.referente_sol == (REFERENTE_SOL_ROLE in map(normalise_text, keys.roles))
+
+
+def test_alert_runs_reuse_the_imported_keys(monkeypatch, dataset):
+    store = load_store(dataset)
+    derived = []
+    for name in ("contact_keys_for", "relation_keys_for", "phone_keys_for", "email_keys_for"):
+        builder = getattr(common, name)
+        monkeypatch.setattr(
+            common, name, lambda record, builder=builder: derived.append(record) or builder(record)
+        )
+
+    run_alerts(store)
+    run_alerts(store, engine="module")
+
+    assert derived == []
+    # Plain dictionaries still work: their keys are derived on demand.
+    assert common.contact_keys({"FirstName": "Anna", "Phone": "02-12"}).phone == "0212"
+    assert len(derived) == 1
@@ -0,0 +1,75 @@
+"""Store snapshots restore the imported data and reject stale or damaged files."""
+
+from __future__ import annotations
+
+import struct
+
+import pytest
+
+from new_impl import snapshots
+from new_impl.csv_import import CSVImportCoordinator
+from new_impl.data_store import SalesforceRelationshipStore
+from new_impl.snapshots import SnapshotError
+
+from .conftest import load_store, run_alerts, store_contents, uploads
+
+
+@pytest.fixture
+def snapshot(tmp_path, dataset):
+    path = tmp_path / "store.snapshot"
+    CSVImportCoordinator(SalesforceRelationshipStore(), snapshot_path=path).import_payload(uploads(dataset))
+    return path
+
+
+def test_import_saves_a_snapshot_that_restores_the_store(snapshot, dataset):
+    expected = load_store(dataset)
+    store = SalesforceRelationshipStore()
+    version = store.version
+
+    store.load_snapshot(snapshot)
+
+    assert store.version == version + 1
+    assert store_contents(store) == store_contents(expected)
+    assert run_alerts(store)["details"] == run_alerts(expected)["details"]
+
+
+def damage_payload(path):
+    data = bytearray(path.read_bytes())
+    data[-10] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+
+def bump_version(path):
+    data = bytearray(path.read_bytes())
+    struct.pack_into("<I", data, len(snapshots.SNAPSHOT_MAGIC), snapshots.SNAPSHOT_VERSION + 1)
+    path.write_bytes(bytes(data))
+
+
+def truncate(path):
+    path.write_bytes(path.read_bytes()[:-1])
+
+
+def replace_magic(path):
+    path.write_bytes(b"NOTASNAP" + path.read_bytes()[8:])
+
+
+@pytest.mark.parametrize(
+    "damage, message",
+    [(damage_payload, "Checksum"), (bump_version, "versione"), (truncate, "lunghezza"), (replace_magic, "non è")],
+)
+def test_stale_or_damaged_snapshot_is_rejected(snapshot, dataset, damage, message):
+    damage(snapshot)
+    store = load_store(dataset)
+    contents = store_contents(store)
+    version = store.version
+
+    with pytest.raises(SnapshotError, match=message):
+        store.load_snapshot(snapshot)
+
+    assert store.version == version
+    assert store_contents(store) == contents
+
+
+def test_missing_snapshot_is_a_snapshot_error(tmp_path):
+    with pytest.raises(SnapshotError):
+        SalesforceRelationshipStore().load_snapshot(tmp_path / "missing.snapshot")
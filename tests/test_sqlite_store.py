@@ -0,0 +1,52 @@
+"""The SQLite store answers every lookup exactly like the in-memory store."""
+
+from __future__ import annotations
+
+import pytest
+
+from new_impl.sqlite_store import SQLiteRelationshipStore
+
+from .conftest import load_store, run_alerts, store_contents
+
+
+@pytest.fixture
+def stores(tmp_path, dataset):
+    sqlite = load_store(dataset, SQLiteRelationshipStore(tmp_path / "store.sqlite3"))
+    yield load_store(dataset), sqlite
+    sqlite.close()
+
+
+def test_lookups_match_the_memory_store(stores, dataset):
+    memory, sqlite = stores
+
+    assert store_contents(sqlite) == store_contents(memory)
+    for account in dataset["accounts"][:20]:
+        expected = memory.describe_account(account["Id"])
+        context = sqlite.describe_account(account["Id"])
+        assert dict(context.account) == dict(expected.account)
+        assert [dict(contact) for contact in context.contacts] == [dict(contact) for contact in expected.contacts]
+        assert sqlite.resolve_account_name(account["Id"]) == memory.resolve_account_name(account["Id"])
+    for contact in dataset["contacts"][:20]:
+        assert sqlite.resolve_contact_name(contact["Id"]) == memory.resolve_contact_name(contact["Id"])
+
+
+@pytest.mark.parametrize("engine", ["account", "module"])
+def test_alerts_match_the_memory_store(stores, engine):
+    memory, sqlite = stores
+    expected = run_alerts(memory, engine=engine)
+
+    results = run_alerts(sqlite, engine=engine)
+
+    assert results["details"] == expected["details"]
+    assert results["statistics"] == expected["statistics"]
+
+
+def test_data_survives_a_reopened_database(tmp_path, dataset):
+    path = tmp_path / "store.sqlite3"
+    load_store(dataset, SQLiteRelationshipStore(path)).close()
+
+    reopened = SQLiteRelationshipStore(path)
+    try:
+        assert store_contents(reopened) == store_contents(load_store(dataset))
+    finally:
+        reopened.close()
@@ -0,0 +1,187 @@
+"""Workspaces are unloaded over the memory budget, retired over the limits and never leak log files."""
+
+from __future__ import annotations
+
+import os
+import time
+
+import pytest
+
+from new_impl import app_factory, logbook, workspaces
+from new_impl.alert_loop import AlertLoopRunner
+from new_impl.alert_summary import AlertSummaryStore
+from new_impl.csv_import import CSVImportCoordinator
+from new_impl.data_store import SalesforceRelationshipStore
+from new_impl.logbook import log_loop_event
+from new_impl.workspaces import (
+    DEFAULT_WORKSPACE,
+    WorkspaceLimitReached,
+    WorkspaceNotFound,
+    WorkspaceRegistry,
+)
+
+from .conftest import generate_dataset, uploads
+
+
+@pytest.fixture
+def registry(monkeypatch, tmp_path):
+    """Registry factory whose default workspace and snapshots live in ``tmp_path``."""
+
+    snapshot = tmp_path / "store.snapshot"
+    monkeypatch.setenv("SFBPCA_STORE_BACKEND", "memory")
+    monkeypatch.setenv("SFBPCA_SNAPSHOT_PATH", str(snapshot))
+    store = SalesforceRelationshipStore()
+    monkeypatch.setattr(workspaces, "DATA_STORE", store)
+    monkeypatch.setattr(workspaces, "IMPORT_COORDINATOR", CSVImportCoordinator(store, snapshot_path=snapshot))
+    monkeypatch.setattr(workspaces, "ALERT_LOOP", AlertLoopRunner(store, AlertSummaryStore(), workers=1))
+    return WorkspaceRegistry
+
+
+def import_into(registry: WorkspaceRegistry, workspace_id: str, accounts: int = 20) -> None:
+    with registry.use(workspace_id) as workspace:
+        workspace.coordinator.import_payload(uploads(generate_dataset(accounts)))
+
+
+def account_count(registry: WorkspaceRegistry, workspace_id: str) -> int:
+    with registry.use(workspace_id) as workspace:
+        return len(list(workspace.store.iter_account_ids()))
+
+
+def test_snapshot_eviction_unloads_and_restores_idle_workspaces(registry):
+    registry = registry(memory_budget=1, eviction="snapshot")
+    import_into(registry, DEFAULT_WORKSPACE)
+    import_into(registry, "alpha")
+
+    alpha = registry.get("alpha")
+    assert not alpha.loaded and alpha.restorable
+    assert alpha.snapshot_path.exists()
+    # The default workspace is never unloaded, whatever the budget.
+    assert registry.default.loaded and registry.default.memory_estimate() > 0
+
+    assert account_count(registry, "alpha") == 20
+
+
+@pytest.mark.parametrize("damage", ["corrupt", "missing"])
+def test_unusable_snapshot_forgets_hashes_and_alerts(registry, damage):
+    registry = registry(memory_budget=1, eviction="snapshot")
+    data = generate_dataset(20)
+    with registry.use("alpha") as workspace:
+        workspace.coordinator.import_payload(uploads(data))
+        workspace.alert_loop.execute()
+
+    alpha = registry.get("alpha")
+    if damage == "corrupt":
+        alpha.snapshot_path.write_bytes(b"not a snapshot")
+    else:
+        alpha.snapshot_path.unlink()
+
+    with registry.use("alpha") as workspace:
+        assert list(workspace.store.iter_account_ids()) == []
+        run, cached = workspace.alert_loop.execute()
+        assert not cached and run.results["details"] == []
+        summary = workspace.coordinator.import_payload(uploads(data))
+        assert {details["status"] for details in summary.values()} == {"imported"}
+        assert len(list(workspace.store.iter_account_ids())) == 20
+
+
+def test_drop_eviction_forgets_the_workspace_and_closes_its_log(registry):
+    registry = registry(memory_budget=1, eviction="drop")
+    with registry.use("alpha") as workspace:
+        workspace.coordinator.import_payload(uploads(generate_dataset(20)))
+        log_loop_event("import alpha")
+        assert "alpha" in logbook._loggers
+
+    assert "alpha" not in registry.ids()
+    assert "alpha" not in logbook._loggers
+
+
+def test_workspace_limit_retires_the_least_recently_used(registry):
+    registry = registry(max_workspaces=2)
+    import_into(registry, "a", accounts=5)
+    import_into(registry, "b", accounts=6)
+    with registry.use("a"):
+        log_loop_event("a")
+    import_into(registry, "c", accounts=7)
+
+    assert registry.ids() == [DEFAULT_WORKSPACE, "a", "c"]
+    assert "b" not in logbook._loggers
+    # A retired workspace comes back from its snapshot.
+    assert account_count(registry, "b") == 6
+    assert "a" not in registry.ids()
+
+
+def test_workspace_limit_with_every_workspace_in_use_refuses_new_ones(registry):
+    registry = registry(max_workspaces=2)
+    with registry.use("a"), registry.use("b"):
+        with pytest.raises(WorkspaceLimitReached):
+            registry.get("c")
+    assert registry.ids() == [DEFAULT_WORKSPACE, "a", "b"]
+
+
+def test_idle_workspaces_are_retired(registry):
+    registry = registry(idle_timeout=0.05)
+    import_into(registry, "idle", accounts=5)
+    time.sleep(0.1)
+
+    registry.get("fresh")
+    assert registry.ids() == [DEFAULT_WORKSPACE, "fresh"]
+    assert account_count(registry, "idle") == 5
+
+
+def age(path, seconds: float) -> None:
+    modified = time.time() - seconds
+    os.utime(path, (modified, modified))
+
+
+def test_snapshots_of_retired_workspaces_expire(registry, tmp_path):
+    registry = registry(max_workspaces=1, retention=3600)
+    import_into(registry, "a", accounts=5)
+    import_into(registry, "b", accounts=5)
+    folder = tmp_path / "workspaces"
+    assert sorted(path.name for path in folder.iterdir()) == ["a.snapshot", "b.snapshot"]
+
+    age(folder / "a.snapshot", 7200)
+    import_into(registry, "c", accounts=5)
+
+    # "b" was just retired and stays restorable; "a" is past the retention.
+    assert sorted(path.name for path in folder.iterdir()) == ["b.snapshot", "c.snapshot"]
+
+
+def test_unreadable_snapshot_is_deleted(registry):
+    registry = registry(memory_budget=1, eviction="snapshot")
+    import_into(registry, "alpha")
+    path = registry.get("alpha").snapshot_path
+    path.write_bytes(b"not a snapshot")
+
+    registry.get("alpha").ensure_loaded()
+    assert not path.exists()
+
+
+def test_retired_sqlite_workspaces_close_and_expire(registry, monkeypatch, tmp_path):
+    monkeypatch.setenv("SFBPCA_STORE_BACKEND", "sqlite")
+    monkeypatch.setenv("SFBPCA_SQLITE_PATH", str(tmp_path / "store.sqlite3"))
+    registry = registry(max_workspaces=1, retention=3600)
+    import_into(registry, "a", accounts=5)
+    store = registry.get("a").store
+    import_into(registry, "b", accounts=5)
+
+    assert store._connections == []
+    files = list((tmp_path / "workspaces").glob("a.sqlite3*"))
+    assert files
+    for path in files:
+        age(path, 7200)
+    import_into(registry, "c", accounts=5)
+    assert not list((tmp_path / "workspaces").glob("a.sqlite3*"))
+    assert list((tmp_path / "workspaces").glob("b.sqlite3*"))
+
+
+def test_reads_do_not_create_workspaces(registry):
+    registry = registry()
+    with pytest.raises(WorkspaceNotFound):
+        registry.get("ghost", create=False)
+    assert "ghost" not in registry.ids()
+
+    client = app_factory.create_app().test_client()
+    response = client.get("/api/alerts/results", query_string={"workspace": "ghost"})
+    assert response.status_code == 404
+    assert "ghost" not in app_factory.WORKSPACES.ids()